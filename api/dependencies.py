@@ -12,7 +12,8 @@ This module is part of the Arbitrary Hierarchical Classification Application dev
 from typing import Annotated
 from fastapi import Depends
 
-from db import session_scope, get_db
+from db import async_session_scope, get_async_db, session_scope, get_db
 
 
 Session = Annotated[session_scope, Depends(get_db)]
+AsyncSession = Annotated[async_session_scope, Depends(get_async_db)]
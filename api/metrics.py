@@ -0,0 +1,393 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+#
+# Metrics in the Prometheus text format, served at GET /metrics. A classify
+# request times its stages (embed, db, rerank, serialize, and the total) and
+# records them in a histogram labeled by endpoint, variant, hierarchy and
+# stage when it ends. Stage timers cost a context variable lookup outside a
+# request, so imports and warm-up don't pay for them. Counters and gauges are
+# read from the info() of the caches, batchers, limiter and pools when
+# scraped, so the hot path doesn't update them twice.
+#
+METRICS_DISABLED = os.getenv("METRICS_DISABLED", "false").lower() == "true"
+
+# seconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+def _escape(value) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _labels(names, values, extra: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of label names."""
+
+    def __init__(
+        self, name: str, help: str, labels: tuple, buckets=LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+
+        # label values -> [count per bucket and +Inf, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        """Record a value for a series of label values"""
+
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._series[labels] = series
+
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        """Lines of the histogram in the text format"""
+
+        with self._lock:
+            series = [
+                (labels, list(counts), total)
+                for labels, (counts, total) in self._series.items()
+            ]
+
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+
+            names = _labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{names} {total}")
+            lines.append(f"{self.name}_count{names} {cumulative}")
+
+        return lines
+
+
+class Counter:
+    """A Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, value: float = 1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            *(
+                f"{self.name}{_labels(self.labels, labels)} {value}"
+                for labels, value in series
+            ),
+        ]
+
+
+stage_seconds = Histogram(
+    "ahc_classify_stage_seconds",
+    "Time classify requests spent in each stage",
+    ("endpoint", "variant", "hierarchy", "stage"),
+)
+errors = Counter(
+    "ahc_classify_errors_total",
+    "Classify requests that raised, by exception type",
+    ("endpoint", "variant", "hierarchy", "error"),
+)
+
+
+class RequestTimings:
+    """Seconds spent in each stage of one classify request."""
+
+    __slots__ = ("labels", "stages")
+
+    def __init__(self, labels: tuple):
+        self.labels = labels
+        self.stages = {}
+
+    def milliseconds(self) -> dict[str, float]:
+        return {stage: seconds * 1000 for stage, seconds in self.stages.items()}
+
+
+_request = ContextVar("metrics_request", default=None)
+_stage = ContextVar("metrics_stage", default=None)
+
+
+@contextmanager
+def request(endpoint: str, variant: str, hierarchy: str):
+    """
+    Time a classify request. Stages timed inside, including in tasks and
+    threads started from it, add to the RequestTimings this yields, and are
+    recorded with the total when it ends. Yields None when disabled.
+    """
+
+    if METRICS_DISABLED:
+        yield None
+        return
+
+    timings = RequestTimings((endpoint, variant, hierarchy or "all"))
+    token = _request.set(timings)
+    started = time.perf_counter()
+
+    try:
+        yield timings
+    except Exception as e:
+        errors.inc((*timings.labels, type(e).__name__))
+        raise
+    finally:
+        _request.reset(token)
+        timings.stages["total"] = time.perf_counter() - started
+
+        for name, seconds in timings.stages.items():
+            stage_seconds.observe((*timings.labels, name), seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a stage of the current request. Stages of the same name nested in
+    it count once, and concurrent ones of a request add up.
+    """
+
+    timings = _request.get()
+    if timings is None or _stage.get() == name:
+        yield
+        return
+
+    token = _stage.set(name)
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+        timings.stages[name] = (
+            timings.stages.get(name, 0.0) + time.perf_counter() - started
+        )
+
+
+def timed(name: str):
+    """Decorator timing every call of a function, sync or async, as a stage"""
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _info_lines(
+    metrics: dict, prefix: str, info: dict, counters: set, labels: dict = None
+):
+    """
+    Add the numbers of an info() dict as samples: keys in counters become
+    <prefix>_<key>_total counters, the rest gauges. *_ms keys are converted
+    to seconds, and None or nested values are skipped.
+    """
+
+    for key, value in info.items():
+        if value is None or isinstance(value, (dict, list, str)):
+            continue
+
+        value = float(value)
+        name = f"{prefix}_{key}"
+        if key.endswith("_ms"):
+            name = f"{prefix}_{key[:-3]}_seconds"
+            value /= 1000
+
+        kind = "counter" if key in counters else "gauge"
+        if kind == "counter":
+            name += "_total"
+
+        labels = labels or {}
+        sample = f"{name}{_labels(labels.keys(), labels.values())} {value}"
+        metrics.setdefault(name, (kind, []))[1].append(sample)
+
+
+def _sources():
+    """(prefix, info, counter keys, labels) of every component loaded"""
+
+    from api import warmup
+    from api.result_cache import cache as result_cache
+    from classifier.pipelines import openai_embeddings
+    from classifier.pipelines.embedding_cache import cache as embedding_cache
+    from db.engine import pool_info
+
+    yield "ahc_warmup", {"ready": warmup.info()["ready"]}, set(), None
+    yield (
+        "ahc_result_cache",
+        result_cache.info(),
+        {"hits", "misses", "coalesced", "errors", "saved_ms", "evictions"},
+        None,
+    )
+    yield (
+        "ahc_embedding_cache",
+        embedding_cache.info(),
+        {
+            "memory_hits",
+            "persistent_hits",
+            "misses",
+            "writes",
+            "errors",
+            "memory_evictions",
+        },
+        None,
+    )
+    yield (
+        "ahc_embedding_batcher",
+        openai_embeddings.batcher.info(),
+        {"requests", "batches", "texts_sent", "queue_wait_ms", "errors"},
+        None,
+    )
+
+    for name, info in pool_info().items():
+        yield (
+            "ahc_db_pool",
+            info,
+            {"checkouts", "checkout_ms", "waits", "wait_ms"},
+            {"pool": name},
+        )
+
+    # only report what this worker built or loaded, never load it here
+    if openai_embeddings._provider is not None:
+        provider = openai_embeddings._provider
+        labels = {"provider": provider.key}
+        yield (
+            "ahc_embedding_provider",
+            provider.stats,
+            {"calls", "texts", "tokens", "errors"},
+            labels,
+        )
+
+        if provider.limiter is not None:
+            limiter = provider.limiter.info()
+            yield (
+                "ahc_embedding_limiter",
+                limiter,
+                {
+                    "acquired",
+                    "tokens",
+                    "waits",
+                    "wait_ms",
+                    "timeouts",
+                    "throttled",
+                },
+                labels,
+            )
+            for priority, queued in limiter["queued_by_priority"].items():
+                yield (
+                    "ahc_embedding_limiter_priority",
+                    {"queued": queued, **limiter["priorities"][priority]},
+                    {"acquired", "wait_ms", "timeouts"},
+                    {**labels, "priority": priority},
+                )
+
+    reranker = sys.modules.get("classifier.pipelines.reranker")
+    if reranker is not None:
+        yield (
+            "ahc_reranker_batcher",
+            reranker.batcher.info(),
+            {
+                "requests",
+                "batches",
+                "pairs",
+                "queue_wait_ms",
+                "inference_ms",
+                "errors",
+            },
+            None,
+        )
+
+
+def render() -> str:
+    """Every metric in the Prometheus text format"""
+
+    lines = stage_seconds.render() + errors.render()
+
+    metrics = {}
+    for prefix, info, counters, labels in _sources():
+        _info_lines(metrics, prefix, info, counters, labels)
+
+    for name, (kind, samples) in metrics.items():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    return "\n".join(lines) + "\n"
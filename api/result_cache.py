@@ -0,0 +1,217 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from classifier.pipelines.embedding_cache import LRUCache, normalize
+from db.models import File, Hierarchy
+
+#
+# Whole-result cache for /classify. Results are keyed on the variant, the
+# config and the normalized item, plus the version of the hierarchy, so an
+# import makes the old entries unreachable and they age out of the LRU.
+# Versions are re-read at most every RESULT_CACHE_REFRESH_SECONDS. Concurrent
+# identical requests share one computation (single flight).
+#
+RESULT_CACHE_DISABLED = (
+    os.getenv("RESULT_CACHE_DISABLED", "false").lower() == "true"
+)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_REFRESH_SECONDS = int(
+    os.getenv("RESULT_CACHE_REFRESH_SECONDS", "60")
+)
+
+
+def request_key(variant: str, item: dict, config) -> str:
+    """Hash of a classify request, with whitespace and unicode normalized"""
+
+    request = {
+        "variant": variant,
+        "name": normalize(item["name"]),
+        "description": normalize(item["description"] or ""),
+        "categories": [
+            normalize(category) for category in item["categories"] or []
+        ],
+        "config": config.model_dump(mode="json"),
+    }
+
+    return hashlib.sha256(
+        json.dumps(request, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class ResultCache:
+    """LRU of classify results with single-flight computation."""
+
+    def __init__(
+        self,
+        maxsize: int = RESULT_CACHE_SIZE,
+        ttl: int = RESULT_CACHE_TTL,
+        refresh_seconds: int = RESULT_CACHE_REFRESH_SECONDS,
+        disabled: bool = RESULT_CACHE_DISABLED,
+    ):
+        self.memory = LRUCache(maxsize, ttl)
+        self.refresh_seconds = refresh_seconds
+        self.disabled = disabled
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "saved_ms": 0.0,
+        }
+
+        self._versions = {}
+        self._versions_checked_at = None
+        self._inflight = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Re-read the hierarchy versions on the next lookup"""
+
+        with self._lock:
+            self._versions_checked_at = None
+
+    def versions(self, db) -> dict[str, int]:
+        """Version of every hierarchy by name, re-read when stale"""
+
+        if (
+            self._versions_checked_at is not None
+            and time.monotonic() - self._versions_checked_at
+            < self.refresh_seconds
+        ):
+            return self._versions
+
+        latest_file_id = (
+            select(func.max(File.id))
+            .where(File.hierarchy_id == Hierarchy.id)
+            .scalar_subquery()
+        )
+
+        # no lock around the query, under an AsyncSession it runs in a
+        # greenlet and other requests on the same thread may get here too
+        versions = dict(
+            db.execute(
+                select(
+                    Hierarchy.name,
+                    func.coalesce(Hierarchy.version, latest_file_id, 0),
+                )
+            ).all()
+        )
+
+        with self._lock:
+            self._versions = versions
+            self._versions_checked_at = time.monotonic()
+
+        return versions
+
+    async def get_or_compute(
+        self, db, variant: str, item: dict, config, compute
+    ):
+        """
+        The cached result of a classify request, or compute() awaited once for
+        all concurrent identical requests and cached
+        """
+
+        if self.disabled:
+            return await compute()
+
+        versions = await db.run_sync(self.versions)
+        if config.hierarchy is None:
+            version = sorted(versions.items())
+        else:
+            version = versions.get(config.hierarchy.value, 0)
+
+        key = (request_key(variant, item, config), json.dumps(version))
+
+        cached = self.memory.get(key)
+        if cached is not None:
+            result, compute_ms = cached
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += compute_ms
+            return result
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # futures are bound to a loop, so start fresh on a new one
+            self._loop = loop
+            self._inflight = {}
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            waited_at = time.monotonic()
+            try:
+                result, compute_ms = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # the request computing it went away, so compute it here
+                return await self.get_or_compute(
+                    db, variant, item, config, compute
+                )
+
+            self.stats["coalesced"] += 1
+            self.stats["saved_ms"] += max(
+                0.0, compute_ms - (time.monotonic() - waited_at) * 1000
+            )
+            return result
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        self.stats["misses"] += 1
+        started = time.monotonic()
+
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+            # mark it retrieved, nobody else may be waiting for it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        entry = (result, (time.monotonic() - started) * 1000)
+        self.memory.put(key, entry)
+        future.set_result(entry)
+
+        return result
+
+    def info(self) -> dict:
+        """Hit / miss counters and the time saved"""
+
+        shared = self.stats["hits"] + self.stats["coalesced"]
+        lookups = shared + self.stats["misses"]
+
+        return {
+            **self.stats,
+            "size": len(self.memory),
+            "evictions": self.memory.evictions,
+            "inflight": len(self._inflight),
+            "hit_ratio": shared / lookups if lookups else 0.0,
+        }
+
+
+cache = ResultCache()
@@ -9,22 +9,53 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
+import os
 import time
-from fastapi import APIRouter, HTTPException
-
-from api.dependencies import Session
-from api.schemas import ClassifyInput, ClassifyOutput
+from fastapi import APIRouter, HTTPException, Response
+
+from api import metrics
+from api.dependencies import AsyncSession
+from api.result_cache import cache as result_cache
+from api.schemas import (
+    ClassificationTreeOutput,
+    ClassifyBatchInput,
+    ClassifyBatchOutput,
+    ClassifyInput,
+    ClassifyOutput,
+)
+from classifier.pipelines.openai_embeddings import get_provider
 import classifier.variants as variants
 
 
+# Batch requests are embedded and searched this many items at a time
+CLASSIFY_BATCH_CHUNK_SIZE = int(os.getenv("CLASSIFY_BATCH_CHUNK_SIZE", "256"))
+
+
 router = APIRouter(
     tags=["classify"],
     responses={404: {"description": "Not found"}},
 )
 
 
+def _hierarchy(config):
+    return None if config.hierarchy is None else config.hierarchy.value
+
+
+def _response(output, timings: bool) -> Response:
+    """Serialize an output as the request's serialize stage"""
+
+    with metrics.stage("serialize"):
+        content = output.model_dump_json(
+            exclude=None if timings else {"timings"}
+        )
+
+    return Response(content, media_type="application/json")
+
+
 @router.post("/classify")
-async def classify(body: ClassifyInput, db: Session):
+async def classify(
+    body: ClassifyInput, db: AsyncSession, timings: bool = False
+):
     """Generate a classification calculation and return the result."""
 
     item = {
@@ -45,13 +76,117 @@ async def classify(body: ClassifyInput, db: Session):
 
     classify_fn = getattr(variants, variant)
 
-    start_time = time.time()
+    with metrics.request("classify", variant, _hierarchy(config)) as recorded:
+        start_time = time.time()
+
+        classifications = await result_cache.get_or_compute(
+            db, variant, item, config, lambda: classify_fn(db, item, config)
+        )
+
+        end_time = time.time()
+
+        output = ClassifyOutput(
+            data=classifications,
+            response_time_ms=(end_time - start_time) * 1000,
+            timings=recorded.milliseconds() if timings and recorded else None,
+        )
+        return _response(output, timings)
+
+
+@router.post("/classify/tree")
+async def classify_tree(
+    body: ClassifyInput, db: AsyncSession
+) -> ClassificationTreeOutput:
+    """Classify an item and return the tree of codes the search accepted."""
+
+    item = {
+        "name": body.name,
+        "description": body.description,
+        "categories": body.categories,
+    }
+
+    config = body.config
+
+    variant = config.variant
+
+    if variant not in variants.__all__:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Variant '{variant}' not found.",
+        )
+
+    classify_fn = getattr(variants, f"{variant}_tree", None)
+
+    if classify_fn is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Variant '{variant}' does not return a tree.",
+        )
+
+    with metrics.request("tree", variant, _hierarchy(config)):
+        return await classify_fn(db, item, config)
+
+
+@router.get("/classify/cache")
+def classify_cache() -> dict:
+    """Hit ratio and time saved by the classify result cache."""
+
+    return result_cache.info()
+
+
+@router.get("/classify/limiter")
+def classify_limiter() -> dict:
+    """Embedding provider and the state and queue of its rate limiter."""
+
+    return get_provider().info()
+
+
+@router.post("/classify/batch")
+async def classify_batch(
+    body: ClassifyBatchInput, db: AsyncSession, timings: bool = False
+):
+    """Generate classification calculations for a batch of items."""
+
+    items = [
+        {
+            "name": item.name,
+            "description": item.description,
+            "categories": item.categories,
+        }
+        for item in body.items
+    ]
 
-    classifications = await classify_fn(db, item, config)
+    config = body.config
+
+    variant = config.variant
+
+    if variant not in variants.__all__:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Variant '{variant}' not found.",
+        )
+
+    classify_fn = getattr(variants, f"{variant}_batch", None)
+
+    if classify_fn is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Variant '{variant}' does not support batches.",
+        )
+
+    with metrics.request("batch", variant, _hierarchy(config)) as recorded:
+        start_time = time.time()
 
-    end_time = time.time()
+        classifications = []
+        for i in range(0, len(items), CLASSIFY_BATCH_CHUNK_SIZE):
+            chunk = items[i : i + CLASSIFY_BATCH_CHUNK_SIZE]
+            classifications.extend(await classify_fn(db, chunk, config))
 
-    return ClassifyOutput(
-        data=classifications,
-        response_time_ms=(end_time - start_time) * 1000,
-    )
+        end_time = time.time()
+
+        output = ClassifyBatchOutput(
+            data=classifications,
+            response_time_ms=(end_time - start_time) * 1000,
+            timings=recorded.milliseconds() if timings and recorded else None,
+        )
+        return _response(output, timings)
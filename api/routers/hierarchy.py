@@ -14,7 +14,12 @@ from fastapi import APIRouter
 from api.dependencies import Session
 from db.models import Hierarchy
 from db.models.hs_code import HSCode
-from db.services.hierarchy_service import get_one
+from db.services.hs_code_service import (
+    get_ancestors,
+    get_cached_hierarchy,
+    get_descendants,
+    get_tree,
+)
 
 
 router = APIRouter()
@@ -42,14 +47,89 @@ async def get_hierarchies(db: Session):
 async def get_hierarchy(db: Session, hierarchy_name: str):
     """Get a specific hierarchy of HS Codes."""
 
-    hierarchy = get_one(db, hierarchy_name)
+    tree = get_tree(db, hierarchy_name)
 
-    if hierarchy is None:
+    if tree is None:
         return {"error": "Hierarchy not found"}
 
     return {
-        **hierarchy.__dict__,
-        "hs_codes": db.query(HSCode)
-        .filter(HSCode.hierarchy_id == hierarchy.id)
-        .all(),
+        **tree.hierarchy.__dict__,
+        "hs_codes": tree.nodes(range(len(tree))),
     }
+
+
+@router.get("/hierarchy/{hierarchy_name}/roots")
+async def get_roots(db: Session, hierarchy_name: str):
+    """Get the top-level HS Codes of a hierarchy."""
+
+    tree = get_tree(db, hierarchy_name)
+
+    if tree is None:
+        return {"error": "Hierarchy not found"}
+
+    return tree.nodes(tree.roots)
+
+
+@router.get("/hierarchy/{hierarchy_name}/codes/{code_name}/children")
+async def get_children(db: Session, hierarchy_name: str, code_name: str):
+    """Get the direct children of an HS Code."""
+
+    tree = get_tree(db, hierarchy_name)
+
+    if tree is None:
+        return {"error": "Hierarchy not found"}
+
+    row = tree.row(code_name)
+
+    if row is None:
+        return {"error": "HS Code not found"}
+
+    return tree.nodes(tree.children(row))
+
+
+@router.get("/hierarchy/{hierarchy_name}/codes/{code_name}/path")
+async def get_path(db: Session, hierarchy_name: str, code_name: str):
+    """Get the HS Codes from the root of the hierarchy down to an HS Code."""
+
+    tree = get_tree(db, hierarchy_name)
+
+    if tree is None:
+        return {"error": "Hierarchy not found"}
+
+    row = tree.row(code_name)
+
+    if row is None:
+        return {"error": "HS Code not found"}
+
+    return tree.nodes(tree.path_to_root(row))
+
+
+@router.get("/hierarchy/{hierarchy_name}/codes/{code_name}/ancestors")
+async def get_code_ancestors(db: Session, hierarchy_name: str, code_name: str):
+    """Get an HS Code and its ancestors, root first, from the path index."""
+
+    hierarchy = get_cached_hierarchy(db, hierarchy_name)
+
+    if hierarchy is None:
+        return {"error": "Hierarchy not found"}
+
+    ancestors = get_ancestors(db, code_name, hierarchy.id)
+
+    if not ancestors:
+        return {"error": "HS Code not found"}
+
+    return ancestors
+
+
+@router.get("/hierarchy/{hierarchy_name}/codes/{code_name}/descendants")
+async def get_code_descendants(
+    db: Session, hierarchy_name: str, code_name: str
+):
+    """Get every HS Code below an HS Code, depth first, from the path index."""
+
+    hierarchy = get_cached_hierarchy(db, hierarchy_name)
+
+    if hierarchy is None:
+        return {"error": "Hierarchy not found"}
+
+    return get_descendants(db, code_name, hierarchy.id)
@@ -9,6 +9,7 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
+import os
 from enum import Enum
 from typing import Optional
 from pydantic import BaseModel, Field
@@ -67,6 +68,32 @@ class ClassifyInputConfig(Config):
     """Configuration model for classify endpoint."""
 
     variant: str
+    ef_search: Optional[int] = Field(
+        None, ge=1, le=1000, description="HNSW candidate list size"
+    )
+    probes: Optional[int] = Field(
+        None, ge=1, description="IVFFlat lists to scan"
+    )
+    two_stage: Optional[bool] = Field(
+        None,
+        description="Shortlist on truncated embeddings, then rescore. "
+        "Defaults to on for hierarchies with short embeddings",
+    )
+    shortlist: Optional[int] = Field(
+        None,
+        ge=1,
+        le=10000,
+        description="Candidates rescored in a two-stage search",
+    )
+    subtree: Optional[str] = Field(
+        None, description="Only classify into codes at or below this HS code"
+    )
+    beam_width: Optional[int] = Field(
+        None,
+        ge=1,
+        le=100,
+        description="Codes kept at each level by the beam variant",
+    )
 
 
 class ClassifyInput(BaseModel):
@@ -83,6 +110,41 @@ class ClassifyOutput(BaseModel):
 
     data: list[Classification]
     response_time_ms: float
+    timings: Optional[dict[str, float]] = Field(
+        None, description="Milliseconds spent in each stage, with ?timings=true"
+    )
+
+
+class ClassifyBatchItem(BaseModel):
+    """Item model for classify batch endpoint."""
+
+    name: str
+    description: str
+    categories: list[str]
+
+
+# Larger batch requests are rejected with a 422, one request shouldn't queue
+# unbounded embedding calls or hold a database session for long
+CLASSIFY_BATCH_MAX_ITEMS = int(os.getenv("CLASSIFY_BATCH_MAX_ITEMS", "1024"))
+
+
+class ClassifyBatchInput(BaseModel):
+    """Input model for classify batch endpoint."""
+
+    items: list[ClassifyBatchItem] = Field(
+        ..., max_length=CLASSIFY_BATCH_MAX_ITEMS
+    )
+    config: ClassifyInputConfig
+
+
+class ClassifyBatchOutput(BaseModel):
+    """Output model for classify batch endpoint, one result list per item."""
+
+    data: list[list[Classification]]
+    response_time_ms: float
+    timings: Optional[dict[str, float]] = Field(
+        None, description="Milliseconds spent in each stage, with ?timings=true"
+    )
 
 
 class ClassificationTreeNode(BaseModel):
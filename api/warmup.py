@@ -0,0 +1,174 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+from api.schemas import HierarchyType
+from db import async_session_scope, session_scope
+from db.engine import DB_POOL_SIZE, async_engine
+from db.hierarchy_tree import cache as hierarchy_cache
+
+#
+# Warm-up run in the background when a worker starts, before /ready reports
+# the worker ready: open the database pools, run a nearest neighbor query per
+# hierarchy to pull its index and heap pages into Postgres' buffers (or load
+# the numpy backend's matrices), and embed a text once. With WARMUP_RERANKER
+# the reranker model is loaded and runs one forward pass, for workers that
+# serve the combined variant. It's off by default, so a worker that only
+# serves vector never loads the NLI model. A failed warm-up is retried every
+# WARMUP_RETRY_SECONDS.
+#
+WARMUP_DISABLED = os.getenv("WARMUP_DISABLED", "false").lower() == "true"
+WARMUP_RERANKER = os.getenv("WARMUP_RERANKER", "false").lower() == "true"
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+# embedded on every start, so after the first it's a cache probe
+WARMUP_TEXT = "item is named warm-up. warm-up is described by warm-up."
+
+state = {
+    "ready": WARMUP_DISABLED,
+    "attempts": 0,
+    "started_at": None,
+    "finished_at": None,
+    "last_error": None,
+    "steps": [],
+}
+
+
+async def open_pools():
+    """Open DB_POOL_SIZE async connections at once, and a sync one"""
+
+    async def connect():
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(connect() for _ in range(DB_POOL_SIZE)))
+
+    def connect_sync():
+        with session_scope() as db:
+            db.execute(text("SELECT 1"))
+
+    await asyncio.to_thread(connect_sync)
+
+
+async def embed():
+    """Build the embeddings client and embed a text, or find it cached"""
+
+    from classifier.pipelines.openai_embeddings import vectorize_async
+
+    return await vectorize_async(WARMUP_TEXT)
+
+
+async def search_hierarchies(vector) -> int:
+    """Run a nearest neighbor query in every hierarchy, returns how many"""
+
+    from db.services.hs_code_vector_service import get_nearest_neighbors_async
+
+    async with async_session_scope() as db:
+        hierarchies = await hierarchy_cache.hierarchies_async(db)
+
+        searched = 0
+        for name in hierarchies:
+            try:
+                hierarchy = HierarchyType(name)
+            except ValueError:
+                # not servable through the API, so no need to warm it
+                continue
+
+            await get_nearest_neighbors_async(db, vector, hierarchy, n=1)
+            searched += 1
+
+    return searched
+
+
+async def rerank():
+    """Load the reranker model and run one forward pass"""
+
+    from classifier.pipelines.reranker import score
+
+    await score(WARMUP_TEXT, [WARMUP_TEXT])
+
+
+async def step(name: str, work):
+    """Run one warm-up step, recording its timing and any error"""
+
+    started = time.monotonic()
+    record = {"step": name, "ms": None, "error": None}
+    state["steps"].append(record)
+
+    try:
+        return await work
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["ms"] = (time.monotonic() - started) * 1000
+
+
+async def warm_up():
+    """Run every warm-up step once, raising on the first failure"""
+
+    state["steps"] = []
+
+    await step("db_pool", open_pools())
+    vector = await step("embedding", embed())
+    await step("nearest_neighbors", search_hierarchies(vector))
+
+    if WARMUP_RERANKER:
+        await step("reranker", rerank())
+
+
+async def run():
+    """Warm up until it succeeds, then report the worker ready"""
+
+    if WARMUP_DISABLED:
+        return
+
+    state["started_at"] = time.time()
+
+    while True:
+        state["attempts"] += 1
+
+        try:
+            await warm_up()
+            break
+        except Exception as e:
+            state["last_error"] = f"{state['steps'][-1]['step']}: {e}"
+            print(f"Warm-up failed ({e}), retrying in {WARMUP_RETRY_SECONDS}s")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+    state["finished_at"] = time.time()
+    state["ready"] = True
+
+    print(
+        "Warm-up finished: "
+        + ", ".join(f"{s['step']} {s['ms']:.0f}ms" for s in state["steps"])
+    )
+
+
+def info() -> dict:
+    """Readiness and the timing of each warm-up step"""
+
+    elapsed = None
+    if state["started_at"] is not None:
+        elapsed = (state["finished_at"] or time.time()) - state["started_at"]
+
+    return {
+        "ready": state["ready"],
+        "attempts": state["attempts"],
+        "seconds": elapsed,
+        "last_error": state["last_error"],
+        "steps": state["steps"],
+    }
@@ -9,18 +9,52 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from api import metrics, warmup
 from api.routers import hierarchy_router, classify_router
+from classifier.pipelines.rate_limiter import RateLimitTimeout
+from db.services.hs_code_service import SubtreeNotFound
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Warm up in the background, so the server starts answering right away"""
+
+    task = asyncio.create_task(warmup.run())
+    yield
+
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
 
 
 def create_app():
     """Create the FastAPI app."""
 
-    _app = FastAPI()
+    _app = FastAPI(lifespan=lifespan)
 
     _app.include_router(hierarchy_router)
     _app.include_router(classify_router)
 
+    @_app.exception_handler(RateLimitTimeout)
+    async def rate_limited(_request: Request, e: RateLimitTimeout):
+        """503 when a request waited too long for the embedding rate limit"""
+
+        return JSONResponse(
+            {"detail": str(e)}, status_code=503, headers={"Retry-After": "1"}
+        )
+
+    @_app.exception_handler(SubtreeNotFound)
+    async def subtree_not_found(_request: Request, e: SubtreeNotFound):
+        """404 when a search is restricted to a subtree that doesn't exist"""
+
+        return JSONResponse({"detail": str(e)}, status_code=404)
+
     return _app
 
 
@@ -34,6 +68,23 @@ def index() -> str:
     return "pong!"
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """Readiness endpoint, 503 until the worker has warmed up."""
+
+    info = warmup.info()
+    return JSONResponse(info, status_code=200 if info["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """Stage latencies and counters in the Prometheus text format."""
+
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/")
 def health_check() -> str:
     """Health check endpoint."""
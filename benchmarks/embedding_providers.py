@@ -0,0 +1,113 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from classifier.pipelines.embedding_providers import load_provider, providers
+from db import session_scope
+from db.models import HSCodeVector
+from db.services.hierarchy_service import get_one
+
+
+#
+# Latency and throughput of the embedding providers, embedding the stored
+# descriptions of a hierarchy's codes in batches as an import does. The
+# embedding cache is not used, so every text is embedded.
+#
+#   python -m benchmarks.embedding_providers US_PTC --providers local fake
+#
+
+
+def load_texts(db, hierarchy_id: int, limit: int) -> list[str]:
+    """Stored descriptions of a hierarchy's codes"""
+
+    return (
+        db.execute(
+            select(HSCodeVector.description)
+            .where(HSCodeVector.hierarchy_id == hierarchy_id)
+            .order_by(HSCodeVector.id)
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+
+async def run(provider, texts: list[str], batch_size: int, concurrency: int):
+    """Milliseconds per text and texts per second"""
+
+    # warm up, loads the client or model
+    await provider.aembed_documents(texts[:batch_size])
+
+    batches = [
+        texts[i : i + batch_size] for i in range(0, len(texts), batch_size)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed(batch):
+        async with semaphore:
+            await provider.aembed_documents(batch)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(embed(batch) for batch in batches))
+    elapsed = time.perf_counter() - start
+
+    return elapsed * 1000 / len(texts), len(texts) / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency and throughput of the embedding providers"
+    )
+    parser.add_argument("hierarchy", help="The hierarchy name")
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        default=["local", "fake"],
+        choices=list(providers),
+    )
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 16, 64]
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--texts", type=int, default=512)
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        hierarchy = get_one(db, args.hierarchy)
+        if hierarchy is None:
+            raise SystemExit(f"Hierarchy {args.hierarchy} not found")
+
+        texts = load_texts(db, hierarchy.id, args.texts)
+
+    if not texts:
+        raise SystemExit("No stored descriptions to embed")
+
+    loaded = [load_provider(name, None) for name in args.providers]
+
+    print(f"{len(texts)} texts, {args.concurrency} concurrent batches")
+    print(
+        f"{'provider':<40} {'dims':>5} {'batch':>5} {'ms/text':>8} {'texts/s':>8}"
+    )
+
+    for provider in loaded:
+        for batch_size in args.batch_sizes:
+            ms, throughput = asyncio.run(
+                run(provider, texts, batch_size, args.concurrency)
+            )
+            print(
+                f"{provider.key:<40} {provider.dimensions:>5} {batch_size:>5} "
+                f"{ms:>8.3f} {throughput:>8.1f}"
+            )
@@ -0,0 +1,112 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+#
+# Import time of the application, from `python -X importtime` in a fresh
+# interpreter, against a budget of IMPORT_TIME_BUDGET_MS. Heavy packages that
+# are only needed by some variants or backends must not be imported at
+# startup, or by a worker that only uses the given variants. Exits with
+# status 1 when the budget is exceeded or a heavy package was imported.
+#
+#   python -m benchmarks.import_time --variants vector --top 15
+#
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+
+heavy_packages = [
+    "langchain_openai",
+    "onnxruntime",
+    "openai",
+    "tensorflow",
+    "tiktoken",
+    "torch",
+    "transformers",
+]
+
+
+def measure(module: str, variants: list[str]) -> list[tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of every module imported, in order"""
+
+    code = f"import {module}\nimport classifier.variants as variants\n"
+    code += "".join(f"variants.{variant}\n" for variant in variants)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        own, cumulative, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(own), int(cumulative)))
+
+    return imports
+
+
+def top_level(imports) -> dict[str, int]:
+    """Self time in µs per top-level package"""
+
+    totals = {}
+    for name, own, _ in imports:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + own
+
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import time of the application"
+    )
+    parser.add_argument("--module", default="application")
+    parser.add_argument(
+        "--variants",
+        nargs="*",
+        default=[],
+        help="Variants the worker uses, loaded after the module",
+    )
+    parser.add_argument(
+        "--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS
+    )
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    imports = measure(args.module, args.variants)
+    total = sum(own for _, own, _ in imports) / 1000
+    loaded = {name.split(".")[0] for name, _, _ in imports}
+
+    print(f"{'package':<32} {'ms':>8}")
+    packages = sorted(top_level(imports).items(), key=lambda item: -item[1])
+    for package, own in packages[: args.top]:
+        print(f"{package:<32} {own / 1000:>8.1f}")
+
+    print(
+        f"\nimport {args.module}"
+        + "".join(f", variants.{variant}" for variant in args.variants)
+        + f": {total:.0f} ms of {args.budget_ms:.0f} ms budget"
+    )
+
+    heavy = [package for package in heavy_packages if package in loaded]
+    if heavy:
+        print(f"Heavy packages imported: {', '.join(heavy)}")
+
+    if heavy or total > args.budget_ms:
+        sys.exit(1)
@@ -0,0 +1,145 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from api.schemas import HierarchyType
+from db import session_scope
+from db.models import HSCodeVector
+from db.search.numpy_backend import normalize_rows
+from db.services.hierarchy_service import get_one
+from db.services.hs_code_vector_service import get_nearest_neighbors
+
+
+#
+# Recall@K of two-stage search against exact search, over the stored vectors
+# of a hierarchy. Each query is a stored vector, left out of its own results.
+#
+#   python -m benchmarks.matryoshka_recall US_PTC --dims 256 512 1024
+#
+
+
+def load_matrix(db, hierarchy_id: int):
+    """Ids and normalized embeddings of a hierarchy"""
+
+    rows = db.execute(
+        select(HSCodeVector.id, HSCodeVector.embedding)
+        .where(HSCodeVector.hierarchy_id == hierarchy_id)
+        .order_by(HSCodeVector.id)
+    ).fetchall()
+
+    ids = np.asarray([row[0] for row in rows])
+    matrix = normalize_rows(
+        np.asarray([row[1] for row in rows], dtype=np.float32)
+    )
+
+    return ids, matrix
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k best scores per row, best first"""
+
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def recall(matrix, queries, k, dims=None, shortlist=None):
+    """Recall@k of a two-stage search, or of exact search without dims"""
+
+    exact = matrix[queries] @ matrix.T
+    exact[np.arange(len(queries)), queries] = -np.inf
+    truth = top_k(exact, k)
+
+    if dims is None:
+        return 1.0, truth
+
+    short = normalize_rows(matrix[:, :dims])
+    scores = short[queries] @ short.T
+    scores[np.arange(len(queries)), queries] = -np.inf
+    candidates = top_k(scores, min(shortlist, len(matrix) - 1))
+
+    rescored = np.take_along_axis(exact, candidates, axis=1)
+    found = np.take_along_axis(candidates, top_k(rescored, k), axis=1)
+
+    hits = sum(
+        len(set(truth_row) & set(found_row))
+        for truth_row, found_row in zip(truth, found)
+    )
+    return hits / truth.size, found
+
+
+def latency(db, hierarchy, vectors, two_stage, shortlist):
+    """Median milliseconds of a database search"""
+
+    hierarchy = HierarchyType(hierarchy.name)
+    timings = []
+    for vector in vectors:
+        start = time.perf_counter()
+        get_nearest_neighbors(
+            db, vector, hierarchy, n=5, two_stage=two_stage, shortlist=shortlist
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return float(np.median(timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recall of two-stage search against exact search"
+    )
+    parser.add_argument("hierarchy", help="The hierarchy name")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument(
+        "--shortlist", type=int, nargs="+", default=[50, 100, 200]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        hierarchy = get_one(db, args.hierarchy)
+        if hierarchy is None:
+            raise SystemExit(f"Hierarchy {args.hierarchy} not found")
+
+        ids, matrix = load_matrix(db, hierarchy.id)
+        if len(ids) <= args.k:
+            raise SystemExit("Not enough vectors to benchmark")
+
+        rng = np.random.default_rng(0)
+        queries = rng.choice(
+            len(ids), min(args.queries, len(ids)), replace=False
+        )
+
+        print(f"{len(ids)} vectors, {len(queries)} queries, recall@{args.k}")
+        print(f"{'dims':>6} {'shortlist':>9} {'recall':>7}")
+
+        for dims in args.dims:
+            for shortlist in args.shortlist:
+                value, _ = recall(matrix, queries, args.k, dims, shortlist)
+                print(f"{dims:>6} {shortlist:>9} {value:>7.3f}")
+
+        # query latency through the database for the configured size
+        if hierarchy.short_dimensions:
+            vectors = matrix[queries[:50]].tolist()
+            exact_ms = latency(db, hierarchy, vectors, False, None)
+            print(f"\nexact search: {exact_ms:.1f} ms median")
+
+            for shortlist in args.shortlist:
+                two_stage_ms = latency(db, hierarchy, vectors, True, shortlist)
+                print(
+                    f"two-stage search ({hierarchy.short_dimensions} dims, "
+                    f"shortlist {shortlist}): {two_stage_ms:.1f} ms median"
+                )
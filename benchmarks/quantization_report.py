@@ -0,0 +1,150 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+
+import numpy as np
+from sqlalchemy import func, select
+
+from classifier.pipelines.quantization import (
+    int8_scales,
+    pack_bits,
+    quantize_int8,
+)
+from db import session_scope
+from db.models import Hierarchy, HSCodeVector
+from db.search.numpy_backend import HierarchyMatrix
+from .matryoshka_recall import load_matrix
+
+
+#
+# Memory saved versus recall lost by quantization, over the stored vectors of
+# each imported hierarchy (the bundled hierarchy_files once imported). Each
+# query is a stored vector, left out of its own results.
+#
+#   python -m benchmarks.quantization_report [US_PTC ...] --shortlist 50 100 200
+#
+
+
+def matrix_for(hierarchy, ids, matrix, quantization=None):
+    """An in-memory HierarchyMatrix, with codes for a quantization"""
+
+    loaded = HierarchyMatrix(
+        hierarchy, 0, ids, [""] * len(ids), [""] * len(ids), matrix
+    )
+
+    if quantization == "binary":
+        loaded.quantization, loaded.codes = quantization, pack_bits(matrix)
+    elif quantization == "int8":
+        scales = int8_scales(matrix)
+        loaded.quantization = quantization
+        loaded.codes, loaded.scales = quantize_int8(matrix, scales), scales
+
+    return loaded
+
+
+def neighbors(loaded, queries, k, shortlist=None):
+    """Indexes of the k nearest rows to each query row, leaving the query out"""
+
+    indexes, _ = loaded.top_n(loaded.matrix[queries], k + 1, shortlist)
+    return [
+        [i for i in row if i != query][:k]
+        for row, query in zip(indexes, queries)
+    ]
+
+
+def recall(truth, found) -> float:
+    """Share of the true neighbors that were found"""
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / sum(len(t) for t in truth)
+
+
+def stored_sizes(db, hierarchy_id: int):
+    """Average stored bytes per row of the float and binary columns"""
+
+    return db.execute(
+        select(
+            func.avg(func.pg_column_size(HSCodeVector.embedding)),
+            func.avg(func.pg_column_size(HSCodeVector.embedding_binary)),
+        ).where(HSCodeVector.hierarchy_id == hierarchy_id)
+    ).first()
+
+
+def report(db, hierarchy, shortlists, queries, k):
+    """Print the report for one hierarchy"""
+
+    ids, matrix = load_matrix(db, hierarchy.id)
+    if len(ids) <= k:
+        print(f"{hierarchy.name}: not enough vectors\n")
+        return
+
+    count, size = matrix.shape
+    rng = np.random.default_rng(0)
+    queries = rng.choice(count, min(queries, count), replace=False)
+
+    truth = neighbors(matrix_for(hierarchy, ids, matrix), queries, k)
+
+    print(f"{hierarchy.name}: {count} vectors of {size} dimensions")
+
+    float_size, binary_size = stored_sizes(db, hierarchy.id)
+    if float_size:
+        print(f"  stored embedding: {float(float_size):.0f} bytes/row")
+    if binary_size:
+        print(f"  stored binary codes: {float(binary_size):.0f} bytes/row")
+
+    print(
+        f"  {'codes':<8} {'memory':>10} {'saved':>7} {'shortlist':>9} {'recall@' + str(k):>9}"
+    )
+
+    full = count * size * 4
+    print(
+        f"  {'float32':<8} {full / 2**20:>8.1f}MB {'-':>7} {'-':>9} {1:>9.3f}"
+    )
+
+    for quantization, code_bytes in (
+        ("int8", count * size + size * 4),
+        ("binary", count * ((size + 7) // 8)),
+    ):
+        loaded = matrix_for(hierarchy, ids, matrix, quantization)
+
+        for shortlist in shortlists:
+            found = neighbors(loaded, queries, k, shortlist)
+            print(
+                f"  {quantization:<8} {code_bytes / 2**20:>8.1f}MB "
+                f"{1 - code_bytes / full:>7.1%} {shortlist:>9} "
+                f"{recall(truth, found):>9.3f}"
+            )
+
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory saved versus recall lost by quantization"
+    )
+    parser.add_argument(
+        "hierarchies", nargs="*", help="Hierarchy names (default all)"
+    )
+    parser.add_argument(
+        "--shortlist", type=int, nargs="+", default=[50, 100, 200]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        query = select(Hierarchy).order_by(Hierarchy.id)
+        if args.hierarchies:
+            query = query.where(Hierarchy.name.in_(args.hierarchies))
+
+        for hierarchy in db.execute(query).scalars():
+            report(db, hierarchy, args.shortlist, args.queries, args.k)
@@ -0,0 +1,177 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from classifier.pipelines.reranker import (
+    HYPOTHESIS_TEMPLATE,
+    entailment_logits,
+    load_score_fn,
+    softmax,
+)
+from classifier.pipelines.zero_shot import models, which_model
+from classifier.variants.combined import item_to_text
+from db import session_scope
+from db.models import HSCodeVector
+from db.services.hierarchy_service import get_one
+from .matryoshka_recall import load_matrix, top_k
+
+
+#
+# Latency and score agreement of the reranker backends, over rerank requests
+# built from a hierarchy's stored codes: each premise is a stored code and its
+# candidates are its nearest stored neighbors, as the combined variant sends
+# them. Scores are compared with the "pipeline" backend.
+#
+#   python -m benchmarks.reranker_backends US_PTC --batch-sizes 1 8 32
+#
+
+
+def build_requests(db, hierarchy_id: int, queries: int, candidates: int):
+    """(premise, labels) rerank requests from stored codes and their neighbors"""
+
+    ids, matrix = load_matrix(db, hierarchy_id)
+    if len(ids) <= candidates:
+        raise SystemExit("Not enough vectors to benchmark")
+
+    texts = {
+        id: item_to_text({"name": name, "description": description})
+        for id, name, description in db.execute(
+            select(
+                HSCodeVector.id, HSCodeVector.name, HSCodeVector.description
+            ).where(HSCodeVector.hierarchy_id == hierarchy_id)
+        )
+    }
+
+    rng = np.random.default_rng(0)
+    picked = rng.choice(len(ids), min(queries, len(ids)), replace=False)
+
+    scores = matrix[picked] @ matrix.T
+    scores[np.arange(len(picked)), picked] = -np.inf
+    neighbors = top_k(scores, candidates)
+
+    return [
+        (texts[ids[query]], [texts[ids[i]] for i in row])
+        for query, row in zip(picked, neighbors)
+    ]
+
+
+def run(score_fn, requests, batch_size: int):
+    """Label scores of every request, and milliseconds per pair"""
+
+    pairs = [
+        (premise, HYPOTHESIS_TEMPLATE.format(label))
+        for premise, labels in requests
+        for label in labels
+    ]
+
+    # warm up, the first passes allocate
+    score_fn(pairs[:batch_size])
+
+    start = time.perf_counter()
+    logits = np.concatenate(
+        [
+            score_fn(pairs[i : i + batch_size])
+            for i in range(0, len(pairs), batch_size)
+        ]
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+
+    scores = []
+    offset = 0
+    for _, labels in requests:
+        scores.append(
+            np.asarray(softmax(logits[offset : offset + len(labels)]))
+        )
+        offset += len(labels)
+
+    return scores, elapsed / len(pairs)
+
+
+def agreement(reference, scores):
+    """Mean and max absolute score difference, and share of equal top-1 labels"""
+
+    diffs = np.concatenate([np.abs(r - s) for r, s in zip(reference, scores)])
+    top1 = np.mean(
+        [r.argmax() == s.argmax() for r, s in zip(reference, scores)]
+    )
+
+    return float(diffs.mean()), float(diffs.max()), float(top1)
+
+
+def backend(name: str):
+    """Scoring function of a benchmarked backend"""
+
+    if name == "pipeline":
+        return load_score_fn("pipeline")
+
+    from classifier.pipelines.onnx_reranker import OnnxReranker
+
+    return OnnxReranker(models[which_model], int8=name == "onnx-int8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency and score agreement of the reranker backends"
+    )
+    parser.add_argument("hierarchy", help="The hierarchy name")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["pipeline", "onnx", "onnx-int8"],
+        choices=["pipeline", "onnx", "onnx-int8"],
+    )
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 8, 32]
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=5)
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        hierarchy = get_one(db, args.hierarchy)
+        if hierarchy is None:
+            raise SystemExit(f"Hierarchy {args.hierarchy} not found")
+
+        requests = build_requests(
+            db, hierarchy.id, args.queries, args.candidates
+        )
+
+    print(
+        f"{models[which_model]}: {len(requests)} requests of "
+        f"{args.candidates} candidates"
+    )
+    print(
+        f"{'backend':<10} {'batch':>5} {'ms/pair':>8} "
+        f"{'mean diff':>9} {'max diff':>9} {'top-1':>6}"
+    )
+
+    reference = None
+    if "pipeline" not in args.backends:
+        reference, _ = run(entailment_logits, requests, max(args.batch_sizes))
+
+    for name in args.backends:
+        score_fn = backend(name)
+
+        for batch_size in args.batch_sizes:
+            scores, ms = run(score_fn, requests, batch_size)
+            if reference is None:
+                reference = scores
+
+            mean, worst, top1 = agreement(reference, scores)
+            print(
+                f"{name:<10} {batch_size:>5} {ms:>8.2f} "
+                f"{mean:>9.4f} {worst:>9.4f} {top1:>6.1%}"
+            )
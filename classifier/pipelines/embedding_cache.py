@@ -0,0 +1,319 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+#
+# Cache settings. The in-process tier is a bounded LRU, the persistent tier is
+# the embedding_cache table. TTLs are in seconds, 0 disables expiry.
+#
+EMBEDDING_CACHE_DISABLED = (
+    os.getenv("EMBEDDING_CACHE_DISABLED", "false").lower() == "true"
+)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+EMBEDDING_CACHE_PERSIST = (
+    os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+)
+EMBEDDING_CACHE_PERSIST_TTL = int(
+    os.getenv("EMBEDDING_CACHE_PERSIST_TTL", "2592000")
+)
+EMBEDDING_CACHE_PERSIST_MAX_ROWS = int(
+    os.getenv("EMBEDDING_CACHE_PERSIST_MAX_ROWS", "1000000")
+)
+EMBEDDING_CACHE_PRUNE_INTERVAL = int(
+    os.getenv("EMBEDDING_CACHE_PRUNE_INTERVAL", "3600")
+)
+
+
+def normalize(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different texts share a key"""
+
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    """Hash of the normalized text, used as the cache key"""
+
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread safe LRU cache with a size bound and an optional TTL."""
+
+    def __init__(self, maxsize: int, ttl: int = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a value, or None if it is missing or expired"""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Insert a value, evicting the least recently used entries"""
+
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry"""
+
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """
+    Two tier embedding cache. Lookups try the in-process LRU first, then the
+    persistent table, and anything found in the table is promoted to the LRU.
+    Vectors are kept as float32 arrays in memory to keep the LRU compact.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = EMBEDDING_CACHE_SIZE,
+        ttl: int = EMBEDDING_CACHE_TTL,
+        persist: bool = EMBEDDING_CACHE_PERSIST,
+        persist_ttl: int = EMBEDDING_CACHE_PERSIST_TTL,
+        persist_max_rows: int = EMBEDDING_CACHE_PERSIST_MAX_ROWS,
+        disabled: bool = EMBEDDING_CACHE_DISABLED,
+    ):
+        self.memory = LRUCache(maxsize, ttl)
+        self.persist = persist
+        self.persist_ttl = persist_ttl
+        self.persist_max_rows = persist_max_rows
+        self.disabled = disabled
+
+        self.stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "errors": 0,
+        }
+        self._last_prune = time.monotonic()
+        self._pending = set()
+
+    def get_many(self, model: str, texts: list[str]) -> dict[int, list[float]]:
+        """Get cached embeddings, keyed by the index of the text in texts"""
+
+        if self.disabled:
+            return {}
+
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        missing = {}
+
+        for i, key in enumerate(hashes):
+            vector = self.memory.get((model, key))
+            if vector is not None:
+                found[i] = vector.tolist()
+            else:
+                missing.setdefault(key, []).append(i)
+
+        self.stats["memory_hits"] += len(found)
+
+        if missing and self.persist:
+            stored = self._read(model, list(missing))
+            for key, vector in stored.items():
+                self.memory.put((model, key), array("f", vector))
+                for i in missing.pop(key):
+                    found[i] = vector
+                    self.stats["persistent_hits"] += 1
+
+        self.stats["misses"] += sum(
+            len(indexes) for indexes in missing.values()
+        )
+
+        return found
+
+    def put_many(
+        self,
+        model: str,
+        texts: list[str],
+        vectors: list[list[float]],
+        raise_errors: bool = False,
+    ):
+        """
+        Store embeddings in both tiers. Failed database writes are counted and
+        printed, or raised with raise_errors.
+        """
+
+        if self.disabled:
+            return
+
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            key = text_hash(text)
+            self.memory.put((model, key), array("f", vector))
+            entries[key] = vector
+
+        self.stats["writes"] += len(entries)
+
+        if self.persist:
+            self._write(model, entries, raise_errors)
+
+    def get(self, model: str, text: str):
+        """
+        Get a cached embedding, or None. Misses read the database, so async
+        code uses aget.
+        """
+
+        return self.get_many(model, [text]).get(0)
+
+    def put(self, model: str, text: str, vector: list[float]):
+        """Store an embedding"""
+
+        self.put_many(model, [text], [vector])
+
+    async def aget(self, model: str, text: str):
+        """Get a cached embedding without blocking the event loop on the database"""
+
+        if self.disabled:
+            return None
+
+        vector = self.memory.get((model, text_hash(text)))
+        if vector is not None:
+            self.stats["memory_hits"] += 1
+            return vector.tolist()
+
+        if not self.persist:
+            self.stats["misses"] += 1
+            return None
+
+        return await asyncio.to_thread(self.get, model, text)
+
+    async def aput(self, model: str, text: str, vector: list[float]):
+        """
+        Store an embedding. The persistent write runs in the background so the
+        caller doesn't wait on the database.
+        """
+
+        if self.disabled:
+            return
+
+        key = text_hash(text)
+        self.memory.put((model, key), array("f", vector))
+        self.stats["writes"] += 1
+
+        if self.persist:
+            task = asyncio.create_task(
+                asyncio.to_thread(self._write, model, {key: vector})
+            )
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    def info(self) -> dict:
+        """Hit/miss counters and sizes"""
+
+        return {
+            **self.stats,
+            "memory_size": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disabled": self.disabled,
+            "persist": self.persist,
+        }
+
+    def clear(self):
+        """Clear the in-process tier"""
+
+        self.memory.clear()
+
+    def _read(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        """Read from the persistent tier, treating errors as misses"""
+
+        # imported here so the cache can be used without a database configured
+        from db.session import Session
+        from db.services.embedding_cache_service import get_many
+
+        db = Session()
+        try:
+            return get_many(db, model, hashes, ttl=self.persist_ttl)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Error reading embedding cache: {e}")
+            return {}
+        finally:
+            db.close()
+
+    def _write(
+        self, model: str, entries: dict[str, list[float]], raise_errors=False
+    ):
+        """Write to the persistent tier, pruning it now and then"""
+
+        from db.session import Session
+        from db.services.embedding_cache_service import prune, put_many
+
+        db = Session()
+        try:
+            put_many(db, model, entries)
+
+            if (
+                time.monotonic() - self._last_prune
+                > EMBEDDING_CACHE_PRUNE_INTERVAL
+            ):
+                self._last_prune = time.monotonic()
+                prune(db, self.persist_ttl, self.persist_max_rows)
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.stats["errors"] += 1
+            if raise_errors:
+                raise
+
+            print(f"Error writing embedding cache: {e}")
+        finally:
+            db.close()
+
+
+cache = EmbeddingCache()
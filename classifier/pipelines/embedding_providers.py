@@ -0,0 +1,435 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from classifier.pipelines.rate_limiter import INTERACTIVE, AdaptiveRateLimiter
+
+load_dotenv()
+
+
+#
+# Embedding providers, chosen with EMBEDDING_PROVIDER:
+#   "openai" calls the OpenAI embeddings API,
+#   "local" runs a sentence-transformers model on the CPU, with PyTorch or
+#           ONNX Runtime (EMBEDDING_LOCAL_BACKEND), in a pool of
+#           EMBEDDING_LOCAL_WORKERS inference threads,
+#   "fake"  hashes the words of a text into a vector, deterministic and
+#           offline, for tests and benchmarks.
+# EMBEDDING_MODEL overrides the provider's default model.
+#
+# Vectors narrower than the stored embedding column are zero-padded to
+# STORED_DIMENSIONS, which leaves cosine similarities unchanged. Each stored
+# vector records the provider it came from and its own dimensions.
+#
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+EMBEDDING_LOCAL_BACKEND = os.getenv("EMBEDDING_LOCAL_BACKEND", "torch")
+EMBEDDING_LOCAL_WORKERS = int(os.getenv("EMBEDDING_LOCAL_WORKERS", "2"))
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+EMBEDDING_FAKE_DIMENSIONS = int(os.getenv("EMBEDDING_FAKE_DIMENSIONS", "3072"))
+
+#
+# Every OpenAI call of a process, from classify requests and imports, goes
+# through one AdaptiveRateLimiter (see rate_limiter). EMBEDDING_RPM and
+# EMBEDDING_TPM cap the limits, 0 takes them from the API's rate-limit
+# headers. At most EMBEDDING_MAX_CONCURRENCY calls are in flight, fewer after
+# 429s. Imports leave EMBEDDING_LIMITER_RESERVE of both limits to classify
+# requests, which wait at most EMBEDDING_LIMITER_MAX_WAIT_SECONDS for their
+# turn. Imports wait as long as it takes.
+#
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "0"))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "0"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "32"))
+EMBEDDING_LIMITER_RESERVE = float(os.getenv("EMBEDDING_LIMITER_RESERVE", "0.2"))
+EMBEDDING_LIMITER_MAX_WAIT_SECONDS = float(
+    os.getenv("EMBEDDING_LIMITER_MAX_WAIT_SECONDS", "30")
+)
+
+# width of hs_code_vector.embedding
+STORED_DIMENSIONS = 3072
+
+
+class EmbeddingProvider:
+    """
+    Embeds texts with one model. Subclasses implement embed(), and aembed()
+    when they have a native async client. The method names match langchain's
+    embeddings, so a provider can stand in for one. Providers of rate limited
+    APIs set limiter, every embed_documents call then waits for its turn.
+    """
+
+    name = None
+    default_model = None
+    limiter = None
+
+    def __init__(self, model: str = None):
+        self.model = model or self.default_model
+        self.stats = {"calls": 0, "texts": 0, "tokens": 0, "errors": 0}
+
+    @property
+    def key(self) -> str:
+        """Provider and model, recorded with every stored vector"""
+
+        return f"{self.name}:{self.model}"
+
+    @property
+    def cache_key(self) -> str:
+        """Model name the embedding cache keys vectors on"""
+
+        return self.key
+
+    @property
+    def dimensions(self) -> int:
+        """Dimensions of the model's vectors, before padding"""
+
+        raise NotImplementedError
+
+    def embed(self, texts: list[str]):
+        """Vectors of texts, as a matrix or a list of lists"""
+
+        raise NotImplementedError
+
+    async def aembed(self, texts: list[str]):
+        """embed off the event loop"""
+
+        return await asyncio.to_thread(self.embed, texts)
+
+    def pad(self, vectors) -> list[list[float]]:
+        """Zero-pad vectors to STORED_DIMENSIONS"""
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[1] > STORED_DIMENSIONS:
+            raise ValueError(
+                f"{self.key} returns {matrix.shape[1]} dimensions, "
+                f"at most {STORED_DIMENSIONS} can be stored"
+            )
+
+        if matrix.shape[1] < STORED_DIMENSIONS:
+            matrix = np.pad(
+                matrix, ((0, 0), (0, STORED_DIMENSIONS - matrix.shape[1]))
+            )
+
+        return matrix.tolist()
+
+    @staticmethod
+    def estimate_tokens(texts: list[str]) -> int:
+        """Tokens in texts, at 4 characters per token"""
+
+        return sum(len(text) // 4 + 1 for text in texts)
+
+    def _count(self, texts: list[str], tokens: int):
+        self.stats["calls"] += 1
+        self.stats["texts"] += len(texts)
+        self.stats["tokens"] += tokens
+
+    def embed_documents(
+        self, texts: list[str], priority: int = INTERACTIVE, tokens: int = None
+    ) -> list[list[float]]:
+        """
+        Padded vectors of texts. tokens is the texts' token count for the
+        limiter, estimated when not given
+        """
+
+        if not texts:
+            return []
+
+        if tokens is None:
+            tokens = self.estimate_tokens(texts)
+        self._count(texts, tokens)
+
+        try:
+            if self.limiter is None:
+                vectors = self.embed(texts)
+            else:
+                with self.limiter.limit_sync(tokens, priority):
+                    vectors = self.embed(texts)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        return self.pad(vectors)
+
+    async def aembed_documents(
+        self, texts: list[str], priority: int = INTERACTIVE, tokens: int = None
+    ) -> list[list[float]]:
+        """Padded vectors of texts, for async callers"""
+
+        if not texts:
+            return []
+
+        if tokens is None:
+            tokens = self.estimate_tokens(texts)
+        self._count(texts, tokens)
+
+        try:
+            if self.limiter is None:
+                vectors = await self.aembed(texts)
+            else:
+                async with self.limiter.limit(tokens, priority):
+                    vectors = await self.aembed(texts)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        return self.pad(vectors)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Padded vector of a text"""
+
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Padded vector of a text, for async callers"""
+
+        return (await self.aembed_documents([text]))[0]
+
+    def info(self) -> dict:
+        """Call counters, the provider, its dimensions and its limiter"""
+
+        return {
+            **self.stats,
+            "provider": self.key,
+            "dimensions": self.dimensions,
+            "limiter": None if self.limiter is None else self.limiter.info(),
+        }
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """
+    OpenAI embeddings API, through langchain. Every HTTP response, including
+    the 429s the client retries on its own, is shown to the limiter.
+    """
+
+    name = "openai"
+    default_model = "text-embedding-3-large"
+    models = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+
+    def __init__(self, model: str = None):
+        super().__init__(model)
+        self.limiter = AdaptiveRateLimiter(
+            EMBEDDING_RPM,
+            EMBEDDING_TPM,
+            max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+            reserve=EMBEDDING_LIMITER_RESERVE,
+            max_wait=EMBEDDING_LIMITER_MAX_WAIT_SECONDS,
+        )
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        # the cache was keyed on the bare model name before there were
+        # providers, so those entries stay valid
+        return self.model
+
+    @property
+    def dimensions(self) -> int:
+        return self.models.get(self.model, STORED_DIMENSIONS)
+
+    def client(self):
+        """The langchain client, built on first use"""
+
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from langchain_openai import OpenAIEmbeddings
+                    from openai import (
+                        DefaultAsyncHttpxClient,
+                        DefaultHttpxClient,
+                    )
+
+                    self._client = OpenAIEmbeddings(
+                        model=self.model,
+                        http_client=DefaultHttpxClient(
+                            event_hooks={"response": [self._observe]}
+                        ),
+                        http_async_client=DefaultAsyncHttpxClient(
+                            event_hooks={"response": [self._aobserve]}
+                        ),
+                    )
+
+        return self._client
+
+    def _observe(self, response):
+        self.limiter.observe(response.status_code, response.headers)
+
+    async def _aobserve(self, response):
+        self._observe(response)
+
+    def embed(self, texts: list[str]):
+        return self.client().embed_documents(texts)
+
+    async def aembed(self, texts: list[str]):
+        return await self.client().aembed_documents(texts)
+
+
+class LocalProvider(EmbeddingProvider):
+    """
+    A sentence-transformers model on the CPU. Texts are split into batches of
+    batch_size, encoded on a pool of inference threads.
+    """
+
+    name = "local"
+    default_model = "sentence-transformers/all-MiniLM-L6-v2"
+
+    def __init__(
+        self,
+        model: str = None,
+        backend: str = EMBEDDING_LOCAL_BACKEND,
+        workers: int = EMBEDDING_LOCAL_WORKERS,
+        batch_size: int = EMBEDDING_LOCAL_BATCH_SIZE,
+    ):
+        super().__init__(model)
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="embedding"
+        )
+
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """The model, loaded on first use"""
+
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    options = {}
+                    if self.backend != "torch":
+                        # needs sentence-transformers >= 3.2
+                        options["backend"] = self.backend
+
+                    print(f"Loading {self.model} ({self.backend})")
+                    self._model = SentenceTransformer(
+                        self.model, device="cpu", **options
+                    )
+
+        return self._model
+
+    @property
+    def dimensions(self) -> int:
+        return self.load().get_sentence_embedding_dimension()
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """Encode one batch, on an inference thread"""
+
+        return self.load().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+
+    def _batches(self, texts: list[str]):
+        """Texts split into batches of batch_size"""
+
+        return [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+    def embed(self, texts: list[str]):
+        return np.concatenate(
+            list(self.executor.map(self._encode, self._batches(texts)))
+        )
+
+    async def aembed(self, texts: list[str]):
+        loop = asyncio.get_running_loop()
+
+        return np.concatenate(
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(self.executor, self._encode, batch)
+                    for batch in self._batches(texts)
+                )
+            )
+        )
+
+
+class FakeProvider(EmbeddingProvider):
+    """
+    Feature hashing of the lowercased words of a text: each word adds +1 or
+    -1 to one dimension picked by its hash. Deterministic and offline, and
+    texts sharing words are similar, so searches still return sensible codes.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self, model: str = None, dimensions: int = EMBEDDING_FAKE_DIMENSIONS
+    ):
+        super().__init__(model or f"hashing-{dimensions}")
+        self._dimensions = dimensions
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def _vector(self, text: str) -> np.ndarray:
+        """Hashed and normalized vector of a text"""
+
+        vector = np.zeros(self._dimensions, dtype=np.float32)
+
+        for word in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(
+                hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(),
+                "big",
+            )
+            vector[digest % self._dimensions] += 1 if digest >> 63 else -1
+
+        norm = np.linalg.norm(vector)
+        if not norm:
+            # texts without words all get the same vector
+            vector[0] = norm = 1
+
+        return vector / norm
+
+    def embed(self, texts: list[str]):
+        return np.stack([self._vector(text) for text in texts])
+
+    async def aembed(self, texts: list[str]):
+        # cheap enough to run on the event loop
+        return self.embed(texts)
+
+
+providers = {
+    provider.name: provider
+    for provider in (OpenAIProvider, LocalProvider, FakeProvider)
+}
+
+
+def load_provider(
+    name: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL
+) -> EmbeddingProvider:
+    """A provider by name. Models are only loaded when first used"""
+
+    if name not in providers:
+        raise ValueError(f"Unknown embedding provider '{name}'")
+
+    provider = providers[name](model)
+    print(f"Using embedding provider: {provider.key}")
+
+    return provider
@@ -0,0 +1,322 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+from dotenv import load_dotenv
+
+from classifier.pipelines import openai_embeddings
+from classifier.pipelines.embedding_cache import cache
+from classifier.pipelines.rate_limiter import IMPORT, RateLimiter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+load_dotenv()
+
+
+#
+# Embedding stage for imports. Texts are split into batches of at most
+# EMBEDDING_IMPORT_BATCH_TOKENS tokens and EMBEDDING_IMPORT_BATCH_SIZE texts,
+# and up to EMBEDDING_IMPORT_CONCURRENCY batches are in flight at once under
+# the EMBEDDING_IMPORT_RPM / EMBEDDING_IMPORT_TPM limits, the import's share
+# of the provider's limits, and then wait their turn behind classify requests
+# in the provider's limiter (see embedding_providers). Every finished batch
+# is written to the persistent embedding cache, which is the checkpoint: a
+# restarted import finds those texts in the cache and only pays for the rest.
+# Without EMBEDDING_CACHE_PERSIST there is no checkpoint, and failed
+# checkpoint writes are counted in the stage's checkpoint_errors.
+#
+EMBEDDING_IMPORT_BATCH_TOKENS = int(
+    os.getenv("EMBEDDING_IMPORT_BATCH_TOKENS", "100000")
+)
+EMBEDDING_IMPORT_BATCH_SIZE = int(
+    os.getenv("EMBEDDING_IMPORT_BATCH_SIZE", "512")
+)
+EMBEDDING_IMPORT_CONCURRENCY = int(
+    os.getenv("EMBEDDING_IMPORT_CONCURRENCY", "4")
+)
+EMBEDDING_IMPORT_RPM = int(os.getenv("EMBEDDING_IMPORT_RPM", "3000"))
+EMBEDDING_IMPORT_TPM = int(os.getenv("EMBEDDING_IMPORT_TPM", "1000000"))
+EMBEDDING_IMPORT_RETRIES = int(os.getenv("EMBEDDING_IMPORT_RETRIES", "5"))
+EMBEDDING_IMPORT_PROGRESS_SECONDS = float(
+    os.getenv("EMBEDDING_IMPORT_PROGRESS_SECONDS", "5")
+)
+
+
+def share_rate_limits(parts: int):
+    """
+    Give this process an equal share of the RPM / TPM limits, for imports
+    running in several processes against the same API key
+    """
+
+    global EMBEDDING_IMPORT_RPM, EMBEDDING_IMPORT_TPM
+
+    if parts > 1:
+        # 0 stays 0, no limit
+        EMBEDDING_IMPORT_RPM = EMBEDDING_IMPORT_RPM and max(
+            1, EMBEDDING_IMPORT_RPM // parts
+        )
+        EMBEDDING_IMPORT_TPM = EMBEDDING_IMPORT_TPM and max(
+            1, EMBEDDING_IMPORT_TPM // parts
+        )
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The OpenAI model's tokenizer, or None to estimate instead"""
+
+    provider = openai_embeddings.get_provider()
+    if tiktoken is None or provider.name != "openai":
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(provider.model)
+    except Exception as e:
+        print(f"Estimating token counts, tokenizer unavailable: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in a text, estimated at 4 characters per token without tiktoken"""
+
+    encoding = _encoding()
+
+    if encoding is None:
+        return len(text) // 4 + 1
+
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def token_batches(
+    texts: list[str],
+    max_tokens: int = EMBEDDING_IMPORT_BATCH_TOKENS,
+    max_size: int = EMBEDDING_IMPORT_BATCH_SIZE,
+):
+    """Yield (texts, tokens) batches within both limits, keeping text order"""
+
+    batch = []
+    tokens = 0
+
+    for text in texts:
+        count = count_tokens(text)
+
+        if batch and (tokens + count > max_tokens or len(batch) >= max_size):
+            yield batch, tokens
+            batch = []
+            tokens = 0
+
+        batch.append(text)
+        tokens += count
+
+    if batch:
+        yield batch, tokens
+
+
+class EmbeddingStage:
+    """
+    Embeds texts on a background event loop, so an import can keep reading
+    and writing rows while batches are in flight. submit() returns a
+    concurrent.futures.Future of a float32 matrix with one row per text.
+    """
+
+    def __init__(
+        self,
+        total: int = None,
+        concurrency: int = EMBEDDING_IMPORT_CONCURRENCY,
+        batch_tokens: int = EMBEDDING_IMPORT_BATCH_TOKENS,
+        batch_size: int = EMBEDDING_IMPORT_BATCH_SIZE,
+        rpm: int = None,
+        tpm: int = None,
+        retries: int = EMBEDDING_IMPORT_RETRIES,
+        progress_seconds: float = EMBEDDING_IMPORT_PROGRESS_SECONDS,
+    ):
+        self.provider = openai_embeddings.get_provider()
+        self.model = self.provider.cache_key
+        self.total = total
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.retries = retries
+        self.progress_seconds = progress_seconds
+        self.limiter = RateLimiter(
+            EMBEDDING_IMPORT_RPM if rpm is None else rpm,
+            EMBEDDING_IMPORT_TPM if tpm is None else tpm,
+        )
+
+        self.stats = {
+            "texts": 0,
+            "duplicates": 0,
+            "cached": 0,
+            "embedded": 0,
+            "batches": 0,
+            "tokens": 0,
+            "retries": 0,
+            "checkpoint_errors": 0,
+        }
+
+        if cache.disabled or not cache.persist:
+            print(
+                "Embedding cache persistence is off, a restarted import embeds "
+                "every text again"
+            )
+
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, daemon=True
+        )
+        self._futures = set()
+        self._started_at = None
+        self._reported_at = 0.0
+
+    def __enter__(self):
+        self._thread.start()
+        self._started_at = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Cancel anything still in flight and stop the event loop"""
+
+        for future in list(self._futures):
+            future.cancel()
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def submit(self, texts: list[str]):
+        """Start embedding texts, returning a Future of their vectors"""
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._embed(texts), self._loop
+        )
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    async def _embed(self, texts: list[str]) -> np.ndarray:
+        """Embed texts, reading and checkpointing through the embedding cache"""
+
+        unique = list(dict.fromkeys(texts))
+
+        stored = await asyncio.to_thread(cache.get_many, self.model, unique)
+        vectors = {
+            unique[i]: np.asarray(vector, dtype=np.float32)
+            for i, vector in stored.items()
+        }
+        self.stats["cached"] += len(vectors)
+
+        missing = [text for text in unique if text not in vectors]
+        batches = list(
+            token_batches(missing, self.batch_tokens, self.batch_size)
+        )
+        results = await asyncio.gather(
+            *(self._embed_batch(batch, tokens) for batch, tokens in batches)
+        )
+
+        for (batch, _), matrix in zip(batches, results):
+            vectors.update(zip(batch, matrix))
+
+        self.stats["texts"] += len(texts)
+        self.stats["duplicates"] += len(texts) - len(unique)
+        self._progress()
+        return np.stack([vectors[text] for text in texts])
+
+    async def _embed_batch(self, batch: list[str], tokens: int) -> np.ndarray:
+        """Embed one batch within the limits, retrying with backoff"""
+
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self.limiter.acquire(tokens)
+
+                try:
+                    vectors = await self.provider.aembed_documents(
+                        batch, priority=IMPORT, tokens=tokens
+                    )
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        raise
+
+                    delay = min(60, 2**attempt) * (0.5 + random.random())
+                    self.stats["retries"] += 1
+                    print(
+                        f"Embedding batch failed ({e}), retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+        # checkpoint the batch so a restarted import doesn't pay for it again.
+        # The vectors are still good, so a failed write doesn't fail the import
+        try:
+            await asyncio.to_thread(
+                cache.put_many, self.model, batch, vectors, raise_errors=True
+            )
+        except Exception as e:
+            self.stats["checkpoint_errors"] += 1
+            print(
+                f"Checkpointing {len(batch)} embeddings failed, a restarted "
+                f"import embeds them again: {e}"
+            )
+
+        self.stats["batches"] += 1
+        self.stats["embedded"] += len(batch)
+        self.stats["tokens"] += tokens
+
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _progress(self):
+        """Print progress and an ETA every progress_seconds, and when done"""
+
+        now = time.monotonic()
+        done = self.stats["texts"]
+        finished = self.total is not None and done >= self.total
+
+        if not finished and now - self._reported_at < self.progress_seconds:
+            return
+
+        self._reported_at = now
+        elapsed = now - self._started_at
+
+        if self.total:
+            eta = elapsed / done * (self.total - done) if done else 0
+            progress = (
+                f"{done}/{self.total} texts ({done / self.total:.0%}), "
+                f"ETA {eta:.0f}s"
+            )
+        else:
+            progress = f"{done} texts"
+
+        print(
+            f"Embedded {progress}: {self.stats['embedded']} embedded in "
+            f"{self.stats['batches']} batches, {self.stats['cached']} from cache, "
+            f"{self.stats['tokens'] / max(elapsed, 1e-9):.0f} tokens/s"
+            + (
+                f", {self.stats['checkpoint_errors']} failed checkpoints"
+                if self.stats["checkpoint_errors"]
+                else ""
+            )
+        )
+
+    def info(self) -> dict:
+        """Counters for the stage and its rate limiter"""
+
+        return {**self.stats, "limiter": self.limiter.info()}
@@ -0,0 +1,38 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import numpy as np
+
+
+def truncate(vector, dimensions: int) -> list[float]:
+    """
+    Shorten an embedding to its first N dimensions and renormalize it.
+    text-embedding-3 models are trained so that prefixes of the embedding
+    are usable embeddings on their own (Matryoshka representation learning).
+    """
+
+    short = np.asarray(vector, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(short)
+
+    if norm:
+        short = short / norm
+
+    return short.tolist()
+
+
+def truncate_rows(matrix, dimensions: int) -> np.ndarray:
+    """truncate for every row of a matrix at once"""
+
+    short = np.asarray(matrix, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(short, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return short / norms
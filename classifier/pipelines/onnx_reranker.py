@@ -0,0 +1,139 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+from classifier.pipelines.reranker import entailment_id
+from classifier.pipelines.zero_shot import RERANKER_THREADS
+
+#
+# ONNX Runtime backend for the reranker. The zero-shot model is exported to
+# ONNX once and cached under RERANKER_ONNX_DIR, along with a copy whose
+# weights are dynamically quantized to int8 when RERANKER_ONNX_INT8 is set.
+# Exporting needs `optimum[exporters]` (and PyTorch), running only needs
+# `onnxruntime` and the tokenizer, so workers can load a cached export
+# without either framework installed.
+#
+RERANKER_ONNX_DIR = os.getenv(
+    "RERANKER_ONNX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ahc", "onnx"),
+)
+RERANKER_ONNX_INT8 = os.getenv("RERANKER_ONNX_INT8", "true").lower() == "true"
+
+
+def model_dir(model_name: str) -> str:
+    """Directory a model's export is cached in"""
+
+    return os.path.join(
+        RERANKER_ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+    )
+
+
+def export(model_name: str, int8: bool = RERANKER_ONNX_INT8) -> str:
+    """
+    Export a model to ONNX and quantize it, unless already cached. Exports
+    are written next to the cache and moved into place, so concurrent workers
+    never read a partial export. Returns the path of the model file.
+    """
+
+    directory = model_dir(model_name)
+    path = os.path.join(directory, "model.onnx")
+
+    if not os.path.exists(path):
+        from optimum.exporters.onnx import main_export
+
+        print(f"Exporting {model_name} to ONNX")
+        staging = f"{directory}.{os.getpid()}.tmp"
+        main_export(model_name, output=staging, task="text-classification")
+
+        try:
+            os.makedirs(os.path.dirname(directory), exist_ok=True)
+            os.rename(staging, directory)
+        except OSError:
+            # another worker finished first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    if not int8:
+        return path
+
+    quantized = os.path.join(directory, "model.int8.onnx")
+
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"Quantizing {model_name} to int8")
+        staging = f"{quantized}.{os.getpid()}.tmp"
+        quantize_dynamic(path, staging, weight_type=QuantType.QInt8)
+        os.replace(staging, quantized)
+
+    return quantized
+
+
+class OnnxReranker:
+    """Entailment logits of premise/hypothesis pairs from an ONNX export."""
+
+    def __init__(
+        self,
+        model_name: str,
+        int8: bool = RERANKER_ONNX_INT8,
+        threads: int = RERANKER_THREADS,
+    ):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        path = export(model_name, int8)
+        directory = os.path.dirname(path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        with open(
+            os.path.join(directory, "config.json"), encoding="utf-8"
+        ) as file:
+            self.entailment_id = entailment_id(json.load(file)["label2id"])
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def __call__(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        """Entailment logits of pairs, in one padded forward pass"""
+
+        inputs = self.tokenizer(
+            [premise for premise, _ in pairs],
+            [hypothesis for _, hypothesis in pairs],
+            padding=True,
+            truncation="only_first",
+            return_tensors="np",
+        )
+
+        logits = self.session.run(
+            None,
+            {
+                name: value.astype(np.int64)
+                for name, value in inputs.items()
+                if name in self.input_names
+            },
+        )[0]
+
+        return logits[:, self.entailment_id]
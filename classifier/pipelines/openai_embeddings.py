@@ -9,31 +9,268 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+import os
+import threading
+import time
+
 from dotenv import load_dotenv
 
+from api.metrics import timed
+from classifier.pipelines.embedding_cache import cache
+from classifier.pipelines.embedding_providers import load_provider
+
 load_dotenv()
 
 
-WHICH_MODEL = 1
-models = ["text-embedding-3-small", "text-embedding-3-large"]
-print(f"Using model: {models[WHICH_MODEL]}")
-embeddings = OpenAIEmbeddings(model=models[WHICH_MODEL])
+_provider = None
+_lock = threading.Lock()
 
 
-def vectorize(text: str) -> list[float]:
-    """Vectorize a text string"""
+def get_provider():
+    """
+    The configured embedding provider (see embedding_providers), built on
+    first use. Providers load their client or model when first used, so
+    importing this module doesn't load langchain / openai or a local model.
+    """
+
+    global _provider
+
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                _provider = load_provider()
+
+    return _provider
+
+
+def __getattr__(name):
+    # `openai_embeddings.embeddings` still works
+    if name == "embeddings":
+        return get_provider()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+#
+# Concurrent vectorize_async calls are coalesced into one embedding request.
+# A batch is sent once it holds EMBEDDING_BATCH_MAX_SIZE texts or the oldest
+# text has waited EMBEDDING_BATCH_MAX_WAIT_MS, whichever comes first.
+#
+EMBEDDING_BATCH_DISABLED = (
+    os.getenv("EMBEDDING_BATCH_DISABLED", "false").lower() == "true"
+)
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(
+    os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")
+)
+
+
+class EmbeddingBatcher:
+    """Micro-batcher that collects pending texts and embeds them in one call."""
+
+    def __init__(
+        self,
+        embed_fn,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "texts_sent": 0,
+            "max_batch_size": 0,
+            "queue_wait_ms": 0.0,
+            "errors": 0,
+        }
+
+        self._loop = None
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, text: str) -> list[float]:
+        """Queue a text and wait for its embedding"""
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # futures are bound to a loop, so start fresh on a new one
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+
+        future = loop.create_future()
+        self._pending.append((text, future, time.monotonic()))
+        self.stats["requests"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything pending as one batch"""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        """Embed a batch and resolve each caller's future"""
+
+        sent_at = time.monotonic()
+        # identical texts in the same window only need to be embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+
+        self.stats["batches"] += 1
+        self.stats["texts_sent"] += len(texts)
+        self.stats["max_batch_size"] = max(
+            self.stats["max_batch_size"], len(batch)
+        )
+        self.stats["queue_wait_ms"] += sum(
+            (sent_at - queued_at) * 1000 for _, _, queued_at in batch
+        )
+
+        try:
+            vectors = dict(zip(texts, await self.embed_fn(texts)))
+        except Exception as e:
+            self.stats["errors"] += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[text])
 
-    return embeddings.embed_query(text)
+    def info(self) -> dict:
+        """Batching metrics"""
 
+        batches = self.stats["batches"] or 1
+        requests = self.stats["requests"] or 1
 
-def bulk_vectorize(texts: list[str]) -> list[list[float]]:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "avg_batch_size": self.stats["requests"] / batches,
+            "avg_queue_wait_ms": self.stats["queue_wait_ms"] / requests,
+        }
+
+
+async def aembed_documents(texts: list[str]) -> list[list[float]]:
+    """Embed texts in one request"""
+
+    return await get_provider().aembed_documents(texts)
+
+
+batcher = EmbeddingBatcher(aembed_documents)
+
+
+@timed("embed")
+def vectorize(text: str, bypass_cache: bool = False) -> list[float]:
+    """
+    Vectorize a text string. Blocks on the cache's database and the provider,
+    so async code uses vectorize_async.
+    """
+
+    model = get_provider().cache_key
+
+    if not bypass_cache:
+        vector = cache.get(model, text)
+        if vector is not None:
+            return vector
+
+    vector = get_provider().embed_query(text)
+
+    if not bypass_cache:
+        cache.put(model, text, vector)
+
+    return vector
+
+
+@timed("embed")
+def bulk_vectorize(
+    texts: list[str], bypass_cache: bool = False
+) -> list[list[float]]:
+    """
+    Vectorize a list of text strings. Blocks like vectorize, so async code
+    uses bulk_vectorize_async.
+    """
+
+    if bypass_cache:
+        return get_provider().embed_documents(texts)
+
+    model = get_provider().cache_key
+
+    vectors = cache.get_many(model, texts)
+    missing = [i for i in range(len(texts)) if i not in vectors]
+
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        missing_vectors = get_provider().embed_documents(missing_texts)
+        cache.put_many(model, missing_texts, missing_vectors)
+        vectors.update(zip(missing, missing_vectors))
+
+    return [vectors[i] for i in range(len(texts))]
+
+
+@timed("embed")
+async def bulk_vectorize_async(
+    texts: list[str], bypass_cache: bool = False
+) -> list[list[float]]:
     """Vectorize a list of text strings"""
 
-    return embeddings.embed_documents(texts)
+    if bypass_cache:
+        return await get_provider().aembed_documents(texts)
+
+    model = get_provider().cache_key
 
+    vectors = await asyncio.to_thread(cache.get_many, model, texts)
+    missing = [i for i in range(len(texts)) if i not in vectors]
 
-async def vectorize_async(text: str) -> list[float]:
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        missing_vectors = await get_provider().aembed_documents(missing_texts)
+        await asyncio.to_thread(
+            cache.put_many, model, missing_texts, missing_vectors
+        )
+        vectors.update(zip(missing, missing_vectors))
+
+    return [vectors[i] for i in range(len(texts))]
+
+
+@timed("embed")
+async def vectorize_async(text: str, bypass_cache: bool = False) -> list[float]:
     """Vectorize a text string"""
 
-    return await embeddings.aembed_query(text)
+    model = get_provider().cache_key
+
+    if not bypass_cache:
+        vector = await cache.aget(model, text)
+        if vector is not None:
+            return vector
+
+    if EMBEDDING_BATCH_DISABLED:
+        vector = await get_provider().aembed_query(text)
+    else:
+        vector = await batcher.submit(text)
+
+    if not bypass_cache:
+        await cache.aput(model, text, vector)
+
+    return vector
@@ -0,0 +1,68 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import numpy as np
+
+
+#
+# Quantized codes are only used to shortlist candidates. The shortlist is
+# always rescored against the float embeddings, so quantization costs recall
+# only when a true neighbor falls outside the shortlist.
+#
+# binary: one sign bit per dimension, compared by Hamming distance (32x smaller)
+# int8: one byte per dimension, scaled per dimension (4x smaller)
+#
+quantizations = ["binary", "int8"]
+
+# number of set bits in each byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def binarize(vector) -> str:
+    """Sign bits of an embedding as a bit string, for a Postgres bit column"""
+
+    return "".join(np.where(np.asarray(vector) > 0, "1", "0"))
+
+
+def pack_bits(matrix: np.ndarray) -> np.ndarray:
+    """Sign bits of each row, packed 8 to a byte"""
+
+    return np.packbits(np.asarray(matrix) > 0, axis=1)
+
+
+def hamming(packed_queries: np.ndarray, packed: np.ndarray) -> np.ndarray:
+    """Hamming distances between packed query rows and packed rows"""
+
+    return np.stack(
+        [
+            _POPCOUNT[np.bitwise_xor(packed, query)].sum(axis=1, dtype=np.int32)
+            for query in packed_queries
+        ]
+    )
+
+
+def int8_scales(matrix: np.ndarray) -> np.ndarray:
+    """Per-dimension scales mapping the largest magnitude of each dimension to 127"""
+
+    peak = np.abs(np.asarray(matrix, dtype=np.float32)).max(axis=0)
+    peak[peak == 0] = 1
+    return (127 / peak).astype(np.float32)
+
+
+def quantize_int8(matrix: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """
+    Scale and round rows to int8. A query divided by the same scales scores
+    against the codes as it would against the original rows.
+    """
+
+    return np.clip(
+        np.rint(np.asarray(matrix, dtype=np.float32) * scales), -127, 127
+    ).astype(np.int8)
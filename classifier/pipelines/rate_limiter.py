@@ -0,0 +1,513 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# priorities of AdaptiveRateLimiter requests, lower ones are granted first
+INTERACTIVE = 0
+IMPORT = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", IMPORT: "import"}
+
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits as two token buckets that
+    refill continuously. A limit of 0 turns that bucket off.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+
+        self.stats = {"acquired": 0, "tokens": 0, "waits": 0, "wait_ms": 0.0}
+
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_seconds(self, tokens: int) -> float:
+        """Seconds until a request of tokens fits, 0 if it fits now"""
+
+        wait = 0.0
+
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until a request of tokens is within both limits, then take it"""
+
+        # a request bigger than the bucket could never fit, so let it drain it
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+
+        async with self._lock:
+            started = time.monotonic()
+            waited = False
+
+            self._refill()
+            while (wait := self._wait_seconds(tokens)) > 0:
+                waited = True
+                await asyncio.sleep(wait)
+                self._refill()
+
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+            self.stats["acquired"] += 1
+            self.stats["tokens"] += tokens
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_ms"] += (time.monotonic() - started) * 1000
+
+    def info(self) -> dict:
+        """Limits and wait counters"""
+
+        return {**self.stats, "rpm": self.rpm, "tpm": self.tpm}
+
+
+class RateLimitTimeout(Exception):
+    """A request waited longer than its max_wait for the rate limiter"""
+
+    def __init__(self, waited: float):
+        super().__init__(f"Waited {waited:.1f}s for the embedding rate limit")
+        self.waited = waited
+
+
+def parse_duration(value: str) -> float:
+    """Seconds of a header like "20ms", "1.5" or "6m0s", None if unset"""
+
+    if not value:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _header_int(headers, name: str) -> int:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    return True
+
+
+class _Waiter:
+    """A queued request, and how to wake the thread or task waiting for it"""
+
+    def __init__(self, tokens: int, priority: int, wake):
+        self.tokens = tokens
+        self.priority = priority
+        self.wake = wake
+        self.granted = False
+        self.queued_at = time.monotonic()
+
+
+class AdaptiveRateLimiter:
+    """
+    RPM / TPM token buckets like RateLimiter, shared by every thread and event
+    loop of a process, that also bound the requests in flight and adapt to
+    the API. The rate-limit headers of each response correct the limits and
+    lower the buckets to what the API says remains, which includes what other
+    processes used. A 429 halves the concurrency and pauses every request for
+    its retry-after, each success raises it again by 1 / concurrency (AIMD).
+
+    Waiting requests are granted in priority order, and IMPORT ones leave
+    reserve of both buckets to INTERACTIVE ones. A request waits at most
+    max_wait seconds (import_max_wait for IMPORT ones, None for no bound),
+    then raises RateLimitTimeout. A limit of 0 turns that bucket off until a
+    response tells the API's limit.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 32,
+        reserve: float = 0.2,
+        max_wait: float = 30.0,
+        import_max_wait: float = None,
+    ):
+        self.configured_rpm = self.rpm = rpm
+        self.configured_tpm = self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.reserve = reserve
+        self.max_wait = {INTERACTIVE: max_wait, IMPORT: import_max_wait}
+
+        self.stats = {
+            "acquired": 0,
+            "tokens": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "timeouts": 0,
+            "throttled": 0,
+            "max_queued": 0,
+        }
+        self.priority_stats = {
+            name: {"acquired": 0, "wait_ms": 0.0, "timeouts": 0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._queue = []
+        self._order = itertools.count()
+        # the head of the queue, sleeping until the buckets fit it
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_seconds(self, tokens: int, priority: int) -> float:
+        """Seconds until a request fits, 0 if it fits now"""
+
+        wait = max(0.0, self._paused_until - time.monotonic())
+        reserve = 0.0 if priority == INTERACTIVE else self.reserve
+
+        if self.rpm:
+            need = min(self.rpm, 1 + reserve * self.rpm)
+            if self._requests < need:
+                wait = max(wait, (need - self._requests) * 60 / self.rpm)
+        if self.tpm:
+            need = min(self.tpm, tokens + reserve * self.tpm)
+            if self._tokens < need:
+                wait = max(wait, (need - self._tokens) * 60 / self.tpm)
+
+        return wait
+
+    def _take(self, waiter: _Waiter):
+        """Grant a request, taking it from the buckets"""
+
+        waiter.granted = True
+        self._in_flight += 1
+        if self._timer is waiter:
+            self._timer = None
+
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= min(waiter.tokens, self.tpm)
+
+        waited = (time.monotonic() - waiter.queued_at) * 1000
+        priority = self.priority_stats[PRIORITY_NAMES[waiter.priority]]
+        priority["acquired"] += 1
+        priority["wait_ms"] += waited
+
+        self.stats["acquired"] += 1
+        self.stats["tokens"] += waiter.tokens
+        self.stats["wait_ms"] += waited
+        if waited >= 1:
+            self.stats["waits"] += 1
+
+    def _dispatch(self):
+        """Grant waiting requests in priority order while they fit"""
+
+        self._refill()
+
+        while self._queue and self._in_flight < int(self.concurrency):
+            waiter = self._queue[0][2]
+
+            if self._wait_seconds(waiter.tokens, waiter.priority) > 0:
+                # the head sleeps until it fits, the rest until they're woken
+                if self._timer is not waiter:
+                    self._timer = waiter
+                    waiter.wake()
+                return
+
+            heapq.heappop(self._queue)
+            self._take(waiter)
+            waiter.wake()
+
+    def _enqueue(self, tokens: int, priority: int, wake) -> _Waiter:
+        waiter = _Waiter(tokens, priority, wake)
+
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._order), waiter))
+            self.stats["max_queued"] = max(
+                self.stats["max_queued"], len(self._queue)
+            )
+            self._dispatch()
+
+        return waiter
+
+    def _poll(self, waiter: _Waiter, deadline: float):
+        """
+        (True, None) once the request is granted, else (False, seconds to
+        sleep unless woken first, None for no bound). Raises RateLimitTimeout
+        past the deadline.
+        """
+
+        with self._lock:
+            if not waiter.granted:
+                self._dispatch()
+            if waiter.granted:
+                return True, None
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                self._remove(waiter)
+                self.stats["timeouts"] += 1
+                self.priority_stats[PRIORITY_NAMES[waiter.priority]][
+                    "timeouts"
+                ] += 1
+                raise RateLimitTimeout(now - waiter.queued_at)
+
+            # only the head sleeps until the buckets refill, the rest (and
+            # the head, when it waits for a request to finish) until woken
+            timeout = None
+            if self._timer is waiter:
+                timeout = self._wait_seconds(waiter.tokens, waiter.priority)
+                if not timeout:
+                    # it fits but all slots are taken, a release wakes it
+                    self._timer = timeout = None
+            if deadline is not None:
+                timeout = min(deadline - now, timeout or deadline - now)
+
+            return False, timeout
+
+    def _remove(self, waiter: _Waiter):
+        """Take a request out of the queue, and let the next one go"""
+
+        self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+        heapq.heapify(self._queue)
+        if self._timer is waiter:
+            self._timer = None
+
+        self._dispatch()
+
+    def _abandon(self, waiter: _Waiter):
+        """Give up on a request that failed or was cancelled while waiting"""
+
+        if waiter.granted:
+            self.release()
+            return
+
+        with self._lock:
+            if waiter.granted:
+                self._in_flight -= 1
+            self._remove(waiter)
+
+    def _deadline(self, priority: int) -> float:
+        max_wait = self.max_wait.get(priority)
+        return None if max_wait is None else time.monotonic() + max_wait
+
+    async def acquire(self, tokens: int = 0, priority: int = INTERACTIVE):
+        """Wait for a request's turn within the limits, from any event loop"""
+
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the loop closed, its waiters went with it
+                pass
+
+        deadline = self._deadline(priority)
+        waiter = self._enqueue(tokens, priority, wake)
+
+        try:
+            while True:
+                event.clear()
+                granted, timeout = self._poll(waiter, deadline)
+                if granted:
+                    return
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def acquire_sync(self, tokens: int = 0, priority: int = INTERACTIVE):
+        """
+        Wait for a request's turn within the limits, blocking the thread.
+        Waiting could stall an event loop for up to the max wait, so async
+        code uses acquire instead.
+        """
+
+        if _loop_running():
+            raise RuntimeError(
+                "acquire_sync would block the event loop, use acquire"
+            )
+
+        event = threading.Event()
+        deadline = self._deadline(priority)
+        waiter = self._enqueue(tokens, priority, event.set)
+
+        try:
+            while True:
+                event.clear()
+                granted, timeout = self._poll(waiter, deadline)
+                if granted:
+                    return
+
+                event.wait(timeout)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def release(self):
+        """Finish a granted request, letting the next one go"""
+
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @asynccontextmanager
+    async def limit(self, tokens: int = 0, priority: int = INTERACTIVE):
+        """Hold a request's turn for the duration of the block"""
+
+        await self.acquire(tokens, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def limit_sync(self, tokens: int = 0, priority: int = INTERACTIVE):
+        """Hold a request's turn for the duration of the block, blocking"""
+
+        self.acquire_sync(tokens, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def observe(self, status: int, headers):
+        """Adapt to a response from the API: its status and rate-limit headers"""
+
+        limit_requests = _header_int(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        remaining_requests = _header_int(
+            headers, "x-ratelimit-remaining-requests"
+        )
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+
+        with self._lock:
+            self._refill()
+
+            if limit_requests:
+                rpm = min(self.configured_rpm or limit_requests, limit_requests)
+                if not self.rpm:
+                    # the bucket was off, so start it full
+                    self._requests = float(rpm)
+                self.rpm = rpm
+                self._requests = min(self._requests, rpm)
+            if limit_tokens:
+                tpm = min(self.configured_tpm or limit_tokens, limit_tokens)
+                if not self.tpm:
+                    self._tokens = float(tpm)
+                self.tpm = tpm
+                self._tokens = min(self._tokens, tpm)
+
+            if self.rpm and remaining_requests is not None:
+                self._requests = min(self._requests, remaining_requests)
+            if self.tpm and remaining_tokens is not None:
+                self._tokens = min(self._tokens, remaining_tokens)
+
+            if status == 429:
+                self.stats["throttled"] += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+
+                pause = parse_duration(headers.get("retry-after-ms"))
+                if pause is not None:
+                    pause /= 1000
+                else:
+                    pause = parse_duration(headers.get("retry-after")) or 1.0
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + pause
+                )
+            elif status < 400:
+                self.concurrency = min(
+                    self.max_concurrency,
+                    self.concurrency + 1 / self.concurrency,
+                )
+
+            self._dispatch()
+
+    def info(self) -> dict:
+        """Limits, buckets, concurrency, queue depth and wait counters"""
+
+        with self._lock:
+            self._refill()
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._queue:
+                queued[PRIORITY_NAMES[priority]] += 1
+
+            return {
+                **self.stats,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": self._requests if self.rpm else None,
+                "tokens_available": self._tokens if self.tpm else None,
+                "concurrency": int(self.concurrency),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "queued_by_priority": queued,
+                "paused_seconds": max(
+                    0.0, self._paused_until - time.monotonic()
+                ),
+                "priorities": {
+                    name: dict(stats)
+                    for name, stats in self.priority_stats.items()
+                },
+            }
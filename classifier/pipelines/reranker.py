@@ -0,0 +1,267 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from api.metrics import timed
+from classifier.pipelines.zero_shot import get_classifier, models, which_model
+
+#
+# Reranking runs on a dedicated inference thread, off the event loop.
+# Concurrent rerank calls are queued and their premise/hypothesis pairs are
+# scored in one padded forward pass, sent once RERANKER_BATCH_MAX_SIZE pairs
+# are pending or the oldest call has waited RERANKER_BATCH_MAX_WAIT_MS.
+#
+RERANKER_BATCH_DISABLED = (
+    os.getenv("RERANKER_BATCH_DISABLED", "false").lower() == "true"
+)
+RERANKER_BATCH_MAX_SIZE = int(os.getenv("RERANKER_BATCH_MAX_SIZE", "64"))
+RERANKER_BATCH_MAX_WAIT_MS = float(os.getenv("RERANKER_BATCH_MAX_WAIT_MS", "5"))
+
+#
+# "pipeline" runs the model with the framework transformers loads (PyTorch or
+# TensorFlow), "onnx" runs an exported copy with ONNX Runtime, see
+# classifier.pipelines.onnx_reranker.
+#
+backends = ["pipeline", "onnx"]
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "pipeline")
+
+# the zero-shot pipeline's default template
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+def entailment_id(label2id: dict) -> int:
+    """Index of the entailment logit, found like the zero-shot pipeline does"""
+
+    for label, index in label2id.items():
+        if label.lower().startswith("entail"):
+            return index
+
+    return -1
+
+
+def entailment_logits(pairs: list[tuple[str, str]]) -> np.ndarray:
+    """
+    Entailment logits of (premise, hypothesis) pairs, in one padded forward
+    pass. Blocking, so run it on the inference thread.
+    """
+
+    classifier = get_classifier()
+    tokenizer, model = classifier.tokenizer, classifier.model
+
+    inputs = tokenizer(
+        [premise for premise, _ in pairs],
+        [hypothesis for _, hypothesis in pairs],
+        padding=True,
+        truncation="only_first",
+        return_tensors=classifier.framework,
+    )
+
+    if classifier.framework == "pt":
+        import torch
+
+        with torch.inference_mode():
+            logits = model(**inputs).logits.float().cpu().numpy()
+    else:
+        logits = model(**inputs).logits.numpy()
+
+    return logits[:, entailment_id(model.config.label2id)]
+
+
+def load_score_fn(backend: str = RERANKER_BACKEND):
+    """The entailment logits function of a backend, loading its model"""
+
+    if backend == "pipeline":
+        get_classifier()
+        return entailment_logits
+
+    if backend == "onnx":
+        from classifier.pipelines.onnx_reranker import OnnxReranker
+
+        return OnnxReranker(models[which_model])
+
+    raise ValueError(f"Unknown reranker backend '{backend}'")
+
+
+def softmax(logits: np.ndarray) -> list[float]:
+    """Scores of a premise's labels, as the single-label pipeline computes them"""
+
+    exp = np.exp(logits - logits.max())
+    return (exp / exp.sum()).tolist()
+
+
+class RerankBatcher:
+    """Micro-batcher that scores the pairs of concurrent reranks in one pass."""
+
+    def __init__(
+        self,
+        score_fn=None,
+        backend: str = RERANKER_BACKEND,
+        max_batch_size: int = RERANKER_BATCH_MAX_SIZE,
+        max_wait_ms: float = RERANKER_BATCH_MAX_WAIT_MS,
+    ):
+        self.score_fn = score_fn
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        # one forward pass at a time, the model's own threads do the rest
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reranker"
+        )
+
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "pairs": 0,
+            "max_batch_pairs": 0,
+            "queue_wait_ms": 0.0,
+            "inference_ms": 0.0,
+            "errors": 0,
+        }
+
+        self._loop = None
+        self._pending = []
+        self._pending_pairs = 0
+        self._timer = None
+        self._tasks = set()
+
+    def score_pairs(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        """
+        Entailment logits of pairs. Runs on the inference thread, which also
+        loads the backend's model on first use.
+        """
+
+        if self.score_fn is None:
+            self.score_fn = load_score_fn(self.backend)
+
+        return self.score_fn(pairs)
+
+    async def submit(self, premise: str, labels: list[str]) -> list[float]:
+        """Queue a premise and its labels and wait for the label scores"""
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # futures are bound to a loop, so start fresh on a new one
+            self._loop = loop
+            self._pending = []
+            self._pending_pairs = 0
+            self._timer = None
+
+        future = loop.create_future()
+        self._pending.append((premise, labels, future, time.monotonic()))
+        self._pending_pairs += len(labels)
+        self.stats["requests"] += 1
+
+        if self._pending_pairs >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything pending as one batch"""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        self._pending_pairs = 0
+        if not batch:
+            return
+
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        """Score a batch on the inference thread and resolve each caller's future"""
+
+        sent_at = time.monotonic()
+        pairs = [
+            (premise, HYPOTHESIS_TEMPLATE.format(label))
+            for premise, labels, _, _ in batch
+            for label in labels
+        ]
+
+        self.stats["batches"] += 1
+        self.stats["pairs"] += len(pairs)
+        self.stats["max_batch_pairs"] = max(
+            self.stats["max_batch_pairs"], len(pairs)
+        )
+        self.stats["queue_wait_ms"] += sum(
+            (sent_at - queued_at) * 1000 for _, _, _, queued_at in batch
+        )
+
+        try:
+            logits = await self._loop.run_in_executor(
+                self.executor, self.score_pairs, pairs
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.stats["inference_ms"] += (time.monotonic() - sent_at) * 1000
+
+        start = 0
+        for _, labels, future, _ in batch:
+            if not future.done():
+                future.set_result(softmax(logits[start : start + len(labels)]))
+            start += len(labels)
+
+    def info(self) -> dict:
+        """Batching metrics"""
+
+        batches = self.stats["batches"] or 1
+        requests = self.stats["requests"] or 1
+
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "avg_batch_pairs": self.stats["pairs"] / batches,
+            "avg_queue_wait_ms": self.stats["queue_wait_ms"] / requests,
+            "avg_inference_ms": self.stats["inference_ms"] / batches,
+        }
+
+
+batcher = RerankBatcher()
+
+
+@timed("rerank")
+async def score(premise: str, labels: list[str]) -> list[float]:
+    """
+    Zero-shot scores of labels for a premise, in the order of labels, without
+    blocking the event loop
+    """
+
+    if not labels:
+        return []
+
+    if RERANKER_BATCH_DISABLED:
+        pairs = [
+            (premise, HYPOTHESIS_TEMPLATE.format(label)) for label in labels
+        ]
+        logits = await asyncio.get_running_loop().run_in_executor(
+            batcher.executor, batcher.score_pairs, pairs
+        )
+        return softmax(logits)
+
+    return await batcher.submit(premise, labels)
@@ -9,7 +9,24 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from transformers import pipeline
+import os
+import threading
+
+#
+# Intra-op threads used by the model. Every uvicorn worker loads its own copy,
+# so by default each gets an equal share of the cores (WEB_CONCURRENCY is the
+# number of workers). The environment variables have to be set before the
+# frameworks are loaded.
+#
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+RERANKER_THREADS = int(
+    os.getenv(
+        "RERANKER_THREADS",
+        str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)),
+    )
+)
+os.environ.setdefault("OMP_NUM_THREADS", str(RERANKER_THREADS))
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(RERANKER_THREADS))
 
 #
 # Switch the zero-shot classifier model here.
@@ -24,4 +41,41 @@ models = [
     "facebook/bart-large-mnli",  # 3
     "knowledgator/comprehend_it-base",
 ]  # 4
-classifier = pipeline("zero-shot-classification", model=models[which_model])
+
+_classifier = None
+_lock = threading.Lock()
+
+
+def get_classifier():
+    """
+    The transformers zero-shot pipeline, built on first use so importing this
+    module doesn't load a framework (the ONNX backend never needs it)
+    """
+
+    global _classifier
+
+    if _classifier is None:
+        with _lock:
+            if _classifier is None:
+                from transformers import pipeline
+
+                classifier = pipeline(
+                    "zero-shot-classification", model=models[which_model]
+                )
+
+                if getattr(classifier, "framework", None) == "pt":
+                    import torch
+
+                    torch.set_num_threads(RERANKER_THREADS)
+
+                _classifier = classifier
+
+    return _classifier
+
+
+def __getattr__(name):
+    # `from classifier.pipelines.zero_shot import classifier` still works
+    if name == "classifier":
+        return get_classifier()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
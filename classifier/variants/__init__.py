@@ -9,7 +9,32 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from .vector import classify as vector
-from .combined import classify as combined
+from importlib import import_module
 
-__all__ = ["vector", "combined"]
+__all__ = ["vector", "combined", "beam"]
+
+
+def __getattr__(name):
+    """
+    Variants are imported on first use, so a worker only loads the pipelines
+    of the variants it serves. `variants.combined` is the classify function of
+    the combined module, `variants.combined_batch` its classify_batch and
+    `variants.combined_tree` its classify_tree, if it has them.
+    """
+
+    variant, _, kind = name.partition("_")
+    if variant not in __all__ or kind not in ("", "batch", "tree"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # importing the submodule binds its name here, so replace it right away
+    module = import_module(f"{__name__}.{variant}")
+    globals()[variant] = module.classify
+    for kind in ("batch", "tree"):
+        function = getattr(module, f"classify_{kind}", None)
+        if function is not None:
+            globals()[f"{variant}_{kind}"] = function
+
+    if name not in globals():
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return globals()[name]
@@ -0,0 +1,256 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import os
+
+from sqlalchemy import select
+
+from api.dependencies import AsyncSession
+from api.metrics import timed
+from api.schemas import (
+    Classification,
+    ClassificationTreeNode,
+    ClassificationTreeOutput,
+    Config,
+    Item,
+)
+from classifier.pipelines.openai_embeddings import (
+    bulk_vectorize_async,
+    vectorize_async,
+)
+from db.hierarchy_tree import cache as hierarchy_cache
+from db.models import HSCode
+from db.services.hs_code_service import (
+    SubtreeNotFound,
+    get_scored_children_async,
+)
+
+#
+# Coarse-to-fine classification. Starting at the roots, only the children of
+# the CLASSIFY_BEAM_WIDTH best codes so far are scored at each level, internal
+# codes against the centroid of their leaves and leaves against their own
+# embedding, until every code in the beam is a leaf. Each level compares the
+# item with the children of a few codes instead of every leaf.
+#
+CLASSIFY_BEAM_WIDTH = int(os.getenv("CLASSIFY_BEAM_WIDTH", "5"))
+CLASSIFY_BEAM_MAX_DEPTH = int(os.getenv("CLASSIFY_BEAM_MAX_DEPTH", "32"))
+
+
+def item_to_text(item):
+    """Convert an item object into a text string to classify, as vector does"""
+
+    s = "item is named {:s}.".format(item["name"])
+    for category in item["categories"]:
+        s += " {:s} belongs to the category {:s}.".format(
+            item["name"], category
+        )
+
+    if item["description"] is not None:
+        s += " {:s} is described by {:s}.".format(
+            item["name"], item["description"]
+        )
+    return s
+
+
+async def beam_search(
+    db, vector, hierarchy_id=None, width=CLASSIFY_BEAM_WIDTH, start_ids=None
+):
+    """
+    Descend the hierarchy, or the subtrees below start_ids, keeping the best
+    `width` codes at each level. Returns the top nodes of the searched tree
+    and the final beam, as dicts with the scored columns and their children,
+    best first.
+    """
+
+    nodes = {}
+    roots = []
+    beam = []
+    parent_ids = start_ids
+
+    for _ in range(CLASSIFY_BEAM_MAX_DEPTH):
+        children = await get_scored_children_async(
+            db, vector, parent_ids, hierarchy_id
+        )
+
+        candidates = [node for node in beam if node["leaf"]] + [
+            {**child._asdict(), "children": []} for child in children
+        ]
+        if not candidates:
+            break
+
+        beam = sorted(candidates, key=lambda node: -node["similarity"])[:width]
+
+        for node in beam:
+            if node["id"] in nodes:
+                continue
+
+            nodes[node["id"]] = node
+            if node["parent_id"] not in nodes:
+                roots.append(node)
+            else:
+                nodes[node["parent_id"]]["children"].append(node)
+
+        parent_ids = [node["id"] for node in beam if not node["leaf"]]
+        if not parent_ids:
+            break
+
+    return roots, [node for node in beam if node["leaf"]]
+
+
+def _accepted(nodes, leaves) -> set:
+    """Ids of the codes on the paths down to the final leaves"""
+
+    by_id = {node["id"]: node for node in nodes}
+    accepted = set()
+
+    for leaf in leaves:
+        node = leaf
+        while node is not None and node["id"] not in accepted:
+            accepted.add(node["id"])
+            node = by_id.get(node["parent_id"])
+
+    return accepted
+
+
+def _walk(roots):
+    """Every node of a tree"""
+
+    for node in roots:
+        yield node
+        yield from _walk(node["children"])
+
+
+def _tree_node(node, accepted) -> ClassificationTreeNode:
+    return ClassificationTreeNode(
+        name=node["name"],
+        description=node["description"] or "",
+        confidence=node["similarity"],
+        accepted=node["id"] in accepted,
+        children=[_tree_node(child, accepted) for child in node["children"]],
+    )
+
+
+@timed("db")
+async def _start_ids(db, config, hierarchy_id):
+    """
+    Ids of the configured subtree's codes, or None to start at the roots.
+    Names are only unique within a hierarchy, so without one every code of
+    that name is a start.
+    """
+
+    if getattr(config, "subtree", None) is None:
+        return None
+
+    query = select(HSCode.id).where(HSCode.name == config.subtree)
+    if hierarchy_id is not None:
+        query = query.where(HSCode.hierarchy_id == hierarchy_id)
+
+    ids = (await db.execute(query)).scalars().all()
+    if not ids:
+        raise SubtreeNotFound(f"Subtree '{config.subtree}' not found.")
+
+    return ids
+
+
+@timed("db")
+async def _hierarchy_id(db, config):
+    """Id of the configured hierarchy, 0 if it doesn't exist, None for all"""
+
+    if config.hierarchy is None:
+        return None
+
+    hierarchy = await hierarchy_cache.hierarchy_async(
+        db, config.hierarchy.value
+    )
+    return hierarchy.id if hierarchy else 0
+
+
+def _classifications(leaves) -> list[Classification]:
+    return [
+        Classification(
+            name=leaf["name"],
+            description=leaf["description"],
+            hierarchy=leaf["hierarchy"],
+            confidence=leaf["similarity"],
+        )
+        for leaf in leaves
+    ]
+
+
+async def classify(
+    db: AsyncSession,
+    item: Item,
+    config: Config,
+):
+    """Vectorize an item and descend the hierarchy to its best leaves"""
+
+    vector = await vectorize_async(item_to_text(item))
+    hierarchy_id = await _hierarchy_id(db, config)
+
+    _, leaves = await beam_search(
+        db,
+        vector,
+        hierarchy_id,
+        getattr(config, "beam_width", None) or CLASSIFY_BEAM_WIDTH,
+        await _start_ids(db, config, hierarchy_id),
+    )
+
+    return _classifications(leaves)
+
+
+async def classify_batch(
+    db: AsyncSession,
+    items: list[Item],
+    config: Config,
+):
+    """Vectorize a batch of items and descend the hierarchy for each"""
+
+    vectors = await bulk_vectorize_async([item_to_text(item) for item in items])
+    hierarchy_id = await _hierarchy_id(db, config)
+    width = getattr(config, "beam_width", None) or CLASSIFY_BEAM_WIDTH
+    start_ids = await _start_ids(db, config, hierarchy_id)
+
+    # one session runs one query at a time, so items are searched in turn
+    results = []
+    for vector in vectors:
+        _, leaves = await beam_search(
+            db, vector, hierarchy_id, width, start_ids
+        )
+        results.append(_classifications(leaves))
+
+    return results
+
+
+async def classify_tree(
+    db: AsyncSession,
+    item: Item,
+    config: Config,
+) -> ClassificationTreeOutput:
+    """
+    Vectorize an item and descend the hierarchy, returning every code that
+    was in the beam. Codes on the paths to the final leaves are accepted.
+    """
+
+    vector = await vectorize_async(item_to_text(item))
+    hierarchy_id = await _hierarchy_id(db, config)
+
+    roots, leaves = await beam_search(
+        db,
+        vector,
+        hierarchy_id,
+        getattr(config, "beam_width", None) or CLASSIFY_BEAM_WIDTH,
+        await _start_ids(db, config, hierarchy_id),
+    )
+    accepted = _accepted(_walk(roots), leaves)
+
+    return ClassificationTreeOutput(
+        roots=[_tree_node(root, accepted) for root in roots]
+    )
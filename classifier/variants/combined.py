@@ -9,13 +9,22 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from api.dependencies import Session
+import asyncio
+
+from api.dependencies import AsyncSession
 from api.schemas import Classification, Config, Item
 
-from classifier.pipelines.openai_embeddings import vectorize
-from classifier.pipelines.zero_shot import classifier
+from classifier.pipelines.openai_embeddings import (
+    bulk_vectorize_async,
+    vectorize_async,
+)
+from classifier.pipelines.reranker import score
 
-from db.services.hs_code_vector_service import get_nearest_neighbors
+from db.services.hs_code_vector_service import (
+    get_nearest_neighbors_async,
+    get_nearest_neighbors_batch_async,
+    search_options,
+)
 
 
 def item_to_text(item):
@@ -37,30 +46,21 @@ def item_to_text(item):
     return s
 
 
-async def classify(
-    db: Session,
-    item: Item,
-    config: Config,
-):
-    """Vectorize an item and find the N most similar items"""
-    vector = vectorize(item_to_text(item))
-
-    top_n = get_nearest_neighbors(
-        db=db, hierarchy=config.hierarchy, vector=vector, n=5
-    )
+async def rerank(item, top_n):
+    """
+    Use the zero shot classifier to sort the top N results by similarity.
+    Scoring runs on the reranker's inference thread, batched with other
+    requests, and the scores come back in the order of top_n.
+    """
 
-    # print([item_to_text(item) for confidence, item in top_n])
+    if not top_n:
+        return []
 
-    # use the zero shot classifier to sort the top N
-    # results by similarity
-    result = classifier(
+    scores = await score(
         item_to_text(item),
         [item_to_text(item.__dict__) for confidence, item in top_n],
     )
 
-    # Extract scores from the result
-    scores = result["scores"]
-
     # Combine scores with items
     combined = list(zip(top_n, scores))
 
@@ -79,3 +79,46 @@ async def classify(
         )
         for (confidence, item), score in zip(sorted_top_n, sorted_scores)
     ]
+
+
+async def classify(
+    db: AsyncSession,
+    item: Item,
+    config: Config,
+):
+    """Vectorize an item and find the N most similar items"""
+    vector = await vectorize_async(item_to_text(item))
+
+    top_n = await get_nearest_neighbors_async(
+        db=db,
+        hierarchy=config.hierarchy,
+        vector=vector,
+        n=5,
+        **search_options(config),
+    )
+
+    # print([item_to_text(item) for confidence, item in top_n])
+
+    return await rerank(item, top_n)
+
+
+async def classify_batch(
+    db: AsyncSession,
+    items: list[Item],
+    config: Config,
+):
+    """Vectorize a batch of items, find the N most similar items and rerank them"""
+    vectors = await bulk_vectorize_async([item_to_text(item) for item in items])
+
+    top_ns = await get_nearest_neighbors_batch_async(
+        db=db,
+        hierarchy=config.hierarchy,
+        vectors=vectors,
+        n=5,
+        **search_options(config),
+    )
+
+    # the reranks of all items share forward passes
+    return await asyncio.gather(
+        *(rerank(item, top_n) for item, top_n in zip(items, top_ns))
+    )
@@ -9,10 +9,17 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from api.dependencies import Session
+from api.dependencies import AsyncSession
 from api.schemas import Classification, Config, Item
-from classifier.pipelines.openai_embeddings import vectorize_async
-from db.services.hs_code_vector_service import get_nearest_neighbors
+from classifier.pipelines.openai_embeddings import (
+    bulk_vectorize_async,
+    vectorize_async,
+)
+from db.services.hs_code_vector_service import (
+    get_nearest_neighbors_async,
+    get_nearest_neighbors_batch_async,
+    search_options,
+)
 
 
 def item_to_text(item):
@@ -36,7 +43,7 @@ def item_to_text(item):
 
 
 async def classify(
-    db: Session,
+    db: AsyncSession,
     item: Item,
     config: Config,
 ):
@@ -44,8 +51,12 @@ async def classify(
 
     vector = await vectorize_async(item_to_text(item))
 
-    top_n = get_nearest_neighbors(
-        db=db, hierarchy=config.hierarchy, vector=vector, n=5
+    top_n = await get_nearest_neighbors_async(
+        db=db,
+        hierarchy=config.hierarchy,
+        vector=vector,
+        n=5,
+        **search_options(config),
     )
 
     return [
@@ -57,3 +68,34 @@ async def classify(
         )
         for confidence, item in top_n
     ]
+
+
+async def classify_batch(
+    db: AsyncSession,
+    items: list[Item],
+    config: Config,
+):
+    """Vectorize a batch of items and find the N most similar items for each"""
+
+    vectors = await bulk_vectorize_async([item_to_text(item) for item in items])
+
+    top_ns = await get_nearest_neighbors_batch_async(
+        db=db,
+        hierarchy=config.hierarchy,
+        vectors=vectors,
+        n=5,
+        **search_options(config),
+    )
+
+    return [
+        [
+            Classification(
+                name=item.name,
+                description=item.description,
+                hierarchy=item.hierarchy.name,
+                confidence=confidence,
+            )
+            for confidence, item in top_n
+        ]
+        for top_n in top_ns
+    ]
@@ -9,22 +9,16 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 from .base import Base
-from .session import Session
-from .engine import engine
+from .session import AsyncSession, Session
+from .engine import async_engine, engine
+from .schema import create_schema
 
 from . import models
 
 
-try:
-    Base.metadata.create_all(bind=engine)
-    print("Tables created successfully.")
-except Exception as e:
-    print(f"Error occurred: {e}")
-
-
 def get_db():
     """Get a database connection."""
 
@@ -48,3 +42,28 @@ def session_scope():
         raise
     finally:
         _db.close()
+
+
+async def get_async_db():
+    """Get an async database connection."""
+
+    _db = AsyncSession()
+    try:
+        yield _db
+    finally:
+        await _db.close()
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """Provide an async transactional scope around a series of operations."""
+
+    _db = AsyncSession()
+    try:
+        yield _db
+        await _db.commit()
+    except:
+        await _db.rollback()
+        raise
+    finally:
+        await _db.close()
@@ -0,0 +1,113 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+
+from sqlalchemy import delete, select
+
+from db import engine, session_scope
+from db.indexes import create_index, list_indexes
+from db.indexes.hs_code_vector import parse_index_name
+from db.models import File, Hierarchy
+from db.partitions import drop_partitions, partition_tables
+from db.schema import create_schema
+from db.services.hierarchy_service import bump_version
+from db.services.hs_code_service import update_centroids, update_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "create-schema",
+        help="Create missing tables, columns and indexes",
+    )
+
+    commands.add_parser(
+        "partition",
+        help="Partition hs_code and hs_code_vector tables from before they "
+        "were partitioned by hierarchy",
+    )
+
+    drop_parser = commands.add_parser(
+        "drop-hierarchy",
+        help="Drop a hierarchy with its partitions and files",
+    )
+    drop_parser.add_argument("hierarchy", help="The hierarchy name")
+
+    paths_parser = commands.add_parser(
+        "update-paths",
+        help="Fill in the materialized paths of HS codes and their vectors",
+    )
+    paths_parser.add_argument(
+        "hierarchy", nargs="?", help="Only this hierarchy (default all)"
+    )
+
+    centroids_parser = commands.add_parser(
+        "update-centroids",
+        help="Fill in the centroids of internal HS codes for beam search",
+    )
+    centroids_parser.add_argument(
+        "hierarchy", nargs="?", help="Only this hierarchy (default all)"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "create-schema":
+        create_schema(engine)
+        print("Tables created successfully.")
+
+    elif args.command == "partition":
+        with session_scope() as db:
+            indexes = [parse_index_name(name) for name in list_indexes(db)]
+            converted = partition_tables(db)
+
+            if "hs_code_vector" in converted:
+                # the ANN indexes were dropped with the old table
+                for index in filter(None, indexes):
+                    print(f"Created index {create_index(db, **index)}")
+
+        for table in converted:
+            print(f"Partitioned {table}")
+        if not converted:
+            print("Tables are already partitioned.")
+
+    elif args.command == "drop-hierarchy":
+        with session_scope() as db:
+            hierarchy = db.execute(
+                select(Hierarchy).where(Hierarchy.name == args.hierarchy)
+            ).scalar()
+            if hierarchy is None:
+                raise SystemExit(f"Hierarchy {args.hierarchy} not found")
+
+            for name in drop_partitions(db, hierarchy.id):
+                print(f"Dropped partition {name}")
+
+            db.execute(delete(File).where(File.hierarchy_id == hierarchy.id))
+            db.execute(delete(Hierarchy).where(Hierarchy.id == hierarchy.id))
+            print(f"Dropped hierarchy {args.hierarchy}")
+
+    else:
+        with session_scope() as db:
+            query = select(Hierarchy)
+            if args.hierarchy:
+                query = query.where(Hierarchy.name == args.hierarchy)
+
+            for hierarchy in db.execute(query).scalars():
+                if args.command == "update-paths":
+                    count = update_paths(db, hierarchy.id)
+                    print(f"Updated {count} paths in {hierarchy.name}")
+                else:
+                    count = update_centroids(db, hierarchy.id)
+                    # cached beam search results used the old centroids
+                    bump_version(db, hierarchy.id)
+                    print(f"Updated {count} centroids in {hierarchy.name}")
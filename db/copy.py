@@ -0,0 +1,121 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import io
+import struct
+
+import numpy as np
+from pgvector.sqlalchemy import BIT, Vector
+from sqlalchemy import Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+#
+# Bulk writes with COPY ... FROM STDIN in the binary format. Vectors are sent
+# as raw float32s, which skips formatting thousands of floats as text per row,
+# the main cost of inserting embeddings.
+#
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+INT4_OID = 23
+
+
+def _int4(value) -> bytes:
+    return struct.pack(">i", value)
+
+
+def _text(value) -> bytes:
+    return str(value).encode("utf-8")
+
+
+def _vector(value) -> bytes:
+    array = np.asarray(value, dtype=">f4")
+    return struct.pack(">HH", len(array), 0) + array.tobytes()
+
+
+def _bit(value) -> bytes:
+    # a bit string, or an array of booleans
+    if isinstance(value, str):
+        value = np.frombuffer(value.encode("ascii"), dtype=np.uint8) == ord("1")
+    return _int4(len(value)) + np.packbits(value).tobytes()
+
+
+def _int4_array(value) -> bytes:
+    array = np.asarray(value, dtype=">i4")
+    elements = np.empty(len(array), dtype=[("size", ">i4"), ("value", ">i4")])
+    elements["size"] = 4
+    elements["value"] = array
+    return (
+        struct.pack(">iiiii", 1, 0, INT4_OID, len(array), 1)
+        + elements.tobytes()
+    )
+
+
+def encoder(column):
+    """Binary COPY encoder for a column's type"""
+
+    column_type = column.type
+
+    if isinstance(column_type, Vector):
+        return _vector
+    if isinstance(column_type, BIT):
+        return _bit
+    if isinstance(column_type, ARRAY) and isinstance(
+        column_type.item_type, Integer
+    ):
+        return _int4_array
+    if isinstance(column_type, Integer):
+        return _int4
+    if isinstance(column_type, String):
+        return _text
+
+    raise TypeError(f"No COPY encoder for {column.name} ({column_type})")
+
+
+def encode_rows(columns, rows) -> io.BytesIO:
+    """Encode rows of values, ordered like columns, as a binary COPY stream"""
+
+    encoders = [encoder(column) for column in columns]
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    field_count = struct.pack(">h", len(columns))
+
+    for row in rows:
+        buffer.write(field_count)
+        for encode, value in zip(encoders, row):
+            if value is None:
+                buffer.write(_int4(-1))
+            else:
+                data = encode(value)
+                buffer.write(_int4(len(data)))
+                buffer.write(data)
+
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(db, table, columns, rows):
+    """
+    COPY rows into a table on the session's connection, in its transaction.
+    columns are Column objects of the table, rows are tuples in that order.
+    """
+
+    names = ", ".join(f'"{column.name}"' for column in columns)
+    cursor = db.connection().connection.cursor()
+
+    try:
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT binary)',
+            encode_rows(columns, rows),
+        )
+    finally:
+        cursor.close()
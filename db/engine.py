@@ -10,7 +10,10 @@ This module is part of the Arbitrary Hierarchical Classification Application dev
 """
 
 import os
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 
 
@@ -22,6 +25,81 @@ RDS_PASSWORD = os.getenv("RDS_PASSWORD")
 RDS_HOSTNAME = os.getenv("RDS_HOSTNAME")
 RDS_PORT = os.getenv("RDS_PORT")
 
+#
+# Connection pool settings, shared by the sync and async engines.
+# Each engine gets its own pool, so a worker holds up to
+# 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+#
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+# checkout counters of each engine's pool, see pool_info()
+pool_stats = {}
+
+
+def counted_pool(pool_class, name: str):
+    """
+    A pool class that counts checkouts and their time, and the checkouts that
+    found every connection taken and had to wait for one
+    """
+
+    stats = pool_stats.setdefault(
+        name, {"checkouts": 0, "checkout_ms": 0.0, "waits": 0, "wait_ms": 0.0}
+    )
+
+    class CountedPool(pool_class):
+        def connect(self):
+            exhausted = (
+                self.checkedin() == 0 and self.overflow() >= DB_MAX_OVERFLOW
+            )
+            started = time.perf_counter()
+
+            try:
+                return super().connect()
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                stats["checkouts"] += 1
+                stats["checkout_ms"] += elapsed
+                if exhausted:
+                    stats["waits"] += 1
+                    stats["wait_ms"] += elapsed
+
+    return CountedPool
+
+
 engine = create_engine(
-    f"postgresql://{RDS_USERNAME}:{RDS_PASSWORD}@{RDS_HOSTNAME}:{RDS_PORT}/{RDS_DB_NAME}"
+    f"postgresql://{RDS_USERNAME}:{RDS_PASSWORD}@{RDS_HOSTNAME}:{RDS_PORT}/{RDS_DB_NAME}",
+    poolclass=counted_pool(QueuePool, "sync"),
+    **pool_options,
+)
+
+async_engine = create_async_engine(
+    f"postgresql+asyncpg://{RDS_USERNAME}:{RDS_PASSWORD}@{RDS_HOSTNAME}:{RDS_PORT}/{RDS_DB_NAME}",
+    poolclass=counted_pool(AsyncAdaptedQueuePool, "async"),
+    **pool_options,
 )
+
+
+def pool_info() -> dict:
+    """Checkout counters and current usage of both pools"""
+
+    return {
+        name: {
+            **pool_stats[name],
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+        }
+        for name, pool in (("sync", engine.pool), ("async", async_engine.pool))
+    }
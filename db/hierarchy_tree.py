@@ -0,0 +1,284 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from db.models import Hierarchy, HSCode
+from db.services.hierarchy_service import get_version
+
+
+#
+# Hierarchies only change when a file is imported, so lookups are served from
+# read-only in-memory copies. A hierarchy's tree is rebuilt when its version
+# changes, and the hierarchy rows themselves are re-read, at most every
+# HIERARCHY_CACHE_REFRESH_SECONDS, or right away after invalidate().
+#
+HIERARCHY_CACHE_REFRESH_SECONDS = int(
+    os.getenv("HIERARCHY_CACHE_REFRESH_SECONDS", "60")
+)
+
+
+class HierarchyTree:
+    """
+    Read-only tree of one hierarchy's codes in flat arrays. Rows are looked up
+    by name or id through dicts, parents are row indexes (-1 for roots) and
+    children are stored in CSR form, so every lookup is O(depth) or better.
+    """
+
+    def __init__(
+        self,
+        hierarchy,
+        version,
+        ids,
+        file_ids,
+        parent_ids,
+        names,
+        descriptions,
+    ):
+        self.hierarchy = hierarchy
+        self.version = version
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.file_ids = np.asarray(file_ids, dtype=np.int64)
+        self.names = names
+        self.descriptions = descriptions
+        self.checked_at = time.monotonic()
+
+        self.by_name = {name: row for row, name in enumerate(names)}
+        self.by_id = {int(_id): row for row, _id in enumerate(self.ids)}
+
+        self.parents = np.asarray(
+            [
+                -1 if parent_id is None else self.by_id.get(parent_id, -1)
+                for parent_id in parent_ids
+            ],
+            dtype=np.int64,
+        )
+
+        # children of row i are child_rows[child_offsets[i]:child_offsets[i + 1]]
+        order = np.argsort(self.parents, kind="stable")
+        self.roots = order[: np.searchsorted(self.parents[order], 0)]
+        self.child_rows = order[len(self.roots) :]
+        self.child_offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.parents[self.child_rows], minlength=len(self.ids)),
+            out=self.child_offsets[1:],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, name: str):
+        """Row of a code by name, or None"""
+
+        return self.by_name.get(name)
+
+    def children(self, row: int) -> list[int]:
+        """Rows of the direct children of a row"""
+
+        start, stop = self.child_offsets[row], self.child_offsets[row + 1]
+        return self.child_rows[start:stop].tolist()
+
+    def is_leaf(self, row: int) -> bool:
+        """Whether a row has no children"""
+
+        return self.child_offsets[row] == self.child_offsets[row + 1]
+
+    def path_to_root(self, row: int) -> list[int]:
+        """Rows from the root down to a row"""
+
+        path = [row]
+
+        while self.parents[row] != -1:
+            row = int(self.parents[row])
+            path.append(row)
+
+        return path[::-1]
+
+    def node(self, row: int) -> dict:
+        """A row as the fields of an HSCode"""
+
+        parent = self.parents[row]
+
+        return {
+            "id": int(self.ids[row]),
+            "file_id": int(self.file_ids[row]),
+            "hierarchy_id": self.hierarchy.id,
+            "parent_id": None if parent == -1 else int(self.ids[parent]),
+            "name": self.names[row],
+            "description": self.descriptions[row],
+        }
+
+    def nodes(self, rows) -> list[dict]:
+        """Rows as the fields of HSCodes"""
+
+        return [self.node(row) for row in rows]
+
+    @classmethod
+    def from_rows(cls, hierarchy, version, rows):
+        """Build a tree from (id, file_id, parent_id, name, description) rows"""
+
+        ids, file_ids, parent_ids, names, descriptions = (
+            zip(*rows) if rows else ((), (), (), (), ())
+        )
+
+        return cls(
+            hierarchy,
+            version,
+            ids,
+            file_ids,
+            parent_ids,
+            list(names),
+            list(descriptions),
+        )
+
+    @classmethod
+    def load(cls, db, hierarchy, version=None):
+        """Read a hierarchy's codes from the database in one query"""
+
+        rows = db.execute(
+            select(
+                HSCode.id,
+                HSCode.file_id,
+                HSCode.parent_id,
+                HSCode.name,
+                HSCode.description,
+            )
+            .where(HSCode.hierarchy_id == hierarchy.id)
+            .order_by(HSCode.id)
+        ).all()
+
+        return cls.from_rows(hierarchy, version, rows)
+
+
+class HierarchyTreeCache:
+    """Versioned in-memory copies of the hierarchies and their trees."""
+
+    def __init__(self, refresh_seconds: int = HIERARCHY_CACHE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._hierarchies = {}
+        self._hierarchies_checked_at = None
+        self._trees = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._async_lock = None
+
+    def invalidate(self, hierarchy_id: int = None):
+        """Force the hierarchies and a tree, or all trees, to be re-checked"""
+
+        with self._lock:
+            self._hierarchies_checked_at = None
+            if hierarchy_id is None:
+                self._trees.clear()
+            else:
+                self._trees.pop(hierarchy_id, None)
+
+    def _fresh(self, checked_at) -> bool:
+        return (
+            checked_at is not None
+            and time.monotonic() - checked_at < self.refresh_seconds
+        )
+
+    def hierarchies(self, db) -> dict[str, Hierarchy]:
+        """All hierarchies by name, as detached Hierarchy objects"""
+
+        if self._fresh(self._hierarchies_checked_at):
+            return self._hierarchies
+
+        with self._lock:
+            if not self._fresh(self._hierarchies_checked_at):
+                self._hierarchies = {
+                    hierarchy.name: Hierarchy(
+                        id=hierarchy.id,
+                        name=hierarchy.name,
+                        short_dimensions=hierarchy.short_dimensions,
+                        quantization=hierarchy.quantization,
+                    )
+                    for hierarchy in db.execute(
+                        select(
+                            Hierarchy.id,
+                            Hierarchy.name,
+                            Hierarchy.short_dimensions,
+                            Hierarchy.quantization,
+                        )
+                    ).all()
+                }
+                self._hierarchies_checked_at = time.monotonic()
+
+            return self._hierarchies
+
+    def hierarchy(self, db, name: str):
+        """A hierarchy by name, or None"""
+
+        return self.hierarchies(db).get(name)
+
+    async def hierarchies_async(self, db) -> dict[str, Hierarchy]:
+        """hierarchies for an AsyncSession, only querying them if stale"""
+
+        if self._fresh(self._hierarchies_checked_at):
+            return self._hierarchies
+
+        # run_sync holds self._lock in a greenlet on the event loop's thread,
+        # so requests on the loop take turns or a second one deadlocks on it
+        async with self._refresh_lock():
+            return await db.run_sync(self.hierarchies)
+
+    async def hierarchy_async(self, db, name: str):
+        """hierarchy for an AsyncSession, only touching the database if stale"""
+
+        return (await self.hierarchies_async(db)).get(name)
+
+    def _refresh_lock(self) -> asyncio.Lock:
+        """Lock for refreshes from the running event loop"""
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._async_lock = asyncio.Lock()
+
+        return self._async_lock
+
+    def tree(self, db, name: str):
+        """The tree of a hierarchy by name, rebuilt if stale, or None"""
+
+        hierarchy = self.hierarchy(db, name)
+        if hierarchy is None:
+            return None
+
+        loaded = self._trees.get(hierarchy.id)
+        if loaded and self._fresh(loaded.checked_at):
+            return loaded
+
+        with self._lock:
+            version = get_version(db, hierarchy.id)
+
+            loaded = self._trees.get(hierarchy.id)
+            if loaded and loaded.version == version:
+                loaded.checked_at = time.monotonic()
+                return loaded
+
+            loaded = HierarchyTree.load(db, hierarchy, version)
+            self._trees[hierarchy.id] = loaded
+            return loaded
+
+
+cache = HierarchyTreeCache()
+
+
+def invalidate(hierarchy_id: int = None):
+    """Tell the hierarchy cache that a hierarchy changed"""
+
+    cache.invalidate(hierarchy_id)
@@ -0,0 +1,22 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+from .hs_code_vector import (
+    create_index,
+    drop_index,
+    list_indexes,
+    rebuild_indexes,
+    search_expression,
+    search_type,
+    set_search_options,
+    set_search_options_async,
+    short_search_expression,
+)
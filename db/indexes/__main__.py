@@ -0,0 +1,163 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import argparse
+
+from db import session_scope
+from db.services.hierarchy_service import get_one
+from classifier.pipelines.quantization import quantizations
+from db.services.hs_code_vector_service import (
+    set_quantization,
+    set_short_dimensions,
+)
+from .hs_code_vector import (
+    VECTOR_INDEX_HALFVEC,
+    VECTOR_INDEX_METHOD,
+    create_index,
+    drop_index,
+    list_indexes,
+    methods,
+    rebuild_indexes,
+)
+
+
+def get_hierarchy_id(db, hierarchy_name):
+    """Look up a hierarchy id by name, exiting if it doesn't exist"""
+
+    hierarchy = get_one(db, hierarchy_name)
+
+    if hierarchy is None:
+        raise SystemExit(f"Hierarchy {hierarchy_name} not found")
+
+    return hierarchy.id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage ANN indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List ANN indexes")
+    list_parser.add_argument("--hierarchy", help="Only this hierarchy")
+
+    create_parser = commands.add_parser(
+        "create", help="Create an ANN index for a hierarchy"
+    )
+    create_parser.add_argument("hierarchy", help="The hierarchy name")
+    create_parser.add_argument(
+        "--method", choices=methods, default=VECTOR_INDEX_METHOD
+    )
+    create_parser.add_argument(
+        "--halfvec",
+        action=argparse.BooleanOptionalAction,
+        default=VECTOR_INDEX_HALFVEC,
+        help="Index the embeddings cast to halfvec",
+    )
+    create_parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    create_parser.add_argument(
+        "--ef-construction", type=int, default=64, help="HNSW ef_construction"
+    )
+    create_parser.add_argument(
+        "--lists", type=int, help="IVFFlat lists (default rows / 1000)"
+    )
+    create_parser.add_argument(
+        "--short",
+        type=int,
+        metavar="DIMENSIONS",
+        help="Index the truncated embeddings of this size instead",
+    )
+
+    shorten_parser = commands.add_parser(
+        "shorten",
+        help="Set and backfill the truncated embeddings used for two-stage search",
+    )
+    shorten_parser.add_argument("hierarchy", help="The hierarchy name")
+    shorten_parser.add_argument(
+        "dimensions",
+        type=int,
+        help="Truncated size, 0 turns two-stage search off",
+    )
+    shorten_parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Also create an ANN index over the truncated embeddings",
+    )
+
+    rebuild_parser = commands.add_parser(
+        "rebuild", help="Rebuild the ANN indexes of a hierarchy"
+    )
+    rebuild_parser.add_argument("hierarchy", help="The hierarchy name")
+
+    drop_parser = commands.add_parser("drop", help="Drop an ANN index")
+    drop_parser.add_argument("name", help="The index name")
+
+    quantize_parser = commands.add_parser(
+        "quantize",
+        help="Set and backfill the quantized codes used to shortlist candidates",
+    )
+    quantize_parser.add_argument("hierarchy", help="The hierarchy name")
+    quantize_parser.add_argument(
+        "quantization", choices=quantizations + ["none"]
+    )
+
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        if args.command == "list":
+            hierarchy_id = (
+                get_hierarchy_id(db, args.hierarchy) if args.hierarchy else None
+            )
+            for name in list_indexes(db, hierarchy_id):
+                print(name)
+
+        elif args.command == "create":
+            name = create_index(
+                db,
+                get_hierarchy_id(db, args.hierarchy),
+                method=args.method,
+                halfvec=args.halfvec,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                lists=args.lists,
+                short_dimensions=args.short,
+            )
+            print(f"Created index {name}")
+
+        elif args.command == "shorten":
+            hierarchy_id = get_hierarchy_id(db, args.hierarchy)
+            count = set_short_dimensions(
+                db, hierarchy_id, args.dimensions or None
+            )
+            print(f"Updated {count} vectors")
+
+            if args.index and args.dimensions:
+                name = create_index(
+                    db, hierarchy_id, short_dimensions=args.dimensions
+                )
+                print(f"Created index {name}")
+
+        elif args.command == "rebuild":
+            for name in rebuild_indexes(
+                db, get_hierarchy_id(db, args.hierarchy), hnsw=True
+            ):
+                print(f"Rebuilt index {name}")
+
+        elif args.command == "quantize":
+            quantization = (
+                None if args.quantization == "none" else args.quantization
+            )
+            count = set_quantization(
+                db, get_hierarchy_id(db, args.hierarchy), quantization
+            )
+            print(f"Updated {count} vectors")
+
+        elif args.command == "drop":
+            drop_index(db, args.name)
+            print(f"Dropped index {args.name}")
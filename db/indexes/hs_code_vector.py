@@ -9,15 +9,300 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from sqlalchemy import Index
+import os
+import re
+
+from pgvector.sqlalchemy import HALFVEC, Vector
+from sqlalchemy import Index, cast, func, select, text
+from sqlalchemy.schema import CreateIndex
 
 from db.models.hs_code_vector import HSCodeVector
+from db.partitions import partition, partition_name
 
 
-hs_code_vector_index = Index(
-    "hs_code_vector_embedding_idx",
-    HSCodeVector.embedding,
-    postgresql_using="ivfflat",
-    postgres_with={"lists": 100},
-    postgres_ops={"factors": "vector_cosine_ops"},
+#
+# ANN indexes are created on a hierarchy's partition of hs_code_vector, one
+# per method, so a search within a hierarchy only walks that hierarchy's graph
+# or lists, and rebuilding one only locks that partition.
+#
+# pgvector can only index `vector` columns up to 2000 dimensions, so the
+# 3072-dim embeddings are indexed as `halfvec` (up to 4000 dimensions, needs
+# pgvector >= 0.7). When VECTOR_INDEX_HALFVEC is set, searches order by the
+# same halfvec expression so the planner can use the index.
+#
+VECTOR_INDEX_HALFVEC = (
+    os.getenv("VECTOR_INDEX_HALFVEC", "false").lower() == "true"
+)
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+VECTOR_INDEX_AUTO_CREATE = (
+    os.getenv("VECTOR_INDEX_AUTO_CREATE", "false").lower() == "true"
 )
+
+methods = ["hnsw", "ivfflat"]
+MAX_VECTOR_DIMENSIONS = 2000
+MAX_HALFVEC_DIMENSIONS = 4000
+INDEX_PREFIX = "hs_code_vector_ann"
+
+
+def dimensions() -> int:
+    """Dimensions of the stored embeddings"""
+
+    return HSCodeVector.embedding.type.dim
+
+
+def search_type(halfvec: bool = VECTOR_INDEX_HALFVEC):
+    """Type searches compare in, matching the indexed expression"""
+
+    if halfvec:
+        return HALFVEC(dimensions())
+
+    return HSCodeVector.embedding.type
+
+
+def search_expression(halfvec: bool = VECTOR_INDEX_HALFVEC, model=HSCodeVector):
+    """Embedding expression searches order by, matching the indexed expression"""
+
+    if halfvec:
+        return cast(model.embedding, search_type(halfvec))
+
+    return model.embedding
+
+
+def short_search_expression(short_dimensions: int, model=HSCodeVector):
+    """Truncated embedding expression two-stage searches shortlist by"""
+
+    return cast(model.embedding_short, Vector(short_dimensions))
+
+
+def index_name(
+    hierarchy_id: int,
+    method: str,
+    halfvec: bool,
+    short_dimensions: int = None,
+) -> str:
+    """Name of a hierarchy's ANN index"""
+
+    if short_dimensions:
+        kind = f"short{short_dimensions}"
+    else:
+        kind = "halfvec" if halfvec else "vector"
+
+    return f"{INDEX_PREFIX}_{method}_{kind}_h{hierarchy_id}"
+
+
+def build_index(
+    hierarchy_id: int,
+    method: str = VECTOR_INDEX_METHOD,
+    halfvec: bool = VECTOR_INDEX_HALFVEC,
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    short_dimensions: int = None,
+) -> Index:
+    """
+    Build the declaration of an ANN index on one hierarchy's partition. With
+    short_dimensions the index covers the truncated embeddings instead.
+    """
+
+    if method not in methods:
+        raise ValueError(f"Unknown index method '{method}'")
+
+    table = partition(HSCodeVector.__table__, hierarchy_id)
+
+    if short_dimensions:
+        halfvec = False
+        expression = short_search_expression(short_dimensions, table.c)
+    else:
+        expression = search_expression(halfvec, table.c)
+
+    size = short_dimensions or dimensions()
+    limit = MAX_HALFVEC_DIMENSIONS if halfvec else MAX_VECTOR_DIMENSIONS
+    if size > limit:
+        raise ValueError(
+            f"Cannot index {size} dimensions as "
+            f"{'halfvec' if halfvec else 'vector'} (max {limit})."
+            + ("" if halfvec else " Use halfvec instead.")
+        )
+
+    ops = "halfvec_cosine_ops" if halfvec else "vector_cosine_ops"
+    options = (
+        {"m": m, "ef_construction": ef_construction}
+        if method == "hnsw"
+        else {"lists": lists}
+    )
+
+    return Index(
+        index_name(hierarchy_id, method, halfvec, short_dimensions),
+        expression.label("embedding"),
+        postgresql_using=method,
+        postgresql_with=options,
+        postgresql_ops={"embedding": ops},
+    )
+
+
+def create_index(
+    db,
+    hierarchy_id: int,
+    method: str = VECTOR_INDEX_METHOD,
+    halfvec: bool = VECTOR_INDEX_HALFVEC,
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = None,
+    short_dimensions: int = None,
+) -> str:
+    """
+    Create an ANN index on one hierarchy's partition. IVFFlat lists default
+    to rows / 1000, as recommended by pgvector for up to 1M rows.
+    """
+
+    if lists is None:
+        rows = db.execute(
+            select(func.count(HSCodeVector.id)).where(
+                HSCodeVector.hierarchy_id == hierarchy_id
+            )
+        ).scalar()
+        lists = max(1, rows // 1000)
+
+    index = build_index(
+        hierarchy_id,
+        method,
+        halfvec,
+        m,
+        ef_construction,
+        lists,
+        short_dimensions,
+    )
+
+    db.execute(CreateIndex(index, if_not_exists=True))
+
+    return index.name
+
+
+def list_indexes(db, hierarchy_id: int = None) -> list[str]:
+    """Names of the ANN indexes, optionally only for one hierarchy"""
+
+    pattern = f"{INDEX_PREFIX}_%_h{hierarchy_id if hierarchy_id else '%'}"
+    table = (
+        partition_name(HSCodeVector.__tablename__, hierarchy_id)
+        if hierarchy_id
+        else f"{HSCodeVector.__tablename__}%"
+    )
+
+    return list(
+        db.execute(
+            text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename LIKE :table AND indexname LIKE :pattern "
+                "ORDER BY indexname"
+            ),
+            {"table": table, "pattern": pattern},
+        ).scalars()
+    )
+
+
+def parse_index_name(name: str) -> dict:
+    """
+    The hierarchy id and create_index options of an ANN index from its name,
+    or None if it isn't one
+    """
+
+    match = re.fullmatch(
+        rf"{INDEX_PREFIX}_({'|'.join(methods)})_(vector|halfvec|short(\d+))_h(\d+)",
+        name,
+    )
+    if match is None:
+        return None
+
+    method, kind, short_dimensions, hierarchy_id = match.groups()
+
+    return {
+        "hierarchy_id": int(hierarchy_id),
+        "method": method,
+        "halfvec": kind == "halfvec",
+        "short_dimensions": int(short_dimensions) if short_dimensions else None,
+    }
+
+
+def drop_index(db, name: str):
+    """Drop an ANN index by name"""
+
+    if not name.startswith(INDEX_PREFIX):
+        raise ValueError(f"'{name}' is not an ANN index")
+
+    db.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+
+def rebuild_indexes(db, hierarchy_id: int, hnsw: bool = False) -> list[str]:
+    """
+    Rebuild a hierarchy's ANN indexes after an import. HNSW graphs take new
+    rows as they come, so unless hnsw is set only IVFFlat lists, which are
+    only trained at build time, are rebuilt. The indexes are on the
+    hierarchy's partition, so REINDEX doesn't hold up other hierarchies.
+    If the hierarchy has no index and VECTOR_INDEX_AUTO_CREATE is set, one is
+    created with the default method, as halfvec if the embeddings are too
+    large for vector. Returns the rebuilt or created indexes.
+    """
+
+    names = list_indexes(db, hierarchy_id)
+    rebuilt = [
+        name
+        for name in names
+        if hnsw or name.startswith(f"{INDEX_PREFIX}_ivfflat_")
+    ]
+
+    for name in rebuilt:
+        db.execute(text(f'REINDEX INDEX "{name}"'))
+
+    if not names and VECTOR_INDEX_AUTO_CREATE:
+        halfvec = VECTOR_INDEX_HALFVEC or dimensions() > MAX_VECTOR_DIMENSIONS
+        if halfvec and not VECTOR_INDEX_HALFVEC:
+            print(
+                "Creating a halfvec index, searches only use it with "
+                "VECTOR_INDEX_HALFVEC=true"
+            )
+
+        rebuilt.append(create_index(db, hierarchy_id, halfvec=halfvec))
+
+    return rebuilt
+
+
+def set_search_options(db, ef_search: int = None, probes: int = None):
+    """
+    Set per-request search settings for the current transaction.
+    ef_search is the HNSW candidate list size, probes the IVFFlat lists scanned.
+    Higher values trade latency for recall.
+    """
+
+    statement, params = _search_options_statement(ef_search, probes)
+    if statement is not None:
+        db.execute(statement, params)
+
+
+async def set_search_options_async(
+    db, ef_search: int = None, probes: int = None
+):
+    """set_search_options for an AsyncSession"""
+
+    statement, params = _search_options_statement(ef_search, probes)
+    if statement is not None:
+        await db.execute(statement, params)
+
+
+def _search_options_statement(ef_search: int = None, probes: int = None):
+    """Build one statement setting the given options locally"""
+
+    settings = []
+    params = {}
+
+    if ef_search is not None:
+        settings.append("set_config('hnsw.ef_search', :ef_search, true)")
+        params["ef_search"] = str(int(ef_search))
+
+    if probes is not None:
+        settings.append("set_config('ivfflat.probes', :probes, true)")
+        params["probes"] = str(int(probes))
+
+    if not settings:
+        return None, None
+
+    return text(f"SELECT {', '.join(settings)}"), params
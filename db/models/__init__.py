@@ -13,3 +13,4 @@ from .file import File
 from .hierarchy import Hierarchy
 from .hs_code import HSCode
 from .hs_code_vector import HSCodeVector
+from .embedding_cache import EmbeddingCache
@@ -0,0 +1,38 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.orm import mapped_column
+from sqlalchemy.sql import func
+from pgvector.sqlalchemy import Vector
+
+from db.base import Base
+
+
+class EmbeddingCache(Base):
+    """Persistent embedding cache keyed by model and normalized text hash."""
+
+    __tablename__ = "embedding_cache"
+    __table_args__ = (UniqueConstraint("model", "text_hash"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    model = Column(String, nullable=False)
+    text_hash = Column(String(64), nullable=False)
+    # dimensions depend on the model, so the column is left unconstrained
+    embedding = mapped_column(Vector())
+
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        index=True,
+        nullable=False,
+    )
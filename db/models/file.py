@@ -28,3 +28,6 @@ class File(Base):
     name = Column(String, index=True, unique=True, nullable=False)
     path = Column(String, index=True, unique=True, nullable=False)
     size = Column(Integer, index=True, nullable=False)
+
+    # sha256 of the file's contents when it was last imported
+    content_hash = Column(String, nullable=True)
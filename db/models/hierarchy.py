@@ -24,4 +24,16 @@ class Hierarchy(Base):
 
     name = Column(String, index=True, nullable=False)
 
+    # dimensions of the truncated embeddings used for two-stage search,
+    # None disables two-stage search for the hierarchy
+    short_dimensions = Column(Integer, nullable=True)
+
+    # quantized codes used to shortlist candidates, "binary" or "int8",
+    # see classifier.pipelines.quantization
+    quantization = Column(String, nullable=True)
+
+    # bumped whenever a file is imported or re-imported into the hierarchy,
+    # see db.services.hierarchy_service.get_version
+    version = Column(Integer, nullable=True)
+
     hs_codes = relationship("HSCode", back_populates="hierarchy")
@@ -9,8 +9,17 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import mapped_column, relationship
+from pgvector.sqlalchemy import Vector
 
 from db.base import Base
 
@@ -19,17 +28,47 @@ class HSCode(Base):
     """HS Code model with parent-child relationship."""
 
     __tablename__ = "hs_code"
+    # partitioned by hierarchy (see db.partitions), so the primary key, the
+    # unique names and the parent key all include hierarchy_id
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["parent_id", "hierarchy_id"],
+            ["hs_code.id", "hs_code.hierarchy_id"],
+        ),
+        Index(
+            "ix_hs_code_hierarchy_id_name", "hierarchy_id", "name", unique=True
+        ),
+        Index("ix_hs_code_path", "path", postgresql_using="gin"),
+        {"postgresql_partition_by": "LIST (hierarchy_id)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     file_id = Column(Integer, ForeignKey("file.id"), nullable=False)
-    hierarchy_id = Column(Integer, ForeignKey("hierarchy.id"), nullable=False)
-    parent_id = Column(Integer, ForeignKey("hs_code.id"), nullable=True)
+    hierarchy_id = Column(
+        Integer, ForeignKey("hierarchy.id"), primary_key=True, nullable=False
+    )
+    # indexed for the children lookups of beam search
+    parent_id = Column(Integer, nullable=True, index=True)
 
     file = relationship("File")
     hierarchy = relationship("Hierarchy")
-    parent = relationship("HSCode", remote_side=[id], backref="children")
+    parent = relationship(
+        "HSCode",
+        primaryjoin="and_(HSCode.parent_id == remote(HSCode.id), "
+        "HSCode.hierarchy_id == remote(HSCode.hierarchy_id))",
+        foreign_keys=[parent_id],
+        backref="children",
+    )
 
-    name = Column(
-        String, index=True, unique=True, nullable=False
-    )  # Should be unique because it forms the parent-child relationship
+    # unique within a hierarchy, since it forms the parent-child relationship
+    name = Column(String, index=True, nullable=False)
     description = Column(String, index=True)
+
+    # ids from the root down to this code, filled in at import, so ancestors
+    # and descendants are one indexed query (see db.services.hs_code_service)
+    path = Column(ARRAY(Integer), nullable=True)
+
+    # mean of the embeddings of the leaves below an internal code, filled in
+    # at import for the beam search variant (see update_centroids). Deferred,
+    # so loading codes doesn't load it
+    centroid = mapped_column(Vector(3072), nullable=True, deferred=True)
@@ -9,9 +9,10 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Index, Integer, String, ForeignKey
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship, mapped_column
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import BIT, Vector
 
 from db.base import Base
 
@@ -20,14 +21,39 @@ class HSCodeVector(Base):
     """HS Code model with vectorized representation."""
 
     __tablename__ = "hs_code_vector"
-
-    id = Column(Integer, primary_key=True, index=True)
+    # partitioned by hierarchy like hs_code, see db.partitions
+    __table_args__ = (
+        Index(
+            "ix_hs_code_vector_hierarchy_id_name",
+            "hierarchy_id",
+            "name",
+            unique=True,
+        ),
+        Index("ix_hs_code_vector_path", "path", postgresql_using="gin"),
+        {"postgresql_partition_by": "LIST (hierarchy_id)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     file_id = Column(Integer, ForeignKey("file.id"), nullable=False)
-    hierarchy_id = Column(Integer, ForeignKey("hierarchy.id"), nullable=False)
+    hierarchy_id = Column(
+        Integer, ForeignKey("hierarchy.id"), primary_key=True, nullable=False
+    )
 
     file = relationship("File")
     hierarchy = relationship("Hierarchy")
     embedding = mapped_column(Vector(3072))
-
-    name = Column(String, index=True, unique=True, nullable=False)
+    # truncated and renormalized embedding, see Hierarchy.short_dimensions
+    embedding_short = mapped_column(Vector(), nullable=True)
+    # sign bits of the embedding, see Hierarchy.quantization
+    embedding_binary = mapped_column(BIT(3072), nullable=True)
+    # provider and model the embedding came from, and its dimensions before
+    # it was zero-padded to fit the column, see embedding_providers. None for
+    # vectors from before providers were recorded
+    embedding_provider = Column(String, nullable=True)
+    embedding_dimensions = Column(Integer, nullable=True)
+
+    name = Column(String, index=True, nullable=False)
     description = Column(String, index=True)
+
+    # path of the HSCode this vector was built from, for subtree searches
+    path = Column(ARRAY(Integer), nullable=True)
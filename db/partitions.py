@@ -0,0 +1,243 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+from sqlalchemy import MetaData, Table, select, text
+
+from db.models import Hierarchy, HSCode, HSCodeVector
+
+
+#
+# hs_code and hs_code_vector are LIST partitioned on hierarchy_id, one
+# partition per hierarchy named <table>_h<hierarchy id>. Queries filtering on
+# a hierarchy only scan its partition, each partition has its own ANN indexes
+# (see db.indexes), and vacuuming or reindexing after an import only touches
+# the imported hierarchy. Partitions are created when a hierarchy is first
+# imported, dropping a hierarchy drops its partitions and a reload starts
+# from truncated ones.
+#
+tables = [HSCode.__table__, HSCodeVector.__table__]
+
+# pg_advisory_xact_lock key serializing partition DDL
+PARTITION_LOCK = 0x41484350
+
+
+def partition_name(table_name: str, hierarchy_id: int) -> str:
+    """Name of a hierarchy's partition of a table"""
+
+    return f"{table_name}_h{int(hierarchy_id)}"
+
+
+def partition(table: Table, hierarchy_id: int) -> Table:
+    """A hierarchy's partition of a table, for DDL on the partition itself"""
+
+    return table.to_metadata(
+        MetaData(), name=partition_name(table.name, hierarchy_id)
+    )
+
+
+def is_partitioned(db, table_name: str) -> bool:
+    """Whether a table exists and is partitioned"""
+
+    return db.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(:table))"
+        ),
+        {"table": table_name},
+    ).scalar()
+
+
+def _exists(db, table_name: str) -> bool:
+    return (
+        db.execute(
+            text("SELECT to_regclass(:table)"), {"table": table_name}
+        ).scalar()
+        is not None
+    )
+
+
+def create_partitions(db, hierarchy_id: int) -> list[str]:
+    """
+    Create a hierarchy's partitions that don't exist yet. Creating one locks
+    the parent table, so existing ones are skipped before asking for it.
+    Returns the partitions created.
+    """
+
+    missing = [
+        (table, partition_name(table.name, hierarchy_id))
+        for table in tables
+        if is_partitioned(db, table.name)
+        and not _exists(db, partition_name(table.name, hierarchy_id))
+    ]
+    if not missing:
+        return []
+
+    # one creator at a time, holding every parent in the same order until
+    # commit, so creators never wait on each other's locks in a cycle
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK}
+    )
+    names = ", ".join(f'"{table.name}"' for table in tables)
+    db.execute(text(f"LOCK TABLE {names} IN ACCESS EXCLUSIVE MODE"))
+
+    created = []
+
+    for table, name in missing:
+        # another process may have created it while we waited
+        if _exists(db, name):
+            continue
+
+        db.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF '
+                f'"{table.name}" FOR VALUES IN ({int(hierarchy_id)})'
+            )
+        )
+        created.append(name)
+
+    return created
+
+
+def create_missing_partitions(db) -> list[str]:
+    """Create the partitions of every hierarchy that doesn't have them"""
+
+    return [
+        name
+        for hierarchy_id in db.execute(select(Hierarchy.id)).scalars().all()
+        for name in create_partitions(db, hierarchy_id)
+    ]
+
+
+def truncate_partitions(db, hierarchy_id: int):
+    """
+    Empty a hierarchy's partitions for a reload. TRUNCATE gives them new
+    storage that replaces the old at commit, leaving no dead rows to vacuum.
+    It locks only this hierarchy's partitions, so searches of the hierarchy
+    wait for the reload to commit and other hierarchies aren't affected.
+    """
+
+    names = ", ".join(
+        f'"{partition_name(table.name, hierarchy_id)}"' for table in tables
+    )
+    db.execute(text(f"TRUNCATE {names}"))
+
+
+def drop_partitions(db, hierarchy_id: int) -> list[str]:
+    """
+    Detach and drop a hierarchy's partitions, with their indexes, instead of
+    deleting its rows one by one. Returns the partitions dropped.
+    """
+
+    dropped = []
+
+    # vectors first, codes are what the hierarchy's files build them from
+    for table in reversed(tables):
+        name = partition_name(table.name, hierarchy_id)
+        if not _exists(db, name):
+            continue
+
+        db.execute(
+            text(f'ALTER TABLE "{table.name}" DETACH PARTITION "{name}"')
+        )
+        db.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+
+    return dropped
+
+
+def partition_tables(db) -> list[str]:
+    """
+    Convert unpartitioned hs_code and hs_code_vector tables, from before they
+    were partitioned, into partitioned ones: the old table is renamed, the
+    new one created with a partition per hierarchy, and the rows copied over
+    keeping their ids. Index names are per schema, so the old table's indexes
+    go first. Indexes not declared on the models, like the ANN indexes, have
+    to be created again. Returns the tables converted.
+    """
+
+    converted = []
+    hierarchy_ids = db.execute(select(Hierarchy.id)).scalars().all()
+
+    for table in tables:
+        if not _exists(db, table.name) or is_partitioned(db, table.name):
+            continue
+
+        old = f"{table.name}_unpartitioned"
+        sequence = db.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"),
+            {"table": table.name},
+        ).scalar()
+
+        db.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old}"'))
+        if sequence:
+            db.execute(
+                text(f'ALTER SEQUENCE {sequence} RENAME TO "{old}_id_seq"')
+            )
+
+        constraints = db.execute(
+            text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = to_regclass(:table) "
+                "AND contype IN ('f', 'p', 'u') ORDER BY contype"
+            ),
+            {"table": old},
+        ).scalars()
+        for constraint in constraints.all():
+            db.execute(
+                text(
+                    f'ALTER TABLE "{old}" DROP CONSTRAINT IF EXISTS "{constraint}"'
+                )
+            )
+
+        indexes = db.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+            {"table": old},
+        ).scalars()
+        for index in indexes.all():
+            db.execute(text(f'DROP INDEX "{index}"'))
+
+        table.create(db.connection())
+        for hierarchy_id in hierarchy_ids:
+            create_partitions(db, hierarchy_id)
+
+        existing = set(
+            db.execute(
+                text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_name = :table"
+                ),
+                {"table": old},
+            ).scalars()
+        )
+        columns = ", ".join(
+            f'"{column.name}"'
+            for column in table.columns
+            if column.name in existing
+        )
+
+        db.execute(
+            text(
+                f'INSERT INTO "{table.name}" ({columns}) '
+                f'SELECT {columns} FROM "{old}"'
+            )
+        )
+        db.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                f'(SELECT coalesce(max(id), 0) + 1 FROM "{old}"), false)'
+            ),
+            {"table": table.name},
+        )
+        db.execute(text(f'DROP TABLE "{old}"'))
+
+        converted.append(table.name)
+
+    return converted
@@ -0,0 +1,104 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from .base import Base
+from .partitions import create_missing_partitions
+
+
+def create_schema(engine):
+    """
+    Create missing tables, then add columns and indexes that were added to
+    existing models, and the partitions of hierarchies that don't have them.
+    """
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+
+    with engine.begin() as connection:
+        for name in create_missing_partitions(connection):
+            print(f"Created partition {name}")
+
+
+def add_missing_columns(engine):
+    """
+    create_all only creates tables that don't exist yet, so columns added to a
+    model later are added here. Only nullable columns or columns with a server
+    default can be added to a table that already has rows.
+    """
+
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                if not column.nullable and column.server_default is None:
+                    print(
+                        f"Cannot add non-nullable column {table.name}.{column.name}"
+                        " without a server default"
+                    )
+                    continue
+
+                definition = column.type.compile(dialect=engine.dialect)
+
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if not isinstance(default, str):
+                        default = default.compile(dialect=engine.dialect)
+                    else:
+                        default = f"'{default}'"
+                    definition += f" DEFAULT {default}"
+
+                if not column.nullable:
+                    definition += " NOT NULL"
+
+                connection.execute(
+                    text(
+                        f'ALTER TABLE "{table.name}" '
+                        f'ADD COLUMN IF NOT EXISTS "{column.name}" {definition}'
+                    )
+                )
+                print(f"Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes(engine):
+    """Create indexes declared on models that existing tables don't have yet."""
+
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                connection.execute(CreateIndex(index, if_not_exists=True))
+                print(f"Created index {index.name}")
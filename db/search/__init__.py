@@ -0,0 +1,47 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+#
+# Switch the nearest neighbor search backend here.
+# postgres: pgvector scans in the database (default)
+# numpy: in-process exact search over memory-mapped matrices
+#
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "postgres")
+backends = ["postgres", "numpy"]
+
+if VECTOR_SEARCH_BACKEND not in backends:
+    raise ValueError(f"Unknown vector search backend '{VECTOR_SEARCH_BACKEND}'")
+
+
+def get_index():
+    """Get the in-process vector index, or None when searching in the database"""
+
+    if VECTOR_SEARCH_BACKEND == "numpy":
+        from .numpy_backend import index
+
+        return index
+
+    return None
+
+
+def invalidate(hierarchy_id: int = None):
+    """Tell the in-process vector index that a hierarchy changed"""
+
+    index = get_index()
+    if index is not None:
+        index.invalidate(hierarchy_id)
@@ -0,0 +1,511 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+
+from classifier.pipelines.quantization import (
+    hamming,
+    int8_scales,
+    pack_bits,
+    quantize_int8,
+)
+from db.models import Hierarchy, HSCodeVector
+from db.services.hierarchy_service import get_version
+
+
+#
+# Matrices are written to VECTOR_INDEX_DIR and memory-mapped, so every worker
+# on a machine shares one copy through the page cache. VECTOR_INDEX_DTYPE can be
+# float16 to halve the footprint at a small cost in precision.
+#
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", ".vector_index")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_INDEX_REFRESH_SECONDS = int(
+    os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "60")
+)
+VECTOR_INDEX_BLOCK_SIZE = int(os.getenv("VECTOR_INDEX_BLOCK_SIZE", "65536"))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so a dot product is a cosine similarity"""
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def blockwise_top_n(score_block, count: int, queries: int, n: int):
+    """
+    Get the indexes and scores of the n best of count rows for each query.
+    score_block(start, stop) scores a block of rows against every query, and
+    a running top n per query is kept, so peak memory doesn't grow with the
+    hierarchy size.
+    """
+
+    n = min(n, count)
+    best_scores = np.full((queries, 0), -np.inf, dtype=np.float32)
+    best_indexes = np.zeros((queries, 0), dtype=np.int64)
+
+    for start in range(0, count, VECTOR_INDEX_BLOCK_SIZE):
+        scores = score_block(start, start + VECTOR_INDEX_BLOCK_SIZE)
+
+        if scores.shape[1] > n:
+            part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+            scores = np.take_along_axis(scores, part, axis=1)
+        else:
+            part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_indexes = np.concatenate([best_indexes, part + start], axis=1)
+
+        if best_scores.shape[1] > n:
+            keep = np.argpartition(-best_scores, n - 1, axis=1)[:, :n]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_indexes = np.take_along_axis(best_indexes, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best_indexes, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+class HierarchyMatrix:
+    """
+    Pre-normalized embeddings of one hierarchy plus the row metadata, and
+    optionally quantized codes of the embeddings to shortlist with.
+    """
+
+    def __init__(
+        self,
+        hierarchy,
+        version,
+        ids,
+        names,
+        descriptions,
+        matrix,
+        quantization=None,
+        codes=None,
+        scales=None,
+    ):
+        self.hierarchy = hierarchy
+        self.version = version
+        self.ids = ids
+        self.names = names
+        self.descriptions = descriptions
+        self.matrix = matrix
+        self.quantization = quantization
+        self.codes = codes
+        self.scales = scales
+        self.checked_at = time.monotonic()
+
+    def top_n(self, queries: np.ndarray, n: int, shortlist: int = None):
+        """
+        Get the indexes and scores of the n best rows for each query. With
+        quantized codes and a shortlist size, candidates are shortlisted on
+        the codes and only the shortlist is rescored on the embeddings.
+        """
+
+        if self.codes is None or not shortlist:
+            return blockwise_top_n(
+                lambda start, stop: queries
+                @ np.asarray(self.matrix[start:stop], dtype=np.float32).T,
+                len(self.ids),
+                len(queries),
+                n,
+            )
+
+        candidates, _ = self.shortlist(queries, max(n, shortlist))
+        return self.rescore(queries, candidates, n)
+
+    def shortlist(self, queries: np.ndarray, size: int):
+        """Get the indexes of the best rows for each query by the codes"""
+
+        if self.quantization == "binary":
+            packed_queries = pack_bits(queries)
+
+            def score_block(start, stop):
+                return -hamming(packed_queries, self.codes[start:stop]).astype(
+                    np.float32
+                )
+
+        else:
+            scaled_queries = queries / self.scales
+
+            def score_block(start, stop):
+                return (
+                    scaled_queries
+                    @ np.asarray(self.codes[start:stop], dtype=np.float32).T
+                )
+
+        return blockwise_top_n(score_block, len(self.ids), len(queries), size)
+
+    def rescore(self, queries: np.ndarray, candidates: np.ndarray, n: int):
+        """Score each query's candidate rows on the embeddings and keep the n best"""
+
+        indexes, scores = [], []
+        for query, rows in zip(queries, candidates):
+            rows = np.sort(rows)
+            row_scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+            best = np.argsort(-row_scores, kind="stable")[:n]
+            indexes.append(rows[best])
+            scores.append(row_scores[best])
+
+        return np.asarray(indexes), np.asarray(scores)
+
+    def to_results(self, indexes, scores):
+        """Turn rows into (confidence, HSCodeVector) tuples like the database search"""
+
+        return [
+            [
+                (
+                    float(score),
+                    HSCodeVector(
+                        id=int(self.ids[i]),
+                        hierarchy_id=self.hierarchy.id,
+                        hierarchy=self.hierarchy,
+                        name=self.names[i],
+                        description=self.descriptions[i],
+                    ),
+                )
+                for i, score in zip(row_indexes, row_scores)
+            ]
+            for row_indexes, row_scores in zip(indexes, scores)
+        ]
+
+
+class NumpyVectorIndex:
+    """
+    In-process exact vector search. Each hierarchy's embeddings are loaded into
+    a contiguous matrix once, and top N is a matmul plus argpartition. A loaded
+    hierarchy is reloaded when its version or quantization changes, which is
+    checked at most every VECTOR_INDEX_REFRESH_SECONDS or right away after
+    invalidate().
+    """
+
+    def __init__(
+        self,
+        directory: str = VECTOR_INDEX_DIR,
+        dtype: str = VECTOR_INDEX_DTYPE,
+        refresh_seconds: int = VECTOR_INDEX_REFRESH_SECONDS,
+    ):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.refresh_seconds = refresh_seconds
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._async_lock = None
+
+    def invalidate(self, hierarchy_id: int = None):
+        """Force a version check on the next search"""
+
+        with self._lock:
+            if hierarchy_id is None:
+                self._matrices.clear()
+            else:
+                self._matrices.pop(hierarchy_id, None)
+
+    def load(self, db, hierarchy_id: int) -> HierarchyMatrix:
+        """Get the matrix for a hierarchy, loading or building it if stale"""
+
+        loaded = self._matrices.get(hierarchy_id)
+        if (
+            loaded
+            and time.monotonic() - loaded.checked_at < self.refresh_seconds
+        ):
+            return loaded
+
+        with self._lock:
+            version = get_version(db, hierarchy_id)
+            quantization = db.execute(
+                select(Hierarchy.quantization).where(
+                    Hierarchy.id == hierarchy_id
+                )
+            ).scalar()
+
+            loaded = self._matrices.get(hierarchy_id)
+            if (
+                loaded
+                and loaded.version == version
+                and loaded.quantization == quantization
+            ):
+                loaded.checked_at = time.monotonic()
+                return loaded
+
+            loaded = self._read(hierarchy_id, version)
+            if loaded is None:
+                self._build(db, hierarchy_id, version)
+                self._remove_stale(hierarchy_id, version)
+                loaded = self._read(hierarchy_id, version)
+
+            if quantization and len(loaded.ids):
+                self._read_codes(loaded, quantization)
+
+            self._matrices[hierarchy_id] = loaded
+            return loaded
+
+    def search(
+        self, db, vectors, hierarchy_id: int, n: int = 3, shortlist: int = None
+    ):
+        """
+        Get the N nearest neighbors of each vector in a hierarchy. With a
+        shortlist size, quantized hierarchies shortlist on their codes first.
+        """
+
+        loaded = self.load(db, hierarchy_id)
+        if not len(loaded.ids):
+            return [[] for _ in vectors]
+
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        return loaded.to_results(*loaded.top_n(queries, n, shortlist))
+
+    async def search_async(
+        self, db, vectors, hierarchy_id: int, n: int = 3, shortlist: int = None
+    ):
+        """search for an AsyncSession, with the matmul run off the event loop"""
+
+        loaded = self._matrices.get(hierarchy_id)
+        if (
+            loaded is None
+            or time.monotonic() - loaded.checked_at >= self.refresh_seconds
+        ):
+            # run_sync holds self._lock in a greenlet on the event loop's
+            # thread, so requests on the loop take turns or a second one
+            # deadlocks on it
+            async with self._load_lock():
+                loaded = await db.run_sync(self.load, hierarchy_id)
+
+        if not len(loaded.ids):
+            return [[] for _ in vectors]
+
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        indexes, scores = await asyncio.to_thread(
+            loaded.top_n, queries, n, shortlist
+        )
+        return loaded.to_results(indexes, scores)
+
+    def _load_lock(self) -> asyncio.Lock:
+        """Lock for loads from the running event loop"""
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._async_lock = asyncio.Lock()
+
+        return self._async_lock
+
+    def _paths(self, hierarchy_id: int, version: int):
+        """Matrix and metadata file paths for a hierarchy version"""
+
+        base = os.path.join(
+            self.directory, f"{hierarchy_id}-{version}-{self.dtype.name}"
+        )
+        return f"{base}.npy", f"{base}.json"
+
+    def _code_paths(self, hierarchy_id: int, version: int, quantization: str):
+        """Code and int8 scale file paths for a hierarchy version"""
+
+        base = os.path.join(
+            self.directory,
+            f"{hierarchy_id}-{version}-{self.dtype.name}.{quantization}",
+        )
+        return f"{base}.npy", f"{base}.scales.npy"
+
+    def _remove_stale(self, hierarchy_id: int, version: int):
+        """Delete files of older versions. Open memory maps stay valid."""
+
+        prefix = f"{hierarchy_id}-"
+        suffix = f"-{self.dtype.name}"
+        current = f"{hierarchy_id}-{version}-{self.dtype.name}"
+
+        for file_name in os.listdir(self.directory):
+            stem = file_name.split(".")[0]
+            if (
+                stem.startswith(prefix)
+                and stem.endswith(suffix)
+                and stem != current
+            ):
+                os.remove(os.path.join(self.directory, file_name))
+
+    def _read_codes(self, loaded: HierarchyMatrix, quantization: str):
+        """Memory-map the quantized codes of a matrix, building them if missing"""
+
+        codes_path, scales_path = self._code_paths(
+            loaded.hierarchy.id, loaded.version, quantization
+        )
+
+        if not os.path.exists(codes_path):
+            self._build_codes(loaded, quantization, codes_path, scales_path)
+
+        loaded.quantization = quantization
+        loaded.codes = np.load(codes_path, mmap_mode="r")
+        loaded.scales = np.load(scales_path) if quantization == "int8" else None
+
+    def _build_codes(
+        self,
+        loaded: HierarchyMatrix,
+        quantization: str,
+        codes_path,
+        scales_path,
+    ):
+        """Quantize a matrix block by block into a code file"""
+
+        count, size = loaded.matrix.shape
+        width = (size + 7) // 8 if quantization == "binary" else size
+
+        print(
+            f"Building {quantization} codes for {loaded.hierarchy.name} "
+            f"({count} vectors)"
+        )
+
+        if quantization == "int8":
+            peak = np.zeros((1, size), dtype=np.float32)
+            for start in range(0, count, VECTOR_INDEX_BLOCK_SIZE):
+                block = loaded.matrix[start : start + VECTOR_INDEX_BLOCK_SIZE]
+                peak = np.maximum(peak, np.abs(block).max(axis=0))
+            scales = int8_scales(peak)
+            np.save(scales_path, scales)
+
+        tmp_codes_path = f"{codes_path}.{os.getpid()}.tmp"
+        codes = np.lib.format.open_memmap(
+            tmp_codes_path,
+            mode="w+",
+            dtype=np.uint8 if quantization == "binary" else np.int8,
+            shape=(count, width),
+        )
+
+        for start in range(0, count, VECTOR_INDEX_BLOCK_SIZE):
+            block = loaded.matrix[start : start + VECTOR_INDEX_BLOCK_SIZE]
+            codes[start : start + len(block)] = (
+                pack_bits(block)
+                if quantization == "binary"
+                else quantize_int8(block, scales)
+            )
+
+        codes.flush()
+        del codes
+        os.replace(tmp_codes_path, codes_path)
+
+    def _read(self, hierarchy_id: int, version: int):
+        """Memory-map a matrix written by _build, or None if there isn't one"""
+
+        matrix_path, meta_path = self._paths(hierarchy_id, version)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+
+        matrix = (
+            np.load(matrix_path, mmap_mode="r")
+            if meta["ids"]
+            else np.zeros((0, 0), dtype=self.dtype)
+        )
+
+        hierarchy = Hierarchy(id=hierarchy_id, name=meta["hierarchy"])
+
+        return HierarchyMatrix(
+            hierarchy,
+            version,
+            np.asarray(meta["ids"], dtype=np.int64),
+            meta["names"],
+            meta["descriptions"],
+            matrix,
+        )
+
+    def _build(self, db, hierarchy_id: int, version: int):
+        """Stream a hierarchy's embeddings from the database into a matrix file"""
+
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path, meta_path = self._paths(hierarchy_id, version)
+
+        hierarchy_name = db.execute(
+            select(Hierarchy.name).where(Hierarchy.id == hierarchy_id)
+        ).scalar()
+        count = db.execute(
+            select(func.count(HSCodeVector.id)).where(
+                HSCodeVector.hierarchy_id == hierarchy_id
+            )
+        ).scalar()
+
+        print(f"Building vector index for {hierarchy_name} ({count} vectors)")
+
+        ids, names, descriptions = [], [], []
+        matrix = None
+        tmp_matrix_path = f"{matrix_path}.{os.getpid()}.tmp"
+
+        rows = db.execute(
+            select(
+                HSCodeVector.id,
+                HSCodeVector.name,
+                HSCodeVector.description,
+                HSCodeVector.embedding,
+            )
+            .where(HSCodeVector.hierarchy_id == hierarchy_id)
+            .order_by(HSCodeVector.id),
+            execution_options={"yield_per": 1000},
+        )
+
+        for i, (_id, name, description, embedding) in enumerate(rows):
+            if i >= count:
+                break
+
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    tmp_matrix_path,
+                    mode="w+",
+                    dtype=self.dtype,
+                    shape=(count, len(embedding)),
+                )
+
+            ids.append(_id)
+            names.append(name)
+            descriptions.append(description)
+            matrix[i] = normalize_rows(
+                np.asarray(embedding, dtype=np.float32)[None, :]
+            )[0]
+
+        if matrix is not None:
+            matrix.flush()
+            # rows inserted after the count was taken are left for the next version
+            del matrix
+            if len(ids) < count:
+                full = np.load(tmp_matrix_path, mmap_mode="r")
+                np.save(matrix_path, full[: len(ids)])
+                del full
+                os.remove(tmp_matrix_path)
+            else:
+                os.replace(tmp_matrix_path, matrix_path)
+
+        tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "hierarchy": hierarchy_name,
+                    "ids": ids,
+                    "names": names,
+                    "descriptions": descriptions,
+                },
+                file,
+            )
+        # the metadata is written last, since _read treats it as the marker
+        os.replace(tmp_meta_path, meta_path)
+
+
+index = NumpyVectorIndex()
@@ -0,0 +1,110 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from db.models import EmbeddingCache
+
+
+def _cutoff(ttl: int):
+    """Oldest creation time that is still fresh for a TTL in seconds."""
+
+    return datetime.now(timezone.utc) - timedelta(seconds=ttl)
+
+
+def get_many(
+    db,
+    model: str,
+    text_hashes: list[str],
+    ttl: int = 0,
+) -> dict[str, list[float]]:
+    """Get cached embeddings by text hash. Entries older than ttl are ignored."""
+
+    if not text_hashes:
+        return {}
+
+    query = select(EmbeddingCache.text_hash, EmbeddingCache.embedding).where(
+        EmbeddingCache.model == model,
+        EmbeddingCache.text_hash.in_(set(text_hashes)),
+    )
+
+    if ttl:
+        query = query.where(EmbeddingCache.created_at >= _cutoff(ttl))
+
+    return {
+        # pgvector returns lists or numpy arrays depending on its version
+        text_hash: [float(value) for value in embedding]
+        for text_hash, embedding in db.execute(query).fetchall()
+    }
+
+
+def put_many(
+    db,
+    model: str,
+    embeddings: dict[str, list[float]],
+):
+    """
+    Store embeddings by text hash, replacing any existing entry so expired
+    ones are fresh again. Rows are written in text hash order, so concurrent
+    writers lock them in the same order and don't deadlock.
+    """
+
+    if not embeddings:
+        return
+
+    statement = insert(EmbeddingCache).values(
+        [
+            {"model": model, "text_hash": text_hash, "embedding": embedding}
+            for text_hash, embedding in sorted(embeddings.items())
+        ]
+    )
+
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["model", "text_hash"],
+            set_={
+                "embedding": statement.excluded.embedding,
+                "created_at": func.now(),
+            },
+        )
+    )
+
+
+def prune(
+    db,
+    ttl: int = 0,
+    max_rows: int = 0,
+) -> int:
+    """Delete expired entries, then the oldest entries beyond max_rows."""
+
+    deleted = 0
+
+    if ttl:
+        deleted += db.execute(
+            delete(EmbeddingCache).where(
+                EmbeddingCache.created_at < _cutoff(ttl)
+            )
+        ).rowcount
+
+    if max_rows:
+        keep = (
+            select(EmbeddingCache.id)
+            .order_by(EmbeddingCache.created_at.desc())
+            .limit(max_rows)
+        )
+        deleted += db.execute(
+            delete(EmbeddingCache).where(EmbeddingCache.id.not_in(keep))
+        ).rowcount
+
+    return deleted
@@ -9,7 +9,10 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from api.dependencies import Session
+from sqlalchemy import func, select, update
+
+from api.dependencies import AsyncSession, Session
+from db.models.file import File
 from db.models.hierarchy import Hierarchy
 
 
@@ -21,3 +24,64 @@ def get_one(db: Session, hierarchy_name: str):
     )
 
     return hierarchy
+
+
+async def get_one_async(db: AsyncSession, hierarchy_name: str):
+    """Get a specific hierarchy of HS Codes."""
+
+    hierarchy = (
+        await db.execute(
+            select(Hierarchy).where(Hierarchy.name == hierarchy_name).limit(1)
+        )
+    ).scalar()
+
+    return hierarchy
+
+
+def _latest_file_id(hierarchy_id: int):
+    return (
+        select(func.max(File.id))
+        .where(File.hierarchy_id == hierarchy_id)
+        .scalar_subquery()
+    )
+
+
+def get_version(db: Session, hierarchy_id: int) -> int:
+    """
+    Get the version of a hierarchy, which changes whenever a file is imported
+    into it. Used to invalidate in-memory copies of the hierarchy.
+    Hierarchies that haven't been bumped yet fall back to their latest file id.
+    """
+
+    version = db.execute(
+        select(
+            func.coalesce(
+                select(Hierarchy.version)
+                .where(Hierarchy.id == hierarchy_id)
+                .scalar_subquery(),
+                _latest_file_id(hierarchy_id),
+            )
+        )
+    ).scalar()
+
+    return version or 0
+
+
+def bump_version(db: Session, hierarchy_id: int):
+    """
+    Move a hierarchy to a new version after its codes changed. The new
+    version is above both the old one and the latest file id, so it never
+    matches a version that was used before.
+    """
+
+    db.execute(
+        update(Hierarchy)
+        .where(Hierarchy.id == hierarchy_id)
+        .values(
+            version=func.greatest(
+                func.coalesce(Hierarchy.version, 0),
+                func.coalesce(_latest_file_id(hierarchy_id), 0),
+            )
+            + 1
+        )
+    )
@@ -9,7 +9,28 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
-from db.models import Hierarchy, HSCode
+from sqlalchemy import Integer, any_, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.orm import aliased
+
+from api.metrics import timed
+from db.hierarchy_tree import HierarchyTree, cache
+from db.models import Hierarchy, HSCode, HSCodeVector
+
+
+class SubtreeNotFound(LookupError):
+    """No HS code has the name a search was restricted to"""
+
+
+def _get_hierarchy(db, hierarchy) -> Hierarchy:
+    """Look up a hierarchy by its type in the hierarchy cache."""
+
+    cached = cache.hierarchy(db, hierarchy.value)
+
+    if cached is None:
+        raise ValueError(f"Hierarchy '{hierarchy.value}' not found.")
+
+    return cached
 
 
 def get_by_hierarchy(
@@ -18,14 +39,9 @@ def get_by_hierarchy(
 ) -> list[HSCode]:
     """Get HS codes by hierarchy."""
 
-    hierarchy = (
-        db.query(Hierarchy).filter(Hierarchy.name == hierarchy.value).first()
-    )
-
-    if hierarchy is None:
-        raise ValueError(f"Hierarchy '{hierarchy.value}' not found.")
+    hierarchy = _get_hierarchy(db, hierarchy)
 
-    return hierarchy.hs_codes
+    return db.query(HSCode).filter(HSCode.hierarchy_id == hierarchy.id).all()
 
 
 def get_by_name(
@@ -54,12 +70,7 @@ def get_hierarchy_roots(
 ) -> list[HSCode]:
     """Get HS codes by hierarchy, where parent_id is NULL."""
 
-    hierarchy = (
-        db.query(Hierarchy).filter(Hierarchy.name == hierarchy.value).first()
-    )
-
-    if hierarchy is None:
-        raise ValueError(f"Hierarchy '{hierarchy.value}' not found.")
+    hierarchy = _get_hierarchy(db, hierarchy)
 
     # get all hs_codes for hierarchy where parent_id is NULL
     hs_codes = (
@@ -77,12 +88,301 @@ def get_path_to_root(
 ) -> list[HSCode]:
     """Get the path to the root of the hierarchy."""
 
+    # with a materialized path, every ancestor is fetched in one query
+    if hs_code.path:
+        nodes = {
+            node.id: node
+            for node in db.query(HSCode).filter(
+                HSCode.hierarchy_id == hs_code.hierarchy_id,
+                HSCode.id.in_(hs_code.path),
+            )
+        }
+        return [nodes[node_id] for node_id in hs_code.path if node_id in nodes]
+
     path = [hs_code]
 
     while hs_code.parent_id is not None:
         hs_code = (
-            db.query(HSCode).filter(HSCode.id == hs_code.parent_id).first()
+            db.query(HSCode)
+            .filter(
+                HSCode.hierarchy_id == hs_code.hierarchy_id,
+                HSCode.id == hs_code.parent_id,
+            )
+            .first()
         )
         path.append(hs_code)
 
     return path[::-1]
+
+
+def get_tree(
+    db,
+    hierarchy_name: str,
+) -> HierarchyTree:
+    """
+    Get the cached tree of a hierarchy, for lookups that don't touch the
+    database. None if the hierarchy doesn't exist.
+    """
+
+    return cache.tree(db, hierarchy_name)
+
+
+def get_cached_hierarchy(
+    db,
+    hierarchy_name: str,
+) -> Hierarchy:
+    """Get a hierarchy by name from the hierarchy cache, or None."""
+
+    return cache.hierarchy(db, hierarchy_name)
+
+
+def _node(name: str, hierarchy_id: int):
+    """An aliased HS code and the filter selecting it by name."""
+
+    node = aliased(HSCode)
+    condition = (node.name == name) & (node.hierarchy_id == hierarchy_id)
+
+    return node, condition
+
+
+def get_ancestors(
+    db,
+    name: str,
+    hierarchy_id: int,
+) -> list[HSCode]:
+    """
+    Get an HS code and its ancestors, root first, in one query. Names are
+    only unique within a hierarchy, so it is required.
+    """
+
+    node, condition = _node(name, hierarchy_id)
+    path = select(node.path).where(condition).scalar_subquery()
+
+    return (
+        db.query(HSCode)
+        .filter(
+            HSCode.hierarchy_id == hierarchy_id,
+            path.op("@>")(array([HSCode.id])),
+        )
+        .order_by(func.array_position(path, HSCode.id))
+        .all()
+    )
+
+
+def get_descendants(
+    db,
+    name: str,
+    hierarchy_id: int,
+) -> list[HSCode]:
+    """
+    Get every HS code below an HS code in one query on the path index,
+    ordered depth first. Names are only unique within a hierarchy, so it is
+    required.
+    """
+
+    node, condition = _node(name, hierarchy_id)
+    node_id = select(node.id).where(condition).scalar_subquery()
+
+    return (
+        db.query(HSCode)
+        .filter(
+            HSCode.hierarchy_id == hierarchy_id,
+            HSCode.path.contains(array([node_id])),
+            HSCode.id != node_id,
+        )
+        .order_by(HSCode.path)
+        .all()
+    )
+
+
+def update_paths(
+    db,
+    hierarchy_id: int,
+    file_id: int = None,
+    vectors: bool = True,
+) -> int:
+    """
+    Fill in the materialized paths of a hierarchy's HS codes with one
+    recursive query, then copy them to the vectors built from the codes,
+    unless vectors is False. With file_id only the codes and vectors of that
+    file are walked, which is enough after an import since parents are only
+    linked within a file. Returns the number of HS codes whose path changed.
+    """
+
+    roots = select(HSCode.id, array([HSCode.id]).label("path")).where(
+        HSCode.hierarchy_id == hierarchy_id, HSCode.parent_id.is_(None)
+    )
+    if file_id is not None:
+        roots = roots.where(HSCode.file_id == file_id)
+
+    tree = roots.cte("tree", recursive=True)
+    child = aliased(HSCode)
+    tree = tree.union_all(
+        select(child.id, tree.c.path.op("||")(child.id)).where(
+            child.hierarchy_id == hierarchy_id,
+            child.parent_id == tree.c.id,
+        )
+    )
+
+    updated = db.execute(
+        update(HSCode)
+        .where(
+            HSCode.hierarchy_id == hierarchy_id,
+            HSCode.id == tree.c.id,
+            HSCode.path.is_distinct_from(tree.c.path),
+        )
+        .values(path=tree.c.path)
+    ).rowcount
+
+    if vectors:
+        update_vector_paths(db, hierarchy_id, file_id)
+
+    return updated
+
+
+def update_vector_paths(
+    db,
+    hierarchy_id: int,
+    file_id: int = None,
+) -> set[int]:
+    """
+    Copy the paths of a hierarchy's HS codes to the vectors built from them.
+    Returns the ancestors on the old and new paths of the vectors that moved,
+    whose centroids changed with them.
+    """
+
+    # joined again, the vector as it was before the update
+    old = aliased(HSCodeVector)
+
+    vectors = update(HSCodeVector).where(
+        HSCodeVector.hierarchy_id == hierarchy_id,
+        HSCode.hierarchy_id == hierarchy_id,
+        HSCodeVector.name == HSCode.name,
+        HSCodeVector.path.is_distinct_from(HSCode.path),
+        old.hierarchy_id == hierarchy_id,
+        old.id == HSCodeVector.id,
+    )
+    if file_id is not None:
+        vectors = vectors.where(HSCodeVector.file_id == file_id)
+
+    moved = db.execute(
+        vectors.values(path=HSCode.path).returning(old.path, HSCodeVector.path)
+    ).all()
+
+    return ancestors_of(path for paths in moved for path in paths)
+
+
+def ancestors_of(paths) -> set[int]:
+    """The ids on some paths, except the codes the paths lead to"""
+
+    return {code_id for path in paths if path for code_id in path[:-1]}
+
+
+def update_centroids(db, hierarchy_id: int, code_ids: set[int] = None) -> int:
+    """
+    Set the centroid of every internal HS code of a hierarchy to the mean
+    embedding of the leaves below it, found through the paths of the leaf
+    vectors, so no embeddings are requested. With code_ids only those codes
+    are updated, the ancestors of the leaves an import changed. Returns the
+    number of codes given a centroid.
+    """
+
+    if code_ids is not None and not code_ids:
+        return 0
+
+    vectors = select(HSCodeVector.path, HSCodeVector.embedding).where(
+        HSCodeVector.hierarchy_id == hierarchy_id
+    )
+    codes = HSCode.hierarchy_id == hierarchy_id
+
+    if code_ids is not None:
+        ids = literal(sorted(code_ids), ARRAY(Integer))
+        # only the leaves below the codes, found on the path index
+        vectors = vectors.where(HSCodeVector.path.overlap(ids))
+        codes = codes & (HSCode.id == any_(ids))
+
+    vectors = vectors.subquery()
+
+    # every code on a vector's path except the leaf itself
+    path = vectors.c.path
+    ancestors = select(
+        func.unnest(path[1 : func.cardinality(path) - 1]).label("id"),
+        vectors.c.embedding,
+    ).subquery()
+    means = (
+        select(
+            ancestors.c.id, func.avg(ancestors.c.embedding).label("centroid")
+        )
+        .group_by(ancestors.c.id)
+        .subquery()
+    )
+
+    db.execute(
+        update(HSCode)
+        .where(codes, HSCode.centroid.is_not(None))
+        .values(centroid=None)
+    )
+
+    return db.execute(
+        update(HSCode)
+        .where(codes, HSCode.id == means.c.id)
+        .values(centroid=means.c.centroid)
+    ).rowcount
+
+
+def _scored_children_query(vector, parent_ids=None, hierarchy_id=None):
+    """
+    Query for the children of some codes, or the roots without parent_ids,
+    with their cosine similarity to a vector. Internal codes are scored by
+    their centroid and leaves by their embedding.
+    """
+
+    embedding = func.coalesce(HSCode.centroid, HSCodeVector.embedding)
+
+    leaf = (HSCodeVector.hierarchy_id == HSCode.hierarchy_id) & (
+        HSCodeVector.name == HSCode.name
+    )
+    if hierarchy_id is not None:
+        # repeated on the vector side so both scans prune to one partition
+        leaf = leaf & (HSCodeVector.hierarchy_id == hierarchy_id)
+
+    query = (
+        select(
+            HSCode.id,
+            HSCode.parent_id,
+            HSCode.name,
+            HSCode.description,
+            Hierarchy.name.label("hierarchy"),
+            HSCodeVector.id.is_not(None).label("leaf"),
+            (1 - embedding.cosine_distance(vector)).label("similarity"),
+        )
+        .join(Hierarchy, Hierarchy.id == HSCode.hierarchy_id)
+        .outerjoin(HSCodeVector, leaf)
+        .where(embedding.is_not(None))
+    )
+
+    if parent_ids is None:
+        query = query.where(HSCode.parent_id.is_(None))
+    else:
+        query = query.where(HSCode.parent_id.in_(parent_ids))
+
+    if hierarchy_id is not None:
+        query = query.where(HSCode.hierarchy_id == hierarchy_id)
+
+    return query
+
+
+@timed("db")
+async def get_scored_children_async(
+    db, vector, parent_ids=None, hierarchy_id=None
+):
+    """
+    Children of some codes, or the roots without parent_ids, with their
+    similarity to a vector, for an AsyncSession.
+    """
+
+    return (
+        await db.execute(
+            _scored_children_query(vector, parent_ids, hierarchy_id)
+        )
+    ).all()
@@ -9,10 +9,40 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
+import os
+
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import label, select
+from sqlalchemy import (
+    Text,
+    bindparam,
+    cast,
+    func,
+    label,
+    literal,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased, joinedload
+
+from api.metrics import timed
+from classifier.pipelines.matryoshka import truncate
+from classifier.pipelines.quantization import binarize, quantizations
+from db.hierarchy_tree import cache as hierarchy_cache
+from db.indexes import (
+    search_expression,
+    search_type,
+    set_search_options,
+    set_search_options_async,
+    short_search_expression,
+)
+from db.models import Hierarchy, HSCode, HSCodeVector
+from db.search import get_index
+
 
-from db.models import Hierarchy, HSCodeVector
+# Candidates shortlisted on the truncated embeddings in a two-stage search
+VECTOR_SHORTLIST_SIZE = int(os.getenv("VECTOR_SHORTLIST_SIZE", "100"))
 
 
 def get_by_hierarchy(
@@ -53,11 +83,295 @@ def get_by_desc(
     return hs_code
 
 
+def search_options(config) -> dict:
+    """Per-request search settings from a classify config."""
+
+    return {
+        "ef_search": getattr(config, "ef_search", None),
+        "probes": getattr(config, "probes", None),
+        "two_stage": getattr(config, "two_stage", None),
+        "shortlist": getattr(config, "shortlist", None),
+        "subtree": getattr(config, "subtree", None),
+    }
+
+
+def _search_settings(hierarchy):
+    """Id and two-stage search settings of a cached hierarchy."""
+
+    return hierarchy.id, (hierarchy.short_dimensions, hierarchy.quantization)
+
+
+def _prefilter(short_dimensions, quantization, two_stage=None):
+    """
+    How to shortlist candidates in a two-stage search, as ("binary", None) or
+    ("short", dimensions), or None for a single-stage search. Hierarchies with
+    binary codes or short vectors use two-stage search unless it is turned off.
+    """
+
+    if two_stage is False:
+        return None
+
+    if quantization == "binary":
+        return "binary", None
+
+    if short_dimensions:
+        return "short", short_dimensions
+
+    return None
+
+
+def _prefilter_type(prefilter):
+    """Type the query side of a prefilter is compared in."""
+
+    kind, short_dimensions = prefilter
+    if kind == "binary":
+        return HSCodeVector.embedding_binary.type
+
+    return Vector(short_dimensions)
+
+
+def _prefilter_value(prefilter, vector):
+    """Query side of a prefilter: sign bits or the truncated embedding."""
+
+    kind, short_dimensions = prefilter
+    if kind == "binary":
+        return binarize(vector)
+
+    return truncate(vector, short_dimensions)
+
+
+def _prefilter_distance(prefilter, model, value):
+    """Distance a prefilter shortlists by: Hamming or truncated cosine."""
+
+    kind, short_dimensions = prefilter
+    if kind == "binary":
+        return func.bit_count(model.embedding_binary.op("#")(value))
+
+    return short_search_expression(short_dimensions, model).cosine_distance(
+        value
+    )
+
+
+def _in_hierarchy(hierarchy_id, model=HSCodeVector):
+    """
+    Filter on a hierarchy. The id is rendered inline rather than bound so the
+    planner prunes the search to that hierarchy's partition and its ANN
+    indexes, even when the driver reuses a generic prepared statement plan.
+    """
+
+    return model.hierarchy_id == bindparam(
+        "hierarchy_id", hierarchy_id, literal_execute=True
+    )
+
+
+def _in_subtree(subtree, model=HSCodeVector, hierarchy_id=None):
+    """
+    Filter on the vectors at or below an HS code, by name. Uses the
+    materialized path index, so it is one lookup however deep the tree is.
+    Names are only unique within a hierarchy, so without one the vectors
+    below every code of that name match.
+    """
+
+    nodes = select(func.array_agg(HSCode.id)).where(HSCode.name == subtree)
+    if hierarchy_id is not None:
+        nodes = nodes.where(_in_hierarchy(hierarchy_id, HSCode))
+
+    return model.path.overlap(nodes.scalar_subquery())
+
+
+def _vector_array(vectors, vector_type):
+    """Bind a list of vectors or bit strings as one array parameter."""
+
+    return cast(
+        literal(
+            [
+                (
+                    vector
+                    if isinstance(vector, str)
+                    else "[" + ",".join(map(str, vector)) + "]"
+                )
+                for vector in vectors
+            ],
+            ARRAY(Text),
+        ),
+        ARRAY(vector_type),
+    )
+
+
+def _shortlist_query(value, hierarchy_id, prefilter, shortlist, subtree=None):
+    """
+    Query for the ids of the closest candidates by the prefilter distance.
+    Uses an alias so it isn't correlated with the query it's nested in.
+    """
+
+    candidate = aliased(HSCodeVector)
+    distance = _prefilter_distance(prefilter, candidate, value)
+
+    query = select(candidate.id).where(_in_hierarchy(hierarchy_id, candidate))
+
+    if subtree is not None:
+        query = query.where(_in_subtree(subtree, candidate, hierarchy_id))
+
+    return query.order_by(distance).limit(shortlist)
+
+
+def _nearest_neighbors_query(
+    vector,
+    hierarchy_id=None,
+    n=3,
+    prefilter=None,
+    shortlist=VECTOR_SHORTLIST_SIZE,
+    subtree=None,
+):
+    """
+    Query for the N nearest neighbors of a vector and their distances.
+    With a prefilter, candidates are shortlisted on the binary codes or
+    truncated embeddings and only the shortlist is rescored on the full
+    embeddings. With a subtree, only vectors at or below that HS code are
+    searched.
+    """
+
+    distance = search_expression().cosine_distance(vector)
+
+    query = select(label("distance", distance), HSCodeVector).options(
+        joinedload(HSCodeVector.hierarchy)
+    )
+
+    if subtree is not None:
+        query = query.where(_in_subtree(subtree, hierarchy_id=hierarchy_id))
+
+    if hierarchy_id is not None:
+        query = query.where(_in_hierarchy(hierarchy_id))
+
+        if prefilter:
+            value = cast(
+                _prefilter_value(prefilter, vector), _prefilter_type(prefilter)
+            )
+            query = query.where(
+                HSCodeVector.id.in_(
+                    _shortlist_query(
+                        value, hierarchy_id, prefilter, shortlist, subtree
+                    )
+                )
+            )
+
+    return query.order_by(distance).limit(n)
+
+
+def _nearest_neighbors_batch_query(
+    vectors,
+    hierarchy_id=None,
+    n=3,
+    prefilter=None,
+    shortlist=VECTOR_SHORTLIST_SIZE,
+    subtree=None,
+):
+    """
+    Query for the N nearest neighbors of each vector. The query vectors are
+    unnested into rows and each row is joined laterally to its N nearest
+    neighbors, so the whole batch is resolved in one round trip.
+    """
+
+    arrays = [_vector_array(vectors, search_type())]
+    columns = ["embedding"]
+
+    two_stage = hierarchy_id is not None and prefilter
+    if two_stage:
+        arrays.append(
+            _vector_array(
+                [_prefilter_value(prefilter, vector) for vector in vectors],
+                _prefilter_type(prefilter),
+            )
+        )
+        columns.append("prefilter")
+
+    query_vectors = (
+        func.unnest(*arrays)
+        .table_valued(*columns, with_ordinality="ordinality")
+        .render_derived(name="query")
+    )
+
+    distance = search_expression().cosine_distance(query_vectors.c.embedding)
+
+    neighbors = select(HSCodeVector.id, label("distance", distance))
+
+    if subtree is not None:
+        neighbors = neighbors.where(
+            _in_subtree(subtree, hierarchy_id=hierarchy_id)
+        )
+
+    if hierarchy_id is not None:
+        neighbors = neighbors.where(_in_hierarchy(hierarchy_id))
+
+        if two_stage:
+            neighbors = neighbors.where(
+                HSCodeVector.id.in_(
+                    _shortlist_query(
+                        query_vectors.c.prefilter,
+                        hierarchy_id,
+                        prefilter,
+                        shortlist,
+                        subtree,
+                    ).correlate(query_vectors)
+                )
+            )
+
+    neighbors = (
+        neighbors.order_by(distance)
+        .limit(n)
+        .correlate(query_vectors)
+        .lateral("neighbor")
+    )
+
+    query = (
+        select(
+            query_vectors.c.ordinality,
+            neighbors.c.distance,
+            HSCodeVector,
+        )
+        .select_from(query_vectors)
+        .join(neighbors, true())
+        .join(HSCodeVector, HSCodeVector.id == neighbors.c.id)
+        .options(joinedload(HSCodeVector.hierarchy))
+        .order_by(query_vectors.c.ordinality, neighbors.c.distance)
+    )
+
+    if hierarchy_id is not None:
+        query = query.where(_in_hierarchy(hierarchy_id))
+
+    return query
+
+
+def _index_shortlist(two_stage=None, shortlist=None):
+    """Shortlist size for the in-process index, None for an exact search."""
+
+    if two_stage is False:
+        return None
+
+    return shortlist or VECTOR_SHORTLIST_SIZE
+
+
+def _group_batch_results(results, size):
+    """Split (ordinality, distance, vector) rows into one list per query."""
+
+    grouped = [[] for _ in range(size)]
+    for ordinality, distance, hs_code_vector in results:
+        grouped[ordinality - 1].append((1 - distance, hs_code_vector))
+
+    return grouped
+
+
+@timed("db")
 def get_nearest_neighbors(
     db,
     vector: Vector,
     hierarchy: Hierarchy = None,
     n: int = 3,
+    ef_search: int = None,
+    probes: int = None,
+    two_stage: bool = None,
+    shortlist: int = None,
+    subtree: str = None,
 ):
     """
     Retrieves vectors similar to a given vector, optionally filtering by hierarchy.
@@ -65,40 +379,181 @@ def get_nearest_neighbors(
     TODO: ^^ this doesn't accurately reflect model confidence. How do we determine confidence?
     """
 
+    hierarchy_id, settings = None, (None, None)
     if hierarchy:
-        hierarchy_instance = (
-            db.query(Hierarchy)
-            .filter(Hierarchy.name == hierarchy.value)
-            .first()
-        )
-        if not hierarchy_instance:
+        cached = hierarchy_cache.hierarchy(db, hierarchy.value)
+        if cached is None:
+            return []
+        hierarchy_id, settings = _search_settings(cached)
+
+    index = get_index()
+    # the in-process index has no paths, so subtree searches stay in Postgres
+    if index is not None and hierarchy_id is not None and subtree is None:
+        return index.search(
+            db,
+            [vector],
+            hierarchy_id,
+            n,
+            _index_shortlist(two_stage, shortlist),
+        )[0]
+
+    set_search_options(db, ef_search, probes)
+
+    query = _nearest_neighbors_query(
+        vector,
+        hierarchy_id,
+        n,
+        _prefilter(*settings, two_stage),
+        shortlist or VECTOR_SHORTLIST_SIZE,
+        subtree,
+    )
+
+    results = db.execute(query).fetchall()
+    return [(1 - result[0], result[1]) for result in results]
+
+
+@timed("db")
+async def get_nearest_neighbors_async(
+    db,
+    vector: Vector,
+    hierarchy: Hierarchy = None,
+    n: int = 3,
+    ef_search: int = None,
+    probes: int = None,
+    two_stage: bool = None,
+    shortlist: int = None,
+    subtree: str = None,
+):
+    """Async get_nearest_neighbors, for use with an AsyncSession."""
+
+    hierarchy_id, settings = None, (None, None)
+    if hierarchy:
+        cached = await hierarchy_cache.hierarchy_async(db, hierarchy.value)
+        if cached is None:
             return []
+        hierarchy_id, settings = _search_settings(cached)
 
-        query = (
-            select(
-                label(
-                    "distance", HSCodeVector.embedding.cosine_distance(vector)
-                ),
-                HSCodeVector,
+    index = get_index()
+    # the in-process index has no paths, so subtree searches stay in Postgres
+    if index is not None and hierarchy_id is not None and subtree is None:
+        return (
+            await index.search_async(
+                db,
+                [vector],
+                hierarchy_id,
+                n,
+                _index_shortlist(two_stage, shortlist),
             )
-            .where(HSCodeVector.hierarchy_id == hierarchy_instance.id)
-            .order_by(HSCodeVector.embedding.cosine_distance(vector))
-            .limit(n)
+        )[0]
+
+    await set_search_options_async(db, ef_search, probes)
+
+    query = _nearest_neighbors_query(
+        vector,
+        hierarchy_id,
+        n,
+        _prefilter(*settings, two_stage),
+        shortlist or VECTOR_SHORTLIST_SIZE,
+        subtree,
+    )
+
+    results = (await db.execute(query)).fetchall()
+    return [(1 - result[0], result[1]) for result in results]
+
+
+@timed("db")
+def get_nearest_neighbors_batch(
+    db,
+    vectors: list[Vector],
+    hierarchy: Hierarchy = None,
+    n: int = 3,
+    ef_search: int = None,
+    probes: int = None,
+    two_stage: bool = None,
+    shortlist: int = None,
+    subtree: str = None,
+):
+    """
+    Batched get_nearest_neighbors, resolved in one query.
+    Returns one result list per query vector.
+    """
+
+    if not vectors:
+        return []
+
+    hierarchy_id, settings = None, (None, None)
+    if hierarchy:
+        cached = hierarchy_cache.hierarchy(db, hierarchy.value)
+        if cached is None:
+            return [[] for _ in vectors]
+        hierarchy_id, settings = _search_settings(cached)
+
+    index = get_index()
+    # the in-process index has no paths, so subtree searches stay in Postgres
+    if index is not None and hierarchy_id is not None and subtree is None:
+        return index.search(
+            db, vectors, hierarchy_id, n, _index_shortlist(two_stage, shortlist)
         )
-    else:
-        query = (
-            select(
-                label(
-                    "distance", HSCodeVector.embedding.cosine_distance(vector)
-                ),
-                HSCodeVector,
-            )
-            .order_by(HSCodeVector.embedding.cosine_distance(vector))
-            .limit(n)
+
+    set_search_options(db, ef_search, probes)
+
+    query = _nearest_neighbors_batch_query(
+        vectors,
+        hierarchy_id,
+        n,
+        _prefilter(*settings, two_stage),
+        shortlist or VECTOR_SHORTLIST_SIZE,
+        subtree,
+    )
+
+    return _group_batch_results(db.execute(query).fetchall(), len(vectors))
+
+
+@timed("db")
+async def get_nearest_neighbors_batch_async(
+    db,
+    vectors: list[Vector],
+    hierarchy: Hierarchy = None,
+    n: int = 3,
+    ef_search: int = None,
+    probes: int = None,
+    two_stage: bool = None,
+    shortlist: int = None,
+    subtree: str = None,
+):
+    """Async get_nearest_neighbors_batch, for use with an AsyncSession."""
+
+    if not vectors:
+        return []
+
+    hierarchy_id, settings = None, (None, None)
+    if hierarchy:
+        cached = await hierarchy_cache.hierarchy_async(db, hierarchy.value)
+        if cached is None:
+            return [[] for _ in vectors]
+        hierarchy_id, settings = _search_settings(cached)
+
+    index = get_index()
+    # the in-process index has no paths, so subtree searches stay in Postgres
+    if index is not None and hierarchy_id is not None and subtree is None:
+        return await index.search_async(
+            db, vectors, hierarchy_id, n, _index_shortlist(two_stage, shortlist)
         )
 
-    results = db.execute(query).fetchall()
-    return [(1 - result[0], result[1]) for result in results]
+    await set_search_options_async(db, ef_search, probes)
+
+    query = _nearest_neighbors_batch_query(
+        vectors,
+        hierarchy_id,
+        n,
+        _prefilter(*settings, two_stage),
+        shortlist or VECTOR_SHORTLIST_SIZE,
+        subtree,
+    )
+
+    return _group_batch_results(
+        (await db.execute(query)).fetchall(), len(vectors)
+    )
 
 
 def get_similarity(
@@ -110,3 +565,109 @@ def get_similarity(
     """
 
     return 1 - vector1.embedding.cosine_distance(vector2.embedding)
+
+
+def _backfill(db, hierarchy_id: int, column: str, convert, batch_size: int):
+    """
+    Fill a column derived from the embedding for every vector of a hierarchy,
+    in batches by id. Returns the number of vectors updated.
+    """
+
+    updated = 0
+    last_id = 0
+
+    while True:
+        rows = db.execute(
+            select(HSCodeVector.id, HSCodeVector.embedding)
+            .where(
+                HSCodeVector.hierarchy_id == hierarchy_id,
+                HSCodeVector.id > last_id,
+            )
+            .order_by(HSCodeVector.id)
+            .limit(batch_size)
+        ).fetchall()
+
+        if not rows:
+            return updated
+
+        db.execute(
+            update(HSCodeVector),
+            [
+                {
+                    "id": _id,
+                    "hierarchy_id": hierarchy_id,
+                    column: convert(embedding),
+                }
+                for _id, embedding in rows
+            ],
+        )
+
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+
+def _clear(db, hierarchy_id: int, column: str) -> int:
+    """Clear a derived column for every vector of a hierarchy."""
+
+    return db.execute(
+        update(HSCodeVector)
+        .where(HSCodeVector.hierarchy_id == hierarchy_id)
+        .values({column: None})
+    ).rowcount
+
+
+def set_short_dimensions(
+    db,
+    hierarchy_id: int,
+    short_dimensions: int = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Set the truncated embedding size of a hierarchy and backfill the
+    truncated embeddings of its vectors in batches. None turns two-stage
+    search off and clears them. Returns the number of vectors updated.
+    """
+
+    db.execute(
+        update(Hierarchy)
+        .where(Hierarchy.id == hierarchy_id)
+        .values(short_dimensions=short_dimensions)
+    )
+
+    if not short_dimensions:
+        return _clear(db, hierarchy_id, "embedding_short")
+
+    return _backfill(
+        db,
+        hierarchy_id,
+        "embedding_short",
+        lambda embedding: truncate(embedding, short_dimensions),
+        batch_size,
+    )
+
+
+def set_quantization(
+    db,
+    hierarchy_id: int,
+    quantization: str = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Set the quantization of a hierarchy. Binary codes are stored in the
+    database and backfilled in batches; int8 codes are only built by the
+    in-process index. Returns the number of vectors updated.
+    """
+
+    if quantization is not None and quantization not in quantizations:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+
+    db.execute(
+        update(Hierarchy)
+        .where(Hierarchy.id == hierarchy_id)
+        .values(quantization=quantization)
+    )
+
+    if quantization != "binary":
+        return _clear(db, hierarchy_id, "embedding_binary")
+
+    return _backfill(db, hierarchy_id, "embedding_binary", binarize, batch_size)
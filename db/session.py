@@ -9,9 +9,11 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
-from .engine import engine
+from .engine import async_engine, engine
 
 
 Session = sessionmaker(bind=engine)
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
@@ -20,26 +20,41 @@ from .transformers.GENERIC import GENERIC
 __all__ = ["EU_ECCN", "US_ECCN", "US_PTC", "UN_SPSC"]
 
 
-def try_parse(db, file_path):
-    """Try to parse a file using its prefix to determine the transformer to use"""
+def transformer_for(file_path):
+    """The transformer class for a file, by the prefix of its name"""
+
+    file_name = os.path.basename(file_path)
+
+    # check if any transformer name prefixes the file name
+    for prefix in __all__:
+        if file_name.startswith(prefix):
+            return globals()[f"{prefix}"]
+
+    # if no transformer found, try to use the generic transformer
+    return GENERIC
+
+
+def hierarchy_for(file_path):
+    """Name of the hierarchy a file would be imported into"""
+
+    return transformer_for(file_path).hierarchy_for(file_path)
+
+
+def try_parse(db, file_path, reload: bool = False):
+    """
+    Try to parse a file using its prefix to determine the transformer to use.
+    With reload the file's hierarchy is emptied and imported from the file.
+    Returns the transformer, whose stats are empty if nothing was imported.
+    """
 
     # open file and get file name
     with open(file_path, "r", encoding="utf-8") as file:
         # get file name (without the path)
         file_name = os.path.basename(file.name)
 
-    # check if any transformer name prefixes the file name
-    transformer = None
-    for prefix in __all__:
-        if file_name.startswith(prefix):
-            transformer = globals()[f"{prefix}"](db, file_path)
-            break
-    if not transformer:
-        # if no transformer found, try to use the generic transformer
-        transformer = GENERIC(db, file_path)
+    transformer = transformer_for(file_name)(db, file_path, reload)
 
     # parse the file
-    if transformer:
-        transformer.parse()
-    else:
-        print(f"No transformer found for file {file_path}")
+    transformer.parse()
+
+    return transformer
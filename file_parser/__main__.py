@@ -10,19 +10,41 @@ This module is part of the Arbitrary Hierarchical Classification Application dev
 """
 
 import argparse
-import os
+import sys
 
-from db import session_scope
-from . import try_parse
+from .batch import IMPORT_WORKERS, expand_paths, import_files, print_summary
 
 
 if __name__ == "__main__":
-    # get the file path from the command line
-    parser = argparse.ArgumentParser(description="Parse a file")
-    parser.add_argument("file", help="The file to parse")
+    # get the file paths from the command line
+    parser = argparse.ArgumentParser(description="Parse files")
+    parser.add_argument(
+        "files",
+        nargs="+",
+        help="Files, directories of CSV files, or glob patterns to parse",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=IMPORT_WORKERS,
+        help=f"Hierarchies imported in parallel (default {IMPORT_WORKERS})",
+    )
+    parser.add_argument(
+        "--reload",
+        action="store_true",
+        help="Empty each hierarchy and import it from the given files only",
+    )
 
     args = parser.parse_args()
 
-    # try to parse the file
-    with session_scope() as db:
-        try_parse(db, os.path.abspath(args.file))
+    paths = expand_paths(args.files)
+    if not paths:
+        print("No files to parse")
+        sys.exit(1)
+
+    # try to parse the files
+    summaries = import_files(paths, args.workers, args.reload)
+    print_summary(summaries)
+
+    if any(summary["status"] == "failed" for summary in summaries):
+        sys.exit(1)
@@ -9,11 +9,81 @@ Affiliation: Utah Tech University
 This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
 """
 
+import hashlib
+import itertools
 import os
-
-from classifier.pipelines.openai_embeddings import bulk_vectorize
+from collections import deque
+
+import numpy as np
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, any_
+from sqlalchemy import case, delete, exists, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.orm import aliased
+
+from classifier.pipelines.matryoshka import truncate_rows
+from classifier.pipelines.embedding_stage import EmbeddingStage
+from classifier.pipelines.openai_embeddings import get_provider
+from db.copy import copy_rows
+from db.hierarchy_tree import invalidate as invalidate_hierarchy
+from db.indexes import rebuild_indexes
 from db.models import File, Hierarchy, HSCode, HSCodeVector
-from db.services.hs_code_service import get_path_to_root
+from db.partitions import create_partitions, truncate_partitions
+from db.search import invalidate
+from db.services.hierarchy_service import bump_version
+from db.services.hs_code_service import (
+    ancestors_of,
+    update_centroids,
+    update_paths,
+    update_vector_paths,
+)
+
+
+#
+# Files are imported in chunks of IMPORT_BATCH_SIZE rows, so memory is bounded
+# by the chunk size rather than the file size. Rows are staged in the
+# database and diffed against what the file imported last time, by a hash of
+# each node's name, parent and description, so re-importing a changed file
+# only writes the codes that changed and only embeds the leaves whose path
+# description changed. A new file is the case where every row is new.
+#
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+# chunks being embedded ahead of the one being written
+IMPORT_EMBED_AHEAD = int(os.getenv("IMPORT_EMBED_AHEAD", "2"))
+
+
+def batched(items, size):
+    """Lazily split an iterable into lists of at most size items"""
+
+    iterator = iter(items)
+
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file's contents, read in blocks"""
+
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        while block := file.read(1 << 20):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def node_hash(name, parent_name, description):
+    """SQL hash of a node's name, parent name and description"""
+
+    return func.md5(
+        func.concat_ws(
+            "\x1f",
+            name,
+            func.coalesce(parent_name, ""),
+            func.coalesce(description, ""),
+        )
+    )
 
 
 class BaseTransformer:
@@ -22,12 +92,21 @@ class BaseTransformer:
     __hierarchy__ = None
     __transformer__ = None
 
-    def __init__(self, db, file_path):
+    def __init__(self, db, file_path, reload: bool = False):
         self.db = db
         self.file_path = file_path
+        # start the hierarchy over from this file, see try_import
+        self.reload = reload
+        self.stats = {}
+
+    @classmethod
+    def hierarchy_for(cls, file_path: str) -> str:
+        """Name of the hierarchy a file is imported into"""
+
+        return cls.__hierarchy__
 
     def parse(self):
-        """Parse a file"""
+        """Parse a file and import its rows"""
 
         if not self._should_parse():
             return False
@@ -35,8 +114,17 @@ class BaseTransformer:
         print(
             f"Parsing file {self.file_path} with transformer {self.__transformer__}"
         )
+        self.try_import(self.rows())
         return True
 
+    def rows(self):
+        """
+        Yield the rows of the file one at a time, as dicts with name,
+        parent_name and desc. Implemented by each transformer.
+        """
+
+        raise NotImplementedError
+
     def _should_parse(self):
         """Check if the file should be parsed"""
 
@@ -52,127 +140,525 @@ class BaseTransformer:
             print(f"File {self.file_path} does not exist")
             return False
 
-        file = self.db.query(File).filter_by(path=self.file_path).first()
+        file = (
+            self.db.query(File)
+            .filter_by(name=os.path.basename(self.file_path))
+            .first()
+        )
+
+        if file and not self.reload:
+            if file.content_hash == file_hash(self.file_path):
+                print(f"File {self.file_path} has not changed. Skipping.")
+                return False
 
-        if file:
-            print(f"File {self.file_path} has already been imported. Skipping.")
-            return False
+            print(f"File {self.file_path} has changed since it was imported")
 
         return True
 
     def _should_import(self):
-        """Ensure the hierarchy exists in the database before importing the file"""
+        """
+        Ensure the hierarchy and its partitions exist in the database before
+        importing the file. Raises if they can't be created, so the file is
+        reported as failed rather than skipped.
+        """
 
         hierarchy = (
             self.db.query(Hierarchy).filter_by(name=self.__hierarchy__).first()
         )
 
-        if not hierarchy:
-            try:
-                self.db.add(Hierarchy(name=self.__hierarchy__))
-                self.db.commit()
-            except Exception as e:
-                print(f"Error adding hierarchy {self.__hierarchy__}: {e}")
-                return False
+        try:
+            if not hierarchy:
+                hierarchy = Hierarchy(name=self.__hierarchy__)
+                self.db.add(hierarchy)
+                self.db.flush()
+
+            for name in create_partitions(self.db, hierarchy.id):
+                print(f"Created partition {name}")
+
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error adding hierarchy {self.__hierarchy__}: {e}")
+            raise
 
         return True
 
-    def try_import(self, data):
-        """Try to import a file into the database"""
+    def _get_file(self, hierarchy):
+        """The file's row, updated for this import, or a new one"""
 
-        print(f"Attempting to insert rows for {self.__hierarchy__}")
+        # file names are unique, the same file may be imported from elsewhere
+        name = os.path.basename(self.file_path)
+        file = self.db.query(File).filter_by(name=name).first()
 
-        if not self._should_import():
-            print(f"Skipping import for {self.file_path}")
-            return
+        if file is None:
+            file = File(hierarchy_id=hierarchy.id, name=name)
+            self.db.add(file)
 
-        # Get the hierarchy
-        hierarchy = (
-            self.db.query(Hierarchy).filter_by(name=self.__hierarchy__).first()
+        file.path = self.file_path
+        file.size = os.path.getsize(self.file_path)
+        file.content_hash = file_hash(self.file_path)
+        self.db.flush()
+
+        return file
+
+    def _create_staging(self):
+        """
+        Temporary table of the file's rows, dropped at commit. Rows are
+        diffed against the stored codes once every chunk is in, since parents
+        can come after their children in a file.
+        """
+
+        staging = Table(
+            "hs_code_staging",
+            MetaData(),
+            Column("name", String, primary_key=True),
+            Column("position", Integer),
+            Column("parent_name", String),
+            Column("description", String),
+            Column("changed", Boolean, server_default="false"),
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DROP",
+        )
+        staging.create(self.db.connection())
+
+        return staging
+
+    def _stage_rows(self, staging, rows, position: int):
+        """
+        Stage a chunk of rows with one multi-row INSERT. A name repeated in
+        the file replaces the earlier row, as before.
+        """
+
+        nodes = {row["name"]: row for row in rows}
+
+        statement = insert(staging)
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[staging.c.name],
+                set_={
+                    "parent_name": statement.excluded.parent_name,
+                    "description": statement.excluded.description,
+                },
+            ),
+            [
+                {
+                    "name": node["name"],
+                    "position": position + i,
+                    "parent_name": node["parent_name"],
+                    "description": node["desc"],
+                }
+                for i, node in enumerate(nodes.values())
+            ],
         )
 
-        # Insert the file into the database
-        file = File(
-            hierarchy_id=hierarchy.id,
-            name=os.path.basename(self.file_path),
-            path=self.file_path,
-            size=os.path.getsize(self.file_path),
+    def _delete_codes(self, file, staging) -> int:
+        """Delete the file's codes that are no longer in it"""
+
+        gone = aliased(HSCode)
+
+        # children that stay lose their parent first
+        self.db.execute(
+            update(HSCode)
+            .where(
+                HSCode.hierarchy_id == file.hierarchy_id,
+                HSCode.parent_id.in_(
+                    select(gone.id).where(
+                        gone.hierarchy_id == file.hierarchy_id,
+                        gone.file_id == file.id,
+                        ~exists().where(staging.c.name == gone.name),
+                    )
+                ),
+            )
+            .values(parent_id=None)
         )
 
-        self.db.add(file)
-        self.db.flush()
+        return self.db.execute(
+            delete(HSCode).where(
+                HSCode.hierarchy_id == file.hierarchy_id,
+                HSCode.file_id == file.id,
+                ~exists().where(staging.c.name == HSCode.name),
+            )
+        ).rowcount
+
+    def _mark_changed(self, file, staging) -> int:
+        """
+        Mark the staged rows whose hash doesn't match the stored code's. A
+        parent is only hashed if it's in the file, since only those are linked.
+        """
+
+        code = aliased(HSCode)
+        parent = aliased(HSCode)
+        other = staging.alias("other")
+
+        staged_parent = case(
+            (
+                exists().where(
+                    other.c.name == staging.c.parent_name,
+                    other.c.name != staging.c.name,
+                ),
+                staging.c.parent_name,
+            ),
+        )
 
-        nodes = {row["name"]: row for row in data}
+        unchanged = (
+            select(code.id)
+            .outerjoin(
+                parent,
+                (parent.hierarchy_id == file.hierarchy_id)
+                & (parent.id == code.parent_id),
+            )
+            .where(
+                code.hierarchy_id == file.hierarchy_id,
+                code.name == staging.c.name,
+                code.file_id == file.id,
+                node_hash(code.name, parent.name, code.description)
+                == node_hash(
+                    staging.c.name, staged_parent, staging.c.description
+                ),
+            )
+        )
 
-        # Insert the nodes into the database without parent-child relationships
-        for node in nodes.values():
-            self.db.add(
-                HSCode(
-                    file_id=file.id,
-                    hierarchy_id=hierarchy.id,
-                    name=node["name"],
-                    description=node["desc"],
-                )
+        return self.db.execute(
+            update(staging).where(~unchanged.exists()).values(changed=True)
+        ).rowcount
+
+    def _upsert_codes(self, file, hierarchy, staging) -> int:
+        """
+        Insert or update the changed codes with one INSERT ... SELECT, in file
+        order. Names already imported from another file are skipped.
+        Returns the number of codes written.
+        """
+
+        statement = insert(HSCode).from_select(
+            ["file_id", "hierarchy_id", "name", "description"],
+            select(
+                literal(file.id),
+                literal(hierarchy.id),
+                staging.c.name,
+                staging.c.description,
             )
+            .where(staging.c.changed)
+            .order_by(staging.c.position),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[HSCode.hierarchy_id, HSCode.name],
+            set_={"description": statement.excluded.description},
+            where=HSCode.file_id == file.id,
+        )
 
-        self.db.flush()
+        return len(self.db.execute(statement.returning(HSCode.id)).all())
 
-        # add the parent-child relationships
-        for node in nodes.values():
-            if node["parent_name"] in nodes:
-                parent = nodes[node["parent_name"]]
-                child = nodes[node["name"]]
+    def _link_parents(self, file, staging):
+        """
+        Set the parent ids of the changed codes with one UPDATE ... FROM the
+        staging table. Only parents in the same file are linked, as before.
+        """
 
-                parent_node = (
-                    self.db.query(HSCode).filter_by(name=parent["name"]).first()
+        parent = aliased(HSCode)
+
+        self.db.execute(
+            update(HSCode)
+            .where(
+                HSCode.hierarchy_id == file.hierarchy_id,
+                HSCode.name == staging.c.name,
+                HSCode.file_id == file.id,
+                staging.c.changed,
+            )
+            .values(
+                parent_id=select(parent.id)
+                .where(
+                    parent.hierarchy_id == file.hierarchy_id,
+                    parent.name == staging.c.parent_name,
+                    parent.file_id == file.id,
+                    parent.name != staging.c.name,
                 )
+                .scalar_subquery()
+            )
+        )
 
-                if not parent_node:
-                    print(
-                        f"Parent node {parent['name']} not found for child node {child['name']}"
-                    )
-                    continue
+    def _leaf_query(self, file):
+        """
+        The leaves of a file with their paths and descriptions, the
+        descriptions of their ancestors from the root down joined with " -> "
+        """
+
+        ancestor = aliased(HSCode)
+        child = aliased(HSCode)
+
+        return (
+            select(
+                HSCode.id,
+                HSCode.name,
+                func.string_agg(
+                    ancestor.description,
+                    aggregate_order_by(
+                        literal(" -> "),
+                        func.array_position(HSCode.path, ancestor.id),
+                    ),
+                ).label("description"),
+                HSCode.path,
+            )
+            .join(
+                ancestor,
+                (ancestor.hierarchy_id == file.hierarchy_id)
+                & (ancestor.id == any_(HSCode.path)),
+            )
+            .where(
+                HSCode.hierarchy_id == file.hierarchy_id,
+                HSCode.file_id == file.id,
+                ~exists().where(
+                    child.hierarchy_id == file.hierarchy_id,
+                    child.parent_id == HSCode.id,
+                ),
+            )
+            .group_by(HSCode.id, HSCode.hierarchy_id)
+        )
 
-                self.db.query(HSCode).filter_by(name=child["name"]).update(
-                    {"parent_id": parent_node.id}
+    def _delete_stale_vectors(self, file) -> list[list[int]]:
+        """
+        Delete the file's vectors that are no longer a leaf, or whose path
+        description changed, comparing description hashes, or that came from
+        another embedding provider. Returns the paths of the deleted vectors.
+        """
+
+        leaves = self._leaf_query(file).subquery()
+
+        stale = (
+            delete(HSCodeVector)
+            .where(
+                HSCodeVector.hierarchy_id == file.hierarchy_id,
+                HSCodeVector.file_id == file.id,
+                ~exists().where(
+                    leaves.c.name == HSCodeVector.name,
+                    func.md5(leaves.c.description).is_not_distinct_from(
+                        func.md5(HSCodeVector.description)
+                    ),
                 )
+                # vectors from before providers were recorded are kept
+                | (HSCodeVector.embedding_provider != get_provider().key),
+            )
+            .returning(HSCodeVector.path)
+        )
 
-        self.db.flush()
+        return self.db.execute(stale).scalars().all()
 
-        items_to_vectorize = []
-        hs_codes = self.db.query(HSCode).filter_by(file_id=file.id).all()
-        hs_codes_without_children = [
-            hs_code for hs_code in hs_codes if not hs_code.children
-        ]
+    def _new_leaves(self, file):
+        """The leaves of a file that have no vector yet"""
 
-        # we only want to vectorize the leaf nodes
-        for hs_code in hs_codes_without_children:
-            path_to_root = get_path_to_root(self.db, hs_code)
+        leaves = self._leaf_query(file).subquery()
 
-            description = " -> ".join(
-                [node.description for node in path_to_root]
+        return (
+            select(leaves.c.name, leaves.c.description, leaves.c.path)
+            .where(
+                ~exists().where(
+                    HSCodeVector.hierarchy_id == file.hierarchy_id,
+                    HSCodeVector.name == leaves.c.name,
+                )
             )
+            .order_by(leaves.c.id)
+        )
+
+    def _count_new_leaves(self, file) -> int:
+        """Number of leaves of a file to embed"""
+
+        return self.db.execute(
+            select(func.count()).select_from(self._new_leaves(file).subquery())
+        ).scalar()
+
+    def _stream_new_leaves(self, file):
+        """Stream the leaves to embed in chunks of IMPORT_BATCH_SIZE rows"""
+
+        result = self.db.execute(
+            self._new_leaves(file),
+            execution_options={
+                "stream_results": True,
+                "yield_per": IMPORT_BATCH_SIZE,
+            },
+        )
+
+        for partition in result.partitions():
+            yield partition
+
+    def _insert_vectors(self, file, hierarchy, leaves, embeddings) -> int:
+        """Insert a chunk of HS code vectors with COPY"""
+
+        table = HSCodeVector.__table__
+        columns = [
+            table.c.file_id,
+            table.c.hierarchy_id,
+            table.c.name,
+            table.c.description,
+            table.c.embedding,
+            table.c.embedding_short,
+            table.c.embedding_binary,
+            table.c.embedding_provider,
+            table.c.embedding_dimensions,
+            table.c.path,
+        ]
+        provider = get_provider()
+
+        # derive the short vectors and sign bits for the chunk at once
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        short = (
+            truncate_rows(matrix, hierarchy.short_dimensions)
+            if hierarchy.short_dimensions
+            else None
+        )
+        signs = matrix > 0 if hierarchy.quantization == "binary" else None
 
-            items_to_vectorize.append(
+        copy_rows(
+            self.db,
+            table,
+            columns,
+            (
                 (
-                    hs_code,
+                    file.id,
+                    hierarchy.id,
+                    name,
                     description,
+                    matrix[i],
+                    None if short is None else short[i],
+                    None if signs is None else signs[i],
+                    provider.key,
+                    provider.dimensions,
+                    path,
                 )
-            )
+                for i, (name, description, path) in enumerate(leaves)
+            ),
+        )
 
-        embeddings = bulk_vectorize([item[1] for item in items_to_vectorize])
+        return len(leaves)
 
-        for i, (hs_code, _) in enumerate(items_to_vectorize):
-            self.db.add(
-                HSCodeVector(
-                    file_id=file.id,
-                    hierarchy_id=hierarchy.id,
-                    name=hs_code.name,
-                    description=items_to_vectorize[i][1],
-                    embedding=embeddings[i],
-                )
+    def try_import(self, data):
+        """Try to import a file into the database, data being an iterable of rows"""
+
+        chunks = batched(data, IMPORT_BATCH_SIZE)
+        first = next(chunks, None)
+
+        if first is None:
+            print("No rows to import")
+            return
+
+        print(f"Attempting to insert rows for {self.__hierarchy__}")
+
+        self._should_import()
+
+        # Get the hierarchy
+        hierarchy = (
+            self.db.query(Hierarchy).filter_by(name=self.__hierarchy__).first()
+        )
+
+        # the parent foreign key checks query hs_code, and a generic plan of
+        # that locks every partition, so imports of other hierarchies that
+        # truncated theirs would deadlock with this one. Custom plans only
+        # lock the partition they prune to.
+        self.db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+
+        if self.reload:
+            # start from empty partitions, swapped in at commit. Other files
+            # of the hierarchy are imported in full the next time
+            truncate_partitions(self.db, hierarchy.id)
+            self.db.execute(
+                update(File)
+                .where(File.hierarchy_id == hierarchy.id)
+                .values(content_hash=None)
+            )
+            print(f"Truncated the partitions of {hierarchy.name}")
+
+        # Insert the file into the database, or update it if it was imported before
+        file = self._get_file(hierarchy)
+
+        # stage the rows chunk by chunk
+        staging = self._create_staging()
+        rows = 0
+        for position, chunk in enumerate(itertools.chain([first], chunks)):
+            self._stage_rows(staging, chunk, position * IMPORT_BATCH_SIZE)
+            rows += len(chunk)
+
+        # diff the rows against the stored codes and only write what changed
+        deleted = self._delete_codes(file, staging)
+        changed = self._mark_changed(file, staging)
+        written = self._upsert_codes(file, hierarchy, staging)
+        self._link_parents(file, staging)
+        update_paths(self.db, hierarchy.id, file.id, vectors=False)
+
+        # internal codes whose leaves changed, their centroids are recomputed
+        changed_ancestors = update_vector_paths(self.db, hierarchy.id, file.id)
+
+        if written < changed:
+            print(
+                f"Skipped {changed - written} codes that were already "
+                "imported from another file"
             )
 
+        # we only want to vectorize the leaf nodes, and only those that are new
+        # or whose path description changed. Chunks are embedded in the
+        # background while earlier chunks are written.
+        removed_paths = self._delete_stale_vectors(file)
+        removed = len(removed_paths)
+        changed_ancestors |= ancestors_of(removed_paths)
+        total = self._count_new_leaves(file)
+        vectors = 0
+        pending = deque()
+        embedding = {}
+
+        if total:
+            with EmbeddingStage(total=total) as stage:
+                for leaves in self._stream_new_leaves(file):
+                    descriptions = [description for _, description, _ in leaves]
+                    changed_ancestors |= ancestors_of(
+                        path for *_, path in leaves
+                    )
+                    pending.append((leaves, stage.submit(descriptions)))
+
+                    while len(pending) > IMPORT_EMBED_AHEAD:
+                        leaves, embeddings = pending.popleft()
+                        vectors += self._insert_vectors(
+                            file, hierarchy, leaves, embeddings.result()
+                        )
+
+                while pending:
+                    leaves, embeddings = pending.popleft()
+                    vectors += self._insert_vectors(
+                        file, hierarchy, leaves, embeddings.result()
+                    )
+
+            embedding = stage.info()
+
+        # internal codes are scored by the mean of their leaves in beam search
+        if changed_ancestors:
+            update_centroids(self.db, hierarchy.id, changed_ancestors)
+
+        bump_version(self.db, hierarchy.id)
         self.db.commit()
 
+        self.stats = {
+            "rows": rows,
+            "written": written,
+            "deleted": deleted,
+            "embedded": vectors,
+            "removed": removed,
+            "embedding_calls": embedding.get("batches", 0),
+            "embedding_retries": embedding.get("retries", 0),
+            "checkpoint_errors": embedding.get("checkpoint_errors", 0),
+        }
+        print(
+            f"Wrote {written} codes and deleted {deleted}, "
+            f"embedded {vectors} leaves and deleted {removed} vectors"
+        )
+
+        # the rows are committed, so the caches drop them whatever happens next
+        invalidate(hierarchy.id)
+        invalidate_hierarchy(hierarchy.id)
+
+        # searches still work without the indexes, so a failure doesn't fail
+        # the import
+        try:
+            for name in rebuild_indexes(self.db, hierarchy.id):
+                print(f"Rebuilt index {name}")
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error rebuilding indexes of {self.__hierarchy__}: {e}")
+
         print(f"File {self.file_path} has been imported")
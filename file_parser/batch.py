@@ -0,0 +1,209 @@
+"""
+Author: Walter Shewmake <walter.shewmake@utahtech.edu>
+Date: 10-18-2026
+
+Project: Arbitrary Hierarchical Classifier
+Client: Zonos
+Affiliation: Utah Tech University
+
+This module is part of the Arbitrary Hierarchical Classification Application developed for Zonos.
+"""
+
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from classifier.pipelines.embedding_stage import share_rate_limits
+from db import session_scope
+from db.models.hierarchy import Hierarchy
+from db.partitions import create_partitions
+from db.services.hierarchy_service import get_one
+from . import hierarchy_for, try_parse
+
+
+#
+# Files of different hierarchies don't touch the same rows, so each hierarchy
+# is imported by its own worker process, at most IMPORT_WORKERS at once.
+# Files of the same hierarchy are imported one after another by one worker.
+# Workers split the embedding RPM / TPM limits between them.
+#
+IMPORT_WORKERS = int(
+    os.getenv("IMPORT_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+
+def expand_paths(patterns: list[str]) -> list[str]:
+    """
+    Files named by a list of files, directories and glob patterns. Directories
+    contribute the CSV files directly in them. Duplicates are dropped.
+    """
+
+    paths = []
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += sorted(
+                path
+                for path in glob.glob(os.path.join(pattern, "*"))
+                if os.path.isfile(path) and path.lower().endswith(".csv")
+            )
+        elif glob.has_magic(pattern):
+            paths += sorted(glob.glob(pattern, recursive=True))
+        else:
+            paths.append(pattern)
+
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def group_by_hierarchy(paths: list[str]) -> dict[str, list[str]]:
+    """Files by the hierarchy they are imported into, keeping their order"""
+
+    groups = {}
+
+    for path in paths:
+        groups.setdefault(hierarchy_for(path), []).append(path)
+
+    return groups
+
+
+def import_group(paths: list[str], reload: bool = False) -> list[dict]:
+    """
+    Import files one after another in one session, summarizing each. With
+    reload the hierarchy is emptied by the first file, so it ends up with the
+    rows of these files only.
+    """
+
+    summaries = []
+
+    with session_scope() as db:
+        for i, path in enumerate(paths):
+            started = time.monotonic()
+            summary = {"path": path, "hierarchy": hierarchy_for(path)}
+
+            try:
+                stats = try_parse(db, path, reload and i == 0).stats
+                summary.update(stats)
+                summary["status"] = "imported" if stats else "skipped"
+            except Exception as e:
+                db.rollback()
+                summary["status"] = "failed"
+                summary["error"] = str(e)
+                print(f"Error importing {path}: {e}")
+
+            summary["seconds"] = time.monotonic() - started
+            summaries.append(summary)
+
+    return summaries
+
+
+def prepare_hierarchies(names: list[str]):
+    """
+    Create the hierarchies and their partitions before the workers start.
+    Creating a partition locks the parent tables, which would deadlock with
+    the imports other workers are running.
+    """
+
+    with session_scope() as db:
+        for name in names:
+            hierarchy = get_one(db, name)
+            if hierarchy is None:
+                hierarchy = Hierarchy(name=name)
+                db.add(hierarchy)
+                db.flush()
+
+            for partition in create_partitions(db, hierarchy.id):
+                print(f"Created partition {partition}")
+
+
+def _init_worker(workers: int):
+    share_rate_limits(workers)
+
+
+def import_files(
+    paths: list[str], workers: int = IMPORT_WORKERS, reload: bool = False
+) -> list[dict]:
+    """
+    Import files, hierarchies in parallel in a process pool with one session
+    per worker. With reload each hierarchy is emptied and imported from its
+    files. Returns a summary of each file, in the order given.
+    """
+
+    groups = group_by_hierarchy(paths)
+    workers = max(1, min(workers, len(groups)))
+
+    if workers == 1:
+        summaries = [
+            summary
+            for group in groups.values()
+            for summary in import_group(group, reload)
+        ]
+    else:
+        summaries = []
+        prepare_hierarchies(list(groups))
+
+        # spawned rather than forked, so workers don't share the parent's
+        # database connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(workers,),
+        ) as executor:
+            futures = {
+                executor.submit(import_group, group, reload): (hierarchy, group)
+                for hierarchy, group in groups.items()
+            }
+
+            for future in as_completed(futures):
+                hierarchy, group = futures[future]
+                try:
+                    summaries += future.result()
+                except Exception as e:
+                    # the worker died, so none of its files are known to be in
+                    summaries += [
+                        {
+                            "path": path,
+                            "hierarchy": hierarchy,
+                            "status": "failed",
+                            "error": str(e),
+                            "seconds": 0.0,
+                        }
+                        for path in group
+                    ]
+
+    order = {path: i for i, path in enumerate(paths)}
+    return sorted(summaries, key=lambda summary: order[summary["path"]])
+
+
+def print_summary(summaries: list[dict]):
+    """Print one line per file and the totals"""
+
+    print()
+    print(
+        f"{'status':<9}{'rows':>8}{'rows/s':>10}{'calls':>7}{'embedded':>10}"
+        f"{'seconds':>9}  file"
+    )
+
+    for summary in summaries:
+        rows = summary.get("rows", 0)
+        seconds = summary["seconds"]
+
+        print(
+            f"{summary['status']:<9}{rows:>8}{rows / max(seconds, 1e-9):>10.0f}"
+            f"{summary.get('embedding_calls', 0):>7}"
+            f"{summary.get('embedded', 0):>10}{seconds:>9.1f}  {summary['path']}"
+        )
+        if summary.get("error"):
+            print(f"{'':<9}{summary['error']}")
+        if summary.get("checkpoint_errors"):
+            print(
+                f"{'':<9}{summary['checkpoint_errors']} embedding checkpoints failed"
+            )
+
+    counts = {}
+    for summary in summaries:
+        counts[summary["status"]] = counts.get(summary["status"], 0) + 1
+
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
@@ -25,24 +25,13 @@ class EU_ECCN(BaseTransformer):
     __hierarchy__ = "EU_ECCN"
     __transformer__ = "EU_ECCN"
 
-    def parse(self):
-        """Parse a us_eccn file"""
-        if not super().parse():
-            return
-
-        rows = []
+    def rows(self):
+        """Yield the rows of an eu_eccn file"""
         with open(self.file_path, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             for row in reader:
-                parsed_row = {
+                yield {
                     "name": row.get("part_id").strip(),
                     "parent_name": row.get("parent_id").strip(),
                     "desc": row.get("eccn_desc"),
                 }
-                rows.append(parsed_row)
-
-        if not rows:
-            print("No rows to import")
-            return
-
-        self.try_import(rows)
@@ -26,33 +26,32 @@ class GENERIC(BaseTransformer):
     __hierarchy__ = "generic"
     __transformer__ = "generic"
 
-    def parse(self):
-        """Parse a generic file"""
-        if not super().parse():
-            return
-
+    @classmethod
+    def hierarchy_for(cls, file_path):
+        """Hierarchy name from the file name"""
         #
         # Extract hierarchy name from filename generic_HIERARCHY.csv
         #
-        file_name = os.path.basename(self.file_path)
+        file_name = os.path.basename(file_path)
         match = re.match(r"^GENERIC([^A-Za-z0-9])*(.*)\.(csv|CSV)", file_name)
         if match:
-            self.__hierarchy__ = match.group(2)
+            return match.group(2)
+
+        return cls.__hierarchy__
+
+    def parse(self):
+        """Parse a generic file"""
+        self.__hierarchy__ = self.hierarchy_for(self.file_path)
+
+        return super().parse()
 
-        rows = []
+    def rows(self):
+        """Yield the rows of a generic file"""
         with open(self.file_path, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             for row in reader:
-                print(row)
-                parsed_row = {
+                yield {
                     "name": row.get("name").strip(),
                     "parent_name": row.get("parent_name").strip(),
                     "desc": row.get("desc"),
                 }
-                rows.append(parsed_row)
-
-        if not rows:
-            print("No rows to import")
-            return
-
-        self.try_import(rows)
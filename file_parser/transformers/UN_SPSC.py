@@ -32,12 +32,8 @@ class UN_SPSC(BaseTransformer):
     __hierarchy__ = "UN_SPSC"
     __transformer__ = "UN_SPSC"
 
-    def parse(self):
-        """Parse US product tax codes file"""
-        if not super().parse():
-            return
-
-        rows = []
+    def rows(self):
+        """Yield the nodes of a UN SPSC file, each code the first time it is seen"""
         code_tracker = set()
         with open(
             self.file_path, "r", encoding="utf-8", errors="replace"
@@ -48,51 +44,19 @@ class UN_SPSC(BaseTransformer):
                 _family = row.get("Family").strip()
                 _class = row.get("Class").strip()
                 _commodity = row.get("Commodity").strip()
-                if _segment in code_tracker:
-                    pass
-                else:
-                    code_tracker.add(_segment)
-                    parsed_row = {
-                        "name": _segment,
-                        "parent_name": "",
-                        "desc": row.get("Segment Name").strip(),
-                    }
-                    rows.append(parsed_row)
-
-                if _family in code_tracker:
-                    pass
-                else:
-                    code_tracker.add(_family)
-                    parsed_row = {
-                        "name": _family,
-                        "parent_name": _segment,
-                        "desc": row.get("Family Name").strip(),
-                    }
-                    rows.append(parsed_row)
 
-                if _class in code_tracker:
-                    pass
-                else:
-                    code_tracker.add(_class)
-                    parsed_row = {
-                        "name": _class,
-                        "parent_name": _family,
-                        "desc": row.get("Class Name").strip(),
+                for name, parent_name, desc in (
+                    (_segment, "", row.get("Segment Name")),
+                    (_family, _segment, row.get("Family Name")),
+                    (_class, _family, row.get("Class Name")),
+                    (_commodity, _class, row.get("Commodity Name")),
+                ):
+                    if name in code_tracker:
+                        continue
+
+                    code_tracker.add(name)
+                    yield {
+                        "name": name,
+                        "parent_name": parent_name,
+                        "desc": desc.strip(),
                     }
-                    rows.append(parsed_row)
-
-                if _commodity in code_tracker:
-                    pass
-                else:
-                    code_tracker.add(_commodity)
-                    parsed_row = {
-                        "name": _commodity,
-                        "parent_name": _class,
-                        "desc": row.get("Commodity Name").strip(),
-                    }
-                    rows.append(parsed_row)
-        if not rows:
-            print("No rows to import")
-            return
-
-        self.try_import(rows)
@@ -25,23 +25,13 @@ class US_PTC(BaseTransformer):
     __hierarchy__ = "US_PTC"
     __transformer__ = "US_PTC"
 
-    def parse(self):
-        """Parse US product tax codes file"""
-        if not super().parse():
-            return
-
-        rows = []
+    def rows(self):
+        """Yield the rows of a US product tax codes file"""
         with open(self.file_path, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             for row in reader:
-                parsed_row = {
+                yield {
                     "name": row.get("matrix_sku").strip(),
                     "parent_name": row.get("parent_sku").strip(),
                     "desc": row.get("description"),
                 }
-                rows.append(parsed_row)
-        if not rows:
-            print("No rows to import")
-            return
-
-        self.try_import(rows)